@@ -16,6 +16,16 @@ import zipfile      # For creating .zip backups on Windows
 import platform     # Used to detect the OS type (Windows, Linux, etc.)
 import getpass      # For securely prompting password
 from datetime import datetime   # For timestamping
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
 
 # Configuration Setup
 BACKUP_PATHS = ["/etc", "/home"] if os.name != "nt" else ["C:\\Data"]     # Set backup source paths based on OS, "nt" means Windows
@@ -23,10 +33,11 @@ BACKUP_OUTPUT_DIR = os.path.expanduser("~/backups") if os.name != "nt" else "C:\
 REMOTE_HOST = "your.vps.ip"     # IP address or hostname of remote server
 REMOTE_PORT = 22                # SSH port (22 by default)
 REMOTE_USER = "youruser"        # Remote SSH username
-REMOTE_PASS = getpass.getpass("Enter remote server password: ")    # SSH password (can be replaced with SSH key)
+REMOTE_PASS = None              # SSH password, prompted for when the script starts (can be replaced with SSH key)
 REMOTE_DIR = "/home/youruser/remote-backups"    # Directory on remote server to upload to
 
 # Create backup based on system type
+@tracing.traced()
 def create_backup(backup_paths, output_dir):
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")    # e.g. "20250706-153012"
     system = platform.system()
@@ -64,9 +75,11 @@ def create_backup(backup_paths, output_dir):
                     # Add the whole folder into the tar archive
                     # arcname=os.path.basename(path) stores only the folder name in the archive instead of the full path
                     tar_file.add(path, arcname=os.path.basename(path))
+    tracing.count("bytes_written", os.path.getsize(backup_file))
     return backup_file     # returns the file path string to created backup file
 
 # Upload backup file to remote server via paramiko (SFTP)
+@tracing.traced(category="network")
 def upload_to_remote(local_path, remote_path):
     try:
         # Create SSH transport connection to remote host
@@ -86,6 +99,7 @@ def upload_to_remote(local_path, remote_path):
 
         # Upload the local file to the remote directory
         sftp.put(local_path, remote_full_path)
+        tracing.count("bytes_uploaded", os.path.getsize(local_path))
         # Close connections cleanly
         sftp.close()
         transport.close()
@@ -96,6 +110,7 @@ def upload_to_remote(local_path, remote_path):
 
 # Main function
 if __name__ == "__main__":
+    REMOTE_PASS = getpass.getpass("Enter remote server password: ")
     print("[*] Starting backup process...")
 
     backup_file = create_backup(BACKUP_PATHS, BACKUP_OUTPUT_DIR)
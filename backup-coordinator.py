@@ -0,0 +1,392 @@
+# backup-coordinator.py
+
+# This script backs up many hosts to one or more backup servers, instead of running auto-file-backup.py on every host at once
+# Each job streams "tar czf -" from its source host over SSH straight into a file on the backup target over SFTP (nothing is staged on disk)
+# A global limit caps how many backups run at the same time, and every target has a bandwidth limit (token bucket)
+# shared by all jobs sending to it, so the backup server's link and disks aren't saturated
+# Jobs are ordered by estimated size, largest first, so the longest backups don't start last and stretch the backup window
+# Sizes are compressed archive sizes (what is actually sent), taken from the previous run (backup_history.json)
+# A job without history is sized with "du -sb" on the source, scaled by the compression ratio seen on earlier backups
+# A source that sends nothing for SOURCE_IDLE_TIMEOUT seconds fails its job, so a hung host doesn't hold a slot forever
+# Progress and throughput per job are printed while running and written to a JSON report
+
+# Usage: python3 backup-coordinator.py [jobs_file] [--max-concurrent 8] [--dry-run]
+# Jobs file example (backup_jobs.json):
+    # {"targets": {"backup1": {"host": "backup1.example.com", "user": "backup", "key_file": "~/.ssh/id_ed25519",
+    #                          "remote_dir": "/srv/backups", "bandwidth_mbps": 400}},
+    #  "jobs": [{"name": "web01", "source": "web01.example.com", "user": "root", "paths": ["/etc", "/home"], "target": "backup1"},
+    #           {"name": "this-host", "source": "local", "paths": ["/etc"], "target": "backup1"}]}
+# A target with "transport": "local" writes to "remote_dir" on this machine instead of SFTP (dry runs and testing)
+
+import os           # For file path operation
+import json         # For the jobs, history and report files
+import time         # For throughput and the token bucket
+import shlex        # For quoting paths in remote commands
+import select       # For read timeouts on local tar / du output
+import socket       # For read timeouts on SSH channels
+import argparse     # For command line options
+import threading    # For the token bucket lock and the progress printer
+import tempfile     # For tar's error output on local sources
+import subprocess   # For tar / du on local sources
+from concurrent.futures import ThreadPoolExecutor   # For running several backups at once
+from datetime import datetime   # For timestamping
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
+
+# Attempt to import paramiko (used for SSH sources and SFTP targets)
+# Only needed for remote hosts, local sources and targets work without it
+try:
+    import paramiko
+except ImportError:
+    paramiko = None
+
+# Configuration Setup
+JOBS_FILE = "backup_jobs.json"              # Default jobs file
+REPORT_FILE = "backup_coordinator_report.json"  # Progress and results per job
+HISTORY_FILE = "backup_history.json"        # Size of each job's last backup, used to order the next run
+MAX_CONCURRENT = 8          # Maximum number of backups running at the same time
+CHUNK_SIZE = 256 * 1024     # Bytes read from tar and written to the target at a time
+BURST_SECONDS = 0.5         # Token bucket size, as seconds of the target's bandwidth
+PROGRESS_INTERVAL = 5       # Seconds between progress lines
+SSH_TIMEOUT = 30            # Seconds to wait when connecting to a host
+SOURCE_IDLE_TIMEOUT = 300   # Seconds without data from tar before the job is failed
+DU_TIMEOUT = 900            # Seconds to wait for "du" when estimating a job without history
+
+# Create a token bucket for rate bytes per second (None means unlimited)
+def make_bucket(rate):
+    if not rate:
+        return None
+    capacity = max(CHUNK_SIZE, rate * BURST_SECONDS)
+    return {"rate": rate, "capacity": capacity, "tokens": capacity, "updated": time.monotonic(), "lock": threading.Lock()}
+
+# Take amount tokens from the bucket, sleeping until enough have been added back
+# Large amounts are taken in pieces no bigger than the bucket, so they can't wait forever
+def take_tokens(bucket, amount):
+    if bucket is None:
+        return
+    while amount > 0:
+        piece = min(amount, bucket["capacity"])
+        with bucket["lock"]:
+            current = time.monotonic()
+            bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] + (current - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = current
+            if bucket["tokens"] >= piece:
+                bucket["tokens"] -= piece
+                amount -= piece
+                continue
+            wait = (piece - bucket["tokens"]) / bucket["rate"]
+        time.sleep(wait)
+
+# Open an SSH connection, keys come from key_file or the usual ~/.ssh keys / agent
+def ssh_connect(host, user=None, port=22, key_file=None):
+    if paramiko is None:
+        raise RuntimeError("Paramiko (used for SSH/SFTP) not installed. Please run on Windows: pip install paramiko; on Linux: sudo apt install python3-paramiko")
+    client = paramiko.SSHClient()
+    client.load_system_host_keys()
+    client.set_missing_host_key_policy(paramiko.RejectPolicy())    # Unknown hosts must be added to known_hosts first
+    client.connect(host, port=port, username=user, key_filename=os.path.expanduser(key_file) if key_file else None,
+                   timeout=SSH_TIMEOUT, banner_timeout=SSH_TIMEOUT, auth_timeout=SSH_TIMEOUT)
+    return client
+
+# Run a command on the job's source and return (read function, function returning (exit code, stderr), close function)
+# read(size) returns up to size bytes of output, b"" at the end, and raises TimeoutError after timeout seconds without data
+def open_source_command(job, command, timeout=SOURCE_IDLE_TIMEOUT):
+    if job["source"] == "local":
+        # stderr goes to a temp file, a full stderr pipe would stall tar while we only read stdout
+        error_file = tempfile.TemporaryFile()
+        # Unbuffered, so each read returns what the pipe has instead of blocking until size bytes arrived
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_file, bufsize=0)
+
+        def read(size):
+            ready, _, _ = select.select([process.stdout], [], [], timeout)
+            if not ready:
+                raise TimeoutError(f"No output from {command[0]} for {timeout} seconds")
+            return process.stdout.read(size)
+
+        def finish():
+            code = process.wait()
+            error_file.seek(0)
+            return code, error_file.read().decode(errors="replace")
+
+        def close():
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            error_file.close()
+        return read, finish, close
+
+    client = ssh_connect(job["source"], job.get("user"), job.get("port", 22), job.get("key_file"))
+    _, stdout, stderr = client.exec_command(" ".join(shlex.quote(part) for part in command))
+    stdout.channel.settimeout(timeout)     # Reads raise socket.timeout when the channel is idle this long
+
+    def read(size):
+        try:
+            return stdout.read(size)
+        except socket.timeout:
+            raise TimeoutError(f"No output from {command[0]} on {job['source']} for {timeout} seconds")
+
+    def finish():
+        error = stderr.read().decode(errors="replace")
+        return stdout.channel.recv_exit_status(), error
+    return read, finish, client.close
+
+# Compressed size / raw size over every job in the history that has a ratio, None if there is none yet
+def compression_ratio(history):
+    compressed = raw = 0
+    for entry in history.values():
+        if entry.get("compression_ratio"):
+            compressed += entry["bytes"]
+            raw += entry["bytes"] / entry["compression_ratio"]
+    return compressed / raw if raw else None
+
+# Estimate the compressed size of a job, returns (bytes, source, raw bytes from du or None)
+# Jobs with history use the size of their last backup; others use "du -sb" on the source, scaled by ratio when known
+def estimate_size(job, history, ratio=None):
+    if job["name"] in history:
+        return history[job["name"]]["bytes"], "history", None
+    try:
+        read, finish, close = open_source_command(job, ["du", "-sbc"] + job["paths"], DU_TIMEOUT)
+        try:
+            output = b""
+            while True:
+                chunk = read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                output += chunk
+            finish()
+        finally:
+            close()
+        raw = int(output.decode().strip().splitlines()[-1].split()[0])    # Last line is the total
+    except Exception:
+        return 0, "unknown", None
+    if ratio:
+        return int(raw * ratio), f"du x {ratio:.3g} compression", raw
+    return raw, "du (uncompressed)", raw
+
+# Open the backup file on the target, written as <name>.part and renamed when complete
+# Returns (file, function to finish the upload, close function); closing removes the .part file of an unfinished upload
+def open_target_file(target, file_name):
+    remote_dir = target["remote_dir"]
+    if target.get("transport") == "local":
+        os.makedirs(remote_dir, exist_ok=True)
+        final_path = os.path.join(remote_dir, file_name)
+        target_file = open(final_path + ".part", "wb")
+
+        def close_local():
+            target_file.close()
+            if os.path.exists(final_path + ".part"):
+                os.remove(final_path + ".part")
+        return target_file, lambda: os.replace(final_path + ".part", final_path), close_local
+
+    client = ssh_connect(target["host"], target.get("user"), target.get("port", 22), target.get("key_file"))
+    sftp = client.open_sftp()
+    try:
+        sftp.chdir(remote_dir)      # Does the directory exist?
+    except IOError:
+        sftp.mkdir(remote_dir)      # If not, create it
+    final_path = f"{remote_dir.rstrip('/')}/{file_name}"
+    target_file = sftp.open(final_path + ".part", "wb")
+    target_file.set_pipelined(True)     # Don't wait for an acknowledgement after every write
+
+    def close():
+        target_file.close()
+        try:
+            sftp.remove(final_path + ".part")     # Fails (as expected) once the file has been renamed
+        except IOError:
+            pass
+        sftp.close()
+        client.close()
+    return target_file, lambda: sftp.posix_rename(final_path + ".part", final_path), close
+
+# Back up one job: stream tar output from the source into the target file, limited by the target's bucket
+# progress is this job's entry in the report and is updated while the job runs, always while holding lock
+# (the progress printer copies the report under the same lock)
+@tracing.traced(category="network")
+def run_job(job, target, bucket, progress, lock):
+    file_name = f"{job['name']}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.tar.gz"
+    with lock:
+        progress.update({"status": "running", "file": file_name, "started": datetime.now().isoformat()})
+    start = time.monotonic()
+    outcome = {}
+    try:
+        target_file, complete, close_target = open_target_file(target, file_name)
+        try:
+            read, finish, close_source = open_source_command(job, ["tar", "czf", "-"] + job["paths"], SOURCE_IDLE_TIMEOUT)
+            try:
+                while True:
+                    chunk = read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    take_tokens(bucket, len(chunk))
+                    target_file.write(chunk)
+                    with lock:
+                        progress["bytes"] += len(chunk)
+                        progress["throughput_mbps"] = round(progress["bytes"] * 8 / 1e6 / max(time.monotonic() - start, 0.001), 2)
+                code, error = finish()
+            finally:
+                close_source()
+            target_file.close()
+            # tar exits with 1 when files changed while being read, the archive is still usable
+            if code not in (0, 1):
+                raise RuntimeError(f"tar exited with {code}: {error.strip()[-300:]}")
+            complete()
+            tracing.count("bytes_uploaded", progress["bytes"])
+            if code == 1:
+                outcome["warning"] = error.strip()[-300:]
+            outcome["status"] = "succeeded"
+        finally:
+            close_target()
+    except Exception as error:
+        outcome = {"status": "failed", "error": str(error)}
+
+    outcome["duration_seconds"] = round(time.monotonic() - start, 2)
+    outcome["finished"] = datetime.now().isoformat()
+    with lock:
+        progress.update(outcome)
+    return progress
+
+# Copy of the report taken under lock, so it can be written while jobs keep updating their entries
+def snapshot_report(report, lock):
+    with lock:
+        return dict(report, jobs={name: dict(job) for name, job in report["jobs"].items()})
+
+# Write the report to a temp file first, then swap it in so readers never see a partial file
+# Pass a snapshot (see snapshot_report) while jobs are running, json.dump fails if a dict changes size under it
+def write_report(report, path):
+    report["updated"] = datetime.now().isoformat()
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as json_file:
+        json.dump(report, json_file, indent=4)
+    os.replace(temp_path, path)
+
+# Print one line per running job every interval until stop is set, and refresh the report file
+def print_progress(report, report_path, stop, lock, interval=PROGRESS_INTERVAL):
+    while not stop.wait(interval):
+        current = snapshot_report(report, lock)
+        running = [(name, job) for name, job in current["jobs"].items() if job["status"] == "running"]
+        done = sum(1 for job in current["jobs"].values() if job["status"] in ("succeeded", "failed"))
+        print(f"[*] {done}/{len(current['jobs'])} done, {len(running)} running")
+        for name, job in running:
+            percent = f" (~{min(99, job['bytes'] * 100 // job['estimated_bytes'])}%)" if job["estimated_bytes"] else ""
+            print(f"    {name}: {job['bytes'] / 1e6:.1f} MB{percent} at {job['throughput_mbps']} Mbit/s")
+        write_report(current, report_path)
+
+# Load the jobs file, returns (targets, jobs)
+def load_jobs(path):
+    with open(path, "r") as jobs_file:
+        config = json.load(jobs_file)
+    names = set()
+    for job in config["jobs"]:
+        if job["name"] in names:
+            raise ValueError(f"Job name {job['name']} is used more than once")
+        names.add(job["name"])
+        if job["target"] not in config["targets"]:
+            raise ValueError(f"Job {job['name']} uses unknown target {job['target']}")
+    return config["targets"], config["jobs"]
+
+# Load the size history from previous runs
+def load_history(path):
+    try:
+        with open(path, "r") as history_file:
+            return json.load(history_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+# Estimate every job's size (in parallel, du can be slow on big trees) and sort largest first
+def plan_jobs(jobs, history, max_concurrent=MAX_CONCURRENT):
+    ratio = compression_ratio(history)
+    with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+        estimates = list(executor.map(lambda job: estimate_size(job, history, ratio), jobs))
+    planned = [dict(job, estimated_bytes=size, estimate_source=source, raw_bytes=raw)
+               for job, (size, source, raw) in zip(jobs, estimates)]
+    planned.sort(key=lambda job: job["estimated_bytes"], reverse=True)
+    return planned
+
+# Run every job with at most max_concurrent at a time and return the final report
+def run_backups(targets, jobs, max_concurrent=MAX_CONCURRENT, report_path=REPORT_FILE, history_path=HISTORY_FILE):
+    history = load_history(history_path)
+    planned = plan_jobs(jobs, history, max_concurrent)
+    # One bucket per target, shared by every job that sends to it
+    buckets = {name: make_bucket(target.get("bandwidth_mbps", 0) * 1e6 / 8) for name, target in targets.items()}
+
+    report = {
+        "started": datetime.now().isoformat(),
+        "max_concurrent": max_concurrent,
+        "status": "running",
+        "jobs": {job["name"]: {"status": "queued", "target": job["target"], "estimated_bytes": job["estimated_bytes"],
+                               "estimate_source": job["estimate_source"], "bytes": 0, "throughput_mbps": 0}
+                 for job in planned}
+    }
+    write_report(report, report_path)
+
+    stop = threading.Event()
+    lock = threading.Lock()     # Guards the job entries of the report between the jobs and the progress printer
+    printer = threading.Thread(target=print_progress, args=(report, report_path, stop, lock, PROGRESS_INTERVAL), daemon=True)
+    printer.start()
+    try:
+        # Jobs are submitted largest first, the executor starts them in that order as slots free up
+        with ThreadPoolExecutor(max_workers=max_concurrent) as executor:
+            futures = {executor.submit(run_job, job, targets[job["target"]], buckets[job["target"]], report["jobs"][job["name"]], lock): job
+                       for job in planned}
+            for future, job in futures.items():
+                result = future.result()    # The job's entry, no longer changed once the job has finished
+                mark = "+" if result["status"] == "succeeded" else "!"
+                print(f"[{mark}] {job['name']}: {result['status']}, {result['bytes'] / 1e6:.1f} MB in {result['duration_seconds']}s "
+                      f"({result['throughput_mbps']} Mbit/s){' - ' + result['error'] if 'error' in result else ''}")
+                if result["status"] == "succeeded":
+                    # History keeps compressed bytes (what progress counts); the ratio against du's raw size is kept
+                    # so jobs without history can be estimated in the same unit
+                    entry = {"bytes": result["bytes"], "finished": result["finished"]}
+                    if job["raw_bytes"]:
+                        entry["compression_ratio"] = round(result["bytes"] / job["raw_bytes"], 6)
+                    elif history.get(job["name"], {}).get("compression_ratio"):
+                        entry["compression_ratio"] = history[job["name"]]["compression_ratio"]
+                    history[job["name"]] = entry
+    finally:
+        stop.set()
+        printer.join()
+
+    counts = {}
+    for job_result in report["jobs"].values():
+        counts[job_result["status"]] = counts.get(job_result["status"], 0) + 1
+    report["summary"] = counts
+    report["status"] = "completed"
+    report["finished"] = datetime.now().isoformat()
+    write_report(report, report_path)
+
+    with open(history_path, "w") as history_file:
+        json.dump(history, history_file, indent=4)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up many hosts with a concurrency limit and per-target bandwidth limits")
+    parser.add_argument("jobs_file", nargs="?", default=JOBS_FILE, help="Jobs file (JSON)")
+    parser.add_argument("--max-concurrent", type=int, default=MAX_CONCURRENT, help="Maximum backups running at the same time")
+    parser.add_argument("--dry-run", action="store_true", help="Only show the job order and size estimates")
+    args = parser.parse_args()
+
+    try:
+        targets, jobs = load_jobs(args.jobs_file)
+    except (OSError, ValueError, KeyError) as error:
+        print(f"[!] Could not load jobs from {args.jobs_file}: {error}")
+        exit(1)
+
+    if args.dry_run:
+        for job in plan_jobs(jobs, load_history(HISTORY_FILE), args.max_concurrent):
+            print(f"{job['name']}: ~{job['estimated_bytes'] / 1e6:.1f} MB ({job['estimate_source']}) -> {job['target']}")
+        return
+
+    report = run_backups(targets, jobs, args.max_concurrent)
+    print(f"Backups finished: {report['summary']}. Report saved to {REPORT_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# bench_collectors.py
+
+# This script benchmarks the hot path of each collector on generated inputs (see fixtures.py)
+# For each case it shows best time out of REPEAT runs, throughput and peak Python memory (tracemalloc)
+# Results can be saved as a baseline, later runs are compared against it and fail on regressions
+    # failed_logins  - parse_linux_failed_logins() on a large auth.log
+    # open_ports     - check_open_ports_linux() reading generated /proc/net tables (process lookup stubbed out)
+    # software       - collect_linux_software() with dpkg-query on a generated dpkg database
+    # firewall_rules - parsing and compiling a large iptables -S listing
+    # append_log     - poll-weather append_log() on a long weather history
+    # create_backup  - auto-file-backup create_backup() on a tree of many small files
+# Cases whose script needs a library that isn't installed (e.g. requests, paramiko) are skipped
+
+# Usage examples:
+    # python3 benchmarks/bench_collectors.py --save-baseline
+    # python3 benchmarks/bench_collectors.py                  (compare with the saved baseline, exit code 1 on regression)
+    # python3 benchmarks/bench_collectors.py --only failed_logins --auth-log-mb 2048 --fixtures-dir /var/tmp/bench
+# Baselines depend on the machine, so keep them local (benchmarks/baseline.json is git-ignored)
+
+import os           # For paths and file sizes
+import sys          # For the import path and exit codes
+import json         # For baseline files
+import time         # For timing
+import shutil       # For copying / removing fixtures
+import argparse     # For command line options
+import tempfile     # For a scratch directory
+import tracemalloc  # For peak memory
+import importlib.util   # For loading the scripts (their file names have dashes)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)    # Shared modules the scripts import (report_writer, results_store)
+sys.path.insert(0, BENCH_DIR)
+import fixtures     # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+REPEAT = 3                  # Timed runs per case, the best one is reported
+TIME_THRESHOLD = 0.15       # Slower than the baseline by more than this share is a regression
+MEMORY_THRESHOLD = 0.20     # Same for peak memory
+
+# Load a script as a module, returns None if it exits on import (missing optional library)
+def load_script(file_name):
+    spec = importlib.util.spec_from_file_location(file_name.replace("-", "_")[:-3], os.path.join(REPO_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except (SystemExit, ImportError):
+        return None
+    return module
+
+# Size of a file or total size of a folder, in bytes
+def input_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for each_file in files:
+            total += os.path.getsize(os.path.join(root, each_file))
+    return total
+
+# Generate the fixtures a case needs unless fixtures of the same size are already there
+def ensure_fixture(fixtures_dir, name, size, generate):
+    path = os.path.join(fixtures_dir, name)
+    stamp = path + ".size"
+    if os.path.exists(path) and os.path.isfile(stamp):
+        with open(stamp, "r") as stamp_file:
+            if stamp_file.read() == str(size):
+                return path
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    print(f"[*] Generating {name} ({size})...")
+    generate(path, size)
+    with open(stamp, "w") as stamp_file:
+        stamp_file.write(str(size))
+    return path
+
+# Each case returns (prepare, run, input path) or None when it can't run here
+# prepare() runs before every timed run and is not timed, its return value is passed to run()
+# run() returns the number of items processed (lines, sockets, packages, ...)
+
+def case_failed_logins(fixtures_dir, sizes, scratch):
+    module = load_script("failed-login-audit.py")
+    if module is None:
+        return None
+    path = ensure_fixture(fixtures_dir, "auth.log", sizes["auth_log_mb"], lambda p, mb: fixtures.write_auth_log(p, mb * 1024 * 1024))
+    return (lambda: path), (lambda log_path: len(module.parse_linux_failed_logins(log_path))), path
+
+def case_open_ports(fixtures_dir, sizes, scratch):
+    module = load_script("check-rdp-ssh-exposure.py")
+    if module is None:
+        return None
+    path = ensure_fixture(fixtures_dir, "proc_net", sizes["sockets"], fixtures.write_proc_net)
+    module.USE_NETLINK = False
+    module.PROC_NET_DIR = path
+    # The fixture's socket inodes don't exist on this machine, so the real lookup would walk every /proc/<pid>/fd
+    # on each run and time the host's process table instead of the parser
+    module.map_socket_owners = lambda inodes: {}
+
+    def run(_):
+        module.check_open_ports_linux()
+        return sizes["sockets"]
+    return (lambda: None), run, path
+
+def case_software(fixtures_dir, sizes, scratch):
+    module = load_script("software-inventory.py")
+    if module is None or shutil.which("dpkg-query") is None:
+        return None
+    path = ensure_fixture(fixtures_dir, "dpkg", sizes["packages"], fixtures.write_dpkg_status)
+    return (lambda: path), (lambda admin_dir: len(module.collect_linux_software(admin_dir))), path
+
+def case_firewall_rules(fixtures_dir, sizes, scratch):
+    module = load_script("firewall-rule-extractor.py")
+    if module is None:
+        return None
+    path = ensure_fixture(fixtures_dir, "iptables-S.txt", sizes["rules"], fixtures.write_iptables_rules)
+
+    def prepare():
+        with open(path, "r") as rules_file:
+            return rules_file.read()
+
+    def run(text):
+        module.compile_model(module.parse_ruleset(text))
+        return sizes["rules"]
+    return prepare, run, path
+
+def case_append_log(fixtures_dir, sizes, scratch):
+    module = load_script("poll-weather.py")
+    if module is None:
+        return None
+    path = ensure_fixture(fixtures_dir, "weather_log.json", sizes["weather_entries"], fixtures.write_weather_history)
+    module.LOG_FILE = os.path.join(scratch, "weather_log.json")
+    entry = {"timestamp": "2025-07-07T12:00:00", "location": {"name": "Tokyo"}, "weather": {"temperature": 28.1}}
+
+    # Every run appends to a fresh copy of the history
+    def run(_):
+        module.append_log(entry)
+        return 1
+    return (lambda: shutil.copyfile(path, module.LOG_FILE)), run, path
+
+def case_create_backup(fixtures_dir, sizes, scratch):
+    module = load_script("auto-file-backup.py")
+    if module is None:
+        return None
+    path = ensure_fixture(fixtures_dir, "tree", sizes["files"], fixtures.write_file_tree)
+    output_dir = os.path.join(scratch, "backups")
+
+    def prepare():
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    def run(_):
+        module.create_backup([path], output_dir)
+        return sizes["files"]
+    return prepare, run, path
+
+CASES = {
+    "failed_logins": case_failed_logins,
+    "open_ports": case_open_ports,
+    "software": case_software,
+    "firewall_rules": case_firewall_rules,
+    "append_log": case_append_log,
+    "create_backup": case_create_backup
+}
+
+# Time REPEAT runs and keep the best, then one more run under tracemalloc for peak memory
+# tracemalloc slows Python down a lot, so it is kept out of the timed runs
+def measure(prepare, run, input_bytes, repeat):
+    best = None
+    for _ in range(repeat):
+        argument = prepare()
+        start = time.perf_counter()
+        items = run(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    argument = prepare()
+    tracemalloc.start()
+    run(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": round(best, 4),
+        "items": items,
+        "items_per_s": round(items / best, 1) if best else None,
+        "mb_per_s": round(input_bytes / 1e6 / best, 2) if best else None,
+        "input_mb": round(input_bytes / 1e6, 2),
+        "peak_mb": round(peak / 1e6, 2)
+    }
+
+# Compare results with a baseline, returns a list of regression messages
+def find_regressions(results, baseline, time_threshold, memory_threshold):
+    regressions = []
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        if result["seconds"] > before["seconds"] * (1 + time_threshold):
+            regressions.append(f"{name}: {result['seconds']}s vs {before['seconds']}s baseline")
+        if result["peak_mb"] > before["peak_mb"] * (1 + memory_threshold):
+            regressions.append(f"{name}: peak {result['peak_mb']} MB vs {before['peak_mb']} MB baseline")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark collector hot paths on generated inputs")
+    parser.add_argument("--only", action="append", choices=sorted(CASES), help="Run only this case, can be repeated")
+    parser.add_argument("--fixtures-dir", help="Keep generated fixtures here and reuse them between runs")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Save this run as the baseline")
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    for name, default in fixtures.DEFAULT_SIZES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    args = parser.parse_args()
+    sizes = {name: getattr(args, name) for name in fixtures.DEFAULT_SIZES}
+
+    scratch = tempfile.mkdtemp(prefix="bench_")
+    fixtures_dir = args.fixtures_dir or os.path.join(scratch, "fixtures")
+    os.makedirs(fixtures_dir, exist_ok=True)
+
+    results = {}
+    print(f"{'case':<16}{'seconds':>10}{'items/s':>14}{'MB/s':>10}{'input MB':>10}{'peak MB':>10}")
+    try:
+        for name in args.only or CASES:
+            case = CASES[name](fixtures_dir, sizes, scratch)
+            if case is None:
+                print(f"{name:<16}{'skipped (script dependency not installed)':>54}")
+                continue
+            prepare, run, path = case
+            result = measure(prepare, run, input_size(path), args.repeat)
+            results[name] = result
+            print(f"{name:<16}{result['seconds']:>10.3f}{result['items_per_s']:>14,.0f}{result['mb_per_s']:>10.1f}"
+                  f"{result['input_mb']:>10.1f}{result['peak_mb']:>10.1f}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump({"sizes": sizes, "results": results}, baseline_file, indent=4)
+        print(f"[+] Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.isfile(args.baseline):
+        print("[*] No baseline to compare with, run with --save-baseline first")
+        return
+    with open(args.baseline, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline["sizes"] != sizes:
+        print("[!] Baseline was recorded with different fixture sizes, not comparing")
+        return
+
+    regressions = find_regressions(results, baseline, args.time_threshold, args.memory_threshold)
+    for message in regressions:
+        print(f"[!] Regression: {message}")
+    if regressions:
+        sys.exit(1)
+    print("[+] No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
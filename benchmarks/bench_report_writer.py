@@ -0,0 +1,82 @@
+# bench_report_writer.py
+
+# This script compares report output formats on a large generated failed login report
+# For each format it shows encode time, file size and peak Python memory (tracemalloc)
+# The "legacy" row is the old way: whole report in memory, then json.dump(..., indent=4)
+
+# Usage: python3 benchmarks/bench_report_writer.py [record_count]
+
+import os           # For file sizes and paths
+import sys          # For the record count argument and import path
+import json         # For the legacy json.dump baseline
+import time         # For timing each format
+import random       # For generating fixture records
+import tempfile     # For a scratch directory
+import tracemalloc  # For peak memory
+
+# Make report_writer.py in the repository root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import report_writer    # noqa: E402
+
+RECORD_COUNT = 500000
+
+# Generate failed login records like parse_linux_failed_logins() produces
+def generate_records(count, seed=42):
+    rng = random.Random(seed)
+    users = ["root", "admin", "ubuntu", "test", "oracle", "postgres", "git", "user"]
+    for i in range(count):
+        yield {
+            "timestamp": f"2025-07-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:{(i * 7) % 60:02d}",
+            "username": rng.choice(users),
+            "ip": f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        }
+
+# Old behavior: build the whole report then dump it with indentation
+def write_legacy(path, header, records):
+    data = dict(header, failed_logins=list(records))
+    with open(path, "w") as json_file:
+        json.dump(data, json_file, indent=4)
+
+# Run one case and return (seconds, bytes, peak memory bytes)
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else RECORD_COUNT
+    header = {"timestamp": "2025-07-07T12:00:00", "system": "Linux"}
+    encoder = "orjson" if "orjson" in sys.modules else "json"
+    print(f"Records: {count}, encoder: {encoder}")
+    print(f"{'format':<28}{'seconds':>10}{'size MB':>12}{'peak MB':>12}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        cases = [("legacy indent=4", "legacy.json", None)]
+        for name in ("report.json", "report.jsonl", "report.jsonl.gz", "report.jsonl.zst", "report.msgpack", "report.msgpack.gz"):
+            cases.append((name, name, name))
+
+        for label, file_name, writer_name in cases:
+            path = os.path.join(scratch, file_name)
+            # Skip formats whose optional library isn't installed
+            if writer_name and writer_name.endswith(".zst"):
+                try:
+                    import zstandard    # noqa: F401
+                except ImportError:
+                    print(f"{label:<28}{'skipped (zstandard not installed)':>34}")
+                    continue
+            if writer_name and ".msgpack" in writer_name:
+                try:
+                    import msgpack      # noqa: F401
+                except ImportError:
+                    print(f"{label:<28}{'skipped (msgpack not installed)':>34}")
+                    continue
+
+            if writer_name is None:
+                elapsed, peak = measure(lambda: write_legacy(path, header, generate_records(count)))
+            else:
+                elapsed, peak = measure(lambda: report_writer.write_report(path, header, "failed_logins", generate_records(count)))
+            print(f"{label:<28}{elapsed:>10.2f}{os.path.getsize(path) / 1e6:>12.2f}{peak / 1e6:>12.2f}")
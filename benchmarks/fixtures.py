@@ -0,0 +1,209 @@
+# fixtures.py
+
+# Synthetic input generators for the benchmarks, every generator is seeded so the same arguments give the same files
+# Inputs are written in chunks, so multi-GB files can be generated without holding them in memory
+    # auth.log         - sshd / sudo / cron lines in syslog format, a share of them "Failed password" lines
+    # /proc/net tables - tcp, tcp6, udp, udp6 socket tables as read by check-rdp-ssh-exposure.py
+    # iptables -S      - rule listing with user chains, addresses, port ranges and states
+    # dpkg status      - dpkg database directory usable with dpkg-query --admindir
+    # file tree        - many small files spread over nested folders, for create_backup()
+    # weather history  - weather_log.json as written by poll-weather.py
+
+# Usage: python3 benchmarks/fixtures.py <output_dir> [--auth-log-mb 2048] [--sockets 50000] [--rules 50000] ...
+# The size flags default to the same sizes bench_collectors.py uses
+
+import os           # For paths and folders
+import json         # For the weather history
+import random       # For seeded fixture data
+import argparse     # For command line options
+
+WRITE_CHUNK_LINES = 10000   # Lines joined and written at once
+
+# Sizes used when no size is given
+DEFAULT_SIZES = {
+    "auth_log_mb": 64,
+    "sockets": 50000,
+    "rules": 50000,
+    "packages": 20000,
+    "files": 20000,
+    "weather_entries": 20000
+}
+
+USERS = ["root", "admin", "ubuntu", "test", "oracle", "postgres", "git", "user", "deploy", "backup"]
+
+# Random public-looking IPv4 address
+def random_ip(rng):
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+# Write lines from a generator in chunks, returns the number of bytes written
+def write_lines(path, lines):
+    written = 0
+    with open(path, "w") as output:
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= WRITE_CHUNK_LINES:
+                written += output.write("\n".join(chunk) + "\n")
+                chunk = []
+        if chunk:
+            written += output.write("\n".join(chunk) + "\n")
+    return written
+
+# auth.log lines until size_bytes is reached, about failed_share of them failed passwords
+# Timestamps use the ISO format rsyslog writes on current systems
+def write_auth_log(path, size_bytes, failed_share=0.3, seed=1):
+    rng = random.Random(seed)
+    host = "web01"
+
+    def lines():
+        total = 0
+        i = 0
+        while total < size_bytes:
+            second = i // 20
+            stamp = f"2025-07-{1 + second // 86400 % 28:02d}T{second // 3600 % 24:02d}:{second // 60 % 60:02d}:{second % 60:02d}.{i % 1000000:06d}+00:00"
+            pid = 1000 + i % 60000
+            roll = rng.random()
+            if roll < failed_share:
+                line = f"{stamp} {host} sshd[{pid}]: Failed password for {rng.choice(USERS)} from {random_ip(rng)} port {rng.randint(1024, 65535)} ssh2"
+            elif roll < failed_share + 0.05:
+                line = f"{stamp} {host} sshd[{pid}]: Failed password for invalid user {rng.choice(USERS)}x from {random_ip(rng)} port {rng.randint(1024, 65535)} ssh2"
+            elif roll < 0.6:
+                line = f"{stamp} {host} sshd[{pid}]: Accepted publickey for {rng.choice(USERS)} from {random_ip(rng)} port {rng.randint(1024, 65535)} ssh2: ED25519 SHA256:{rng.getrandbits(128):032x}"
+            elif roll < 0.8:
+                line = f"{stamp} {host} CRON[{pid}]: pam_unix(cron:session): session opened for user root(uid=0) by (uid=0)"
+            else:
+                line = f"{stamp} {host} sudo:    {rng.choice(USERS)} : TTY=pts/0 ; PWD=/home ; USER=root ; COMMAND=/usr/bin/apt-get update"
+            total += len(line) + 1
+            i += 1
+            yield line
+
+    return write_lines(path, lines())
+
+# Hex address in /proc/net layout (each 32-bit word in little-endian order)
+def proc_address(raw):
+    return "".join(raw[i:i + 4][::-1].hex().upper() for i in range(0, len(raw), 4))
+
+# /proc/net/{tcp,tcp6,udp,udp6} with count sockets spread over the four tables
+# Most TCP sockets are established connections, listen_share of them are listeners, some of those on ports 22 / 3389
+def write_proc_net(directory, count, listen_share=0.1, seed=2):
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode"
+    for table in ("tcp", "tcp6", "udp", "udp6"):
+        share = {"tcp": 0.5, "tcp6": 0.3, "udp": 0.15, "udp6": 0.05}[table]
+        width = 16 if table.endswith("6") else 4
+
+        def lines():
+            yield header
+            for slot in range(int(count * share)):
+                listening = rng.random() < listen_share
+                local_ip = bytes(width) if rng.random() < 0.5 else bytes(rng.getrandbits(8) for _ in range(width))
+                if listening:
+                    port = rng.choice([22, 3389, 80, 443, 53, 5432, rng.randint(1024, 65535)])
+                    remote, state = proc_address(bytes(width)) + ":0000", "0A" if table.startswith("tcp") else "07"
+                else:
+                    port = rng.randint(1024, 65535)
+                    remote, state = f"{proc_address(bytes(rng.getrandbits(8) for _ in range(width)))}:{rng.randint(1, 65535):04X}", "01"
+                yield (f"{slot:4d}: {proc_address(local_ip)}:{port:04X} {remote} {state} 00000000:00000000 00:00000000 00000000"
+                       f"  1000        0 {100000 + slot} 1 0000000000000000 100 0 0 10 0")
+
+        write_lines(os.path.join(directory, table), lines())
+    return directory
+
+# iptables -S output with count rules, split over the built-in chains and a few user chains
+def write_iptables_rules(path, count, seed=3):
+    rng = random.Random(seed)
+    chains = ["INPUT", "FORWARD", "OUTPUT"]
+    user_chains = [f"CUSTOM_{i}" for i in range(8)]
+
+    def lines():
+        for chain in chains:
+            yield f"-P {chain} {rng.choice(['ACCEPT', 'DROP'])}"
+        for chain in user_chains:
+            yield f"-N {chain}"
+        for i in range(count):
+            chain = rng.choice(chains + user_chains)
+            parts = [f"-A {chain}"]
+            if rng.random() < 0.8:
+                parts.append(f"-p {rng.choice(['tcp', 'udp'])}")
+                if rng.random() < 0.7:
+                    low = rng.randint(1, 65000)
+                    parts.append(f"-m {parts[-1][3:]} --dport {low}" + (f":{low + rng.randint(1, 500)}" if rng.random() < 0.3 else ""))
+            if rng.random() < 0.6:
+                parts.append(f"-s {rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.0/{rng.choice([8, 16, 24, 32])}")
+            if rng.random() < 0.3:
+                parts.append(f"-d 10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}/32")
+            if rng.random() < 0.2:
+                parts.append("-m conntrack --ctstate NEW")
+            if chain in chains and rng.random() < 0.05:
+                parts.append(f"-j {rng.choice(user_chains)}")
+            else:
+                parts.append(f"-j {rng.choice(['ACCEPT', 'DROP', 'REJECT', 'RETURN'])}")
+            yield " ".join(parts)
+
+    return write_lines(path, lines())
+
+# dpkg database directory with a status file of count installed packages, use with dpkg-query --admindir
+def write_dpkg_status(admin_dir, count, seed=4):
+    rng = random.Random(seed)
+    os.makedirs(admin_dir, exist_ok=True)
+
+    def lines():
+        for i in range(count):
+            version = f"{rng.randint(0, 9)}:{rng.randint(0, 30)}.{rng.randint(0, 99)}.{rng.randint(0, 9)}-{rng.randint(1, 9)}ubuntu{rng.randint(0, 5)}"
+            yield (f"Package: lib-bench-{i:06d}\nStatus: install ok installed\nPriority: optional\nSection: libs\n"
+                   f"Installed-Size: {rng.randint(10, 50000)}\nMaintainer: Bench <bench@example.com>\n"
+                   f"Architecture: {rng.choice(['amd64', 'all'])}\nVersion: {version}\n"
+                   f"Depends: libc6 (>= 2.34)\nDescription: synthetic package {i}\n Generated for benchmarks.\n")
+
+    write_lines(os.path.join(admin_dir, "status"), lines())
+    return admin_dir
+
+# Folder tree with count small files, files_per_folder files in each folder, folders nested a few levels deep
+def write_file_tree(root, count, files_per_folder=100, seed=5):
+    rng = random.Random(seed)
+    for i in range(count):
+        folder_number = i // files_per_folder
+        folder = os.path.join(root, f"d{folder_number % 10}", f"d{folder_number // 10 % 100}", f"d{folder_number // 1000}")
+        if i % files_per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"file{i}.conf"), "w") as small_file:
+            small_file.write(f"# config {i}\n" + "key=value\n" * rng.randint(1, 50))
+    return root
+
+# weather_log.json with count entries in the layout poll-weather.py writes (a JSON list, indent=4)
+def write_weather_history(path, count, seed=6):
+    rng = random.Random(seed)
+    logs = []
+    for i in range(count):
+        logs.append({
+            "timestamp": f"2024-{1 + i // 2000 % 12:02d}-{1 + i // 70 % 28:02d}T{i % 24:02d}:{i % 60:02d}:00",
+            "location": {"name": "Tokyo", "latitude": 35.652832, "longitude": 139.839478},
+            "weather": {
+                "temperature": round(rng.uniform(-5, 35), 1),
+                "windspeed": round(rng.uniform(0, 40), 1),
+                "winddirection": rng.randint(0, 359),
+                "weathercode": rng.choice([0, 1, 2, 3, 45, 61, 80]),
+                "is_day": i % 2,
+                "time": f"2024-01-01T{i % 24:02d}:00"
+            }
+        })
+    with open(path, "w") as json_file:
+        json.dump(logs, json_file, indent=4)
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark inputs")
+    parser.add_argument("output_dir", help="Folder to write the fixtures to")
+    for name, default in DEFAULT_SIZES.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=default)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_auth_log(os.path.join(args.output_dir, "auth.log"), args.auth_log_mb * 1024 * 1024)
+    write_proc_net(os.path.join(args.output_dir, "proc_net"), args.sockets)
+    write_iptables_rules(os.path.join(args.output_dir, "iptables-S.txt"), args.rules)
+    write_dpkg_status(os.path.join(args.output_dir, "dpkg"), args.packages)
+    write_file_tree(os.path.join(args.output_dir, "tree"), args.files)
+    write_weather_history(os.path.join(args.output_dir, "weather_log.json"), args.weather_entries)
+    print(f"Fixtures written to {args.output_dir}")
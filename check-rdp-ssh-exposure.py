@@ -3,12 +3,53 @@
 # This script checks if the current operating system is showing open ports for rdp or ssh
 # Script will log ports info to JSON file
 
+# On Linux, sockets are read straight from the kernel (netlink or /proc/net) instead of running `ss`
+# Use --ports to change which ports are checked and --watch to keep scanning and only report new listeners
+    # e.g. python3 check-rdp-ssh-exposure.py --ports 22:ssh,3389:rdp,5900:vnc --watch 5
+# Use --scan to check whether the ports are actually reachable on other hosts with TCP connects
+# Only scan address ranges you are authorized to audit
+    # e.g. python3 check-rdp-ssh-exposure.py --scan 10.20.0.0/16 10.30.1.0/24 --ports 22,3389
+
+import os               # For reading /proc
+import asyncio          # For the TCP reachability scan
+import ipaddress        # For expanding CIDR ranges
+import time             # For the watch mode interval
+import socket           # For decoding addresses and netlink sockets
+import struct           # For packing netlink messages
+import argparse         # For command line options
 import platform         # To detect the OS type (Windows, Linux, etc.)
-import subprocess       # Run system commands (like netstat or ss)
+import subprocess       # Run system commands (like netstat)
 import json             # Save results in JSON file
 from datetime import datetime   # For timestamping
+from results_store import save_records, STORE_ERRORS  # Shared SQLite results store
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+# Ports to check and the service name to report for each
+WATCHED_PORTS = {22: "ssh", 3389: "rdp"}
+PUBLIC_BINDS = ("0.0.0.0", "::")    # Bind addresses reachable from every interface
+PROC_NET_DIR = "/proc/net"
+USE_NETLINK = True      # Set to False to always read /proc/net
+OUTPUT_FILE = "open_port_scan.json"
+# Save results to the shared SQLite store (see results_store.py), the report file is an optional export
+SAVE_TO_STORE = True
+EXPORT_REPORT = True
+
+# Reachability scan limits
+SCAN_CONCURRENCY = 512  # Maximum connections open at the same time (keep below the open file limit)
+SCAN_TIMEOUT = 1.0      # Seconds to wait for each connection
+SCAN_RATE = 2000        # Maximum new connections per second across the whole scan
+
+# Kernel constants for sockets and NETLINK sock_diag
+TCP_LISTEN_STATE = "0A"
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
 
 # Run shell/system commands
+@tracing.traced(category="subprocess")
 def run_command(command, shell=False):
     try:
         # Run the command, capture its output as text
@@ -17,45 +58,149 @@ def run_command(command, shell=False):
     except Exception as error:
         return [str(error)], 1
 
-# Linux: Scan open ports using `ss`
-def check_open_ports_linux():
+# Decode a hex address from /proc/net (e.g. "0100007F" -> "127.0.0.1")
+# The kernel prints each 32-bit word in host byte order, so every 4-byte group is reversed
+def decode_proc_address(hex_address):
+    raw = bytes.fromhex(hex_address)
+    raw = b"".join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    family = socket.AF_INET if len(raw) == 4 else socket.AF_INET6
+    return socket.inet_ntop(family, raw)
+
+# Read listening sockets from /proc/net/{tcp,tcp6,udp,udp6} without forking any command
+# Returns a list of (protocol, bind ip, port, socket inode)
+@tracing.traced()
+def read_proc_sockets(proc_net_dir=PROC_NET_DIR):
+    sockets = []
+    for table in ("tcp", "tcp6", "udp", "udp6"):
+        protocol = table.rstrip("6")
+        try:
+            with open(os.path.join(proc_net_dir, table), "r") as proc_file:
+                next(proc_file, None)   # Skip the header line
+                lines = 0
+                for lines, line in enumerate(proc_file, 1):
+                    fields = line.split()
+                    if len(fields) < 10:
+                        continue
+                    local, remote, state, inode = fields[1], fields[2], fields[3], fields[9]
+                    # TCP must be in LISTEN state, UDP must be unconnected (no remote port)
+                    if protocol == "tcp" and state != TCP_LISTEN_STATE:
+                        continue
+                    if protocol == "udp" and not remote.endswith(":0000"):
+                        continue
+                    address, port = local.split(":")
+                    sockets.append((protocol, decode_proc_address(address), int(port, 16), int(inode)))
+                tracing.count("lines_parsed", lines)
+        except FileNotFoundError:
+            continue    # e.g. tcp6/udp6 are missing when IPv6 is disabled
+    return sockets
+
+# Read listening sockets with a NETLINK sock_diag dump, one request per family and protocol
+# Returns the same list as read_proc_sockets(), raises OSError if netlink is not available
+@tracing.traced()
+def read_netlink_sockets():
+    sockets = []
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_SOCK_DIAG) as nl_socket:
+        for family in (socket.AF_INET, socket.AF_INET6):
+            for protocol, ip_proto, states in (("tcp", socket.IPPROTO_TCP, 1 << 10), ("udp", socket.IPPROTO_UDP, 1 << 7)):
+                # inet_diag_req_v2: family, protocol, ext, pad, state bitmask, then an empty 48-byte socket id
+                request = struct.pack("=BBBxI", family, ip_proto, 0, states) + bytes(48)
+                header = struct.pack("=LHHLL", 16 + len(request), SOCK_DIAG_BY_FAMILY, NLM_F_REQUEST | NLM_F_DUMP, 0, 0)
+                nl_socket.send(header + request)
+
+                done = False
+                while not done:
+                    data = nl_socket.recv(65536)
+                    offset = 0
+                    while offset + 16 <= len(data):
+                        msg_len, msg_type = struct.unpack_from("=LH", data, offset)
+                        if msg_type == NLMSG_DONE:
+                            done = True
+                            break
+                        if msg_type == NLMSG_ERROR:
+                            raise OSError("sock_diag request rejected by kernel")
+                        # inet_diag_msg: family, state, timer, retrans, then sport/dport/src/dst in network order
+                        body = offset + 16
+                        msg_family = data[body]
+                        sport, = struct.unpack_from("!H", data, body + 4)
+                        src = data[body + 8:body + 24]
+                        inode, = struct.unpack_from("=I", data, body + 68)
+                        if msg_family == socket.AF_INET:
+                            address = socket.inet_ntop(socket.AF_INET, src[:4])
+                        else:
+                            address = socket.inet_ntop(socket.AF_INET6, src)
+                        sockets.append((protocol, address, sport, inode))
+                        offset += (msg_len + 3) & ~3    # Messages are 4-byte aligned
+    return sockets
+
+# Map socket inodes to owning processes by scanning /proc/<pid>/fd links (e.g. "socket:[12345]")
+# Stops as soon as every wanted inode is found; processes we can't read (not root) are skipped
+@tracing.traced()
+def map_socket_owners(inodes):
+    owners = {}
+    wanted = {f"socket:[{inode}]": inode for inode in inodes}
+    for pid in os.listdir("/proc"):
+        if not wanted:
+            break
+        if not pid.isdigit():
+            continue
+        fd_dir = os.path.join("/proc", pid, "fd")
+        try:
+            for fd in os.listdir(fd_dir):
+                link = os.readlink(os.path.join(fd_dir, fd))
+                if link in wanted:
+                    with open(os.path.join("/proc", pid, "comm"), "r") as comm_file:
+                        owners[wanted.pop(link)] = {"pid": int(pid), "process": comm_file.read().strip()}
+        except OSError:
+            continue
+    return owners
+
+# Linux: Scan open ports from /proc/net (or netlink) and keep the ones in the policy
+@tracing.traced()
+def check_open_ports_linux(policy=None):
+    policy = policy or WATCHED_PORTS
     result = {"os": "Linux", "services": []}
-    # Run the 'ss -tuln' command to list listening TCP/UDP ports
-    output, code = run_command(["ss", "-tuln"])
 
-    # If the command failed, record the error and exit early
-    if code != 0:
-        result["error"] = "\n".join(output)
-        return result
+    # Prefer a netlink dump, fall back to /proc/net if netlink is blocked or unavailable
+    try:
+        sockets = read_netlink_sockets() if USE_NETLINK else read_proc_sockets(PROC_NET_DIR)
+    except OSError:
+        sockets = read_proc_sockets(PROC_NET_DIR)
 
-    # Process each line of the output
-    for line in output:
-        if "LISTEN" in line:
-            parts = line.split()
-            protocol = parts[0]        # e.g. 'tcp'
-            # Get the second-to-last column, which contains the local address
-            local_address = parts[-2]  # e.g. 0.0.0.0:22 or :::3389
-            ip_port = local_address.split(":")
-            # Take the last element of ip_port as port
-            port = ip_port[-1]
-            # ip_port[:-1] is everything except the last element, so excluding the port and just take the IP
-            ip = ":".join(ip_port[:-1]) or "0.0.0.0"    # default to "0.0.0.0" if IP is empty
-
-            if port in ("22", "3389"):
-                result["services"].append({
-                    "protocol": protocol,
-                    "port": int(port),
-                    "bind": ip,
-                    "status": "public" if ip in ["0.0.0.0", "::"] else "private"
-                })
-
-    # If no port 22 or 3389 are open, print message
+    matched = [entry for entry in sockets if entry[2] in policy]
+    owners = map_socket_owners(entry[3] for entry in matched)
+
+    for protocol, ip, port, inode in matched:
+        service = {
+            "protocol": protocol,
+            "port": port,
+            "service": policy[port],
+            "bind": ip,
+            "status": "public" if ip in PUBLIC_BINDS else "private"
+        }
+        service.update(owners.get(inode, {}))
+        result["services"].append(service)
+
+    # If no watched ports are open, print message
     if not result["services"]:
-        result["message"] = "No port 22 or 3389 open"
+        result["message"] = f"No port {' or '.join(str(port) for port in policy)} open"
     return result
 
+# Watch mode: rescan every interval seconds and only print listeners that were not open in the previous scan
+def watch_linux(policy, interval):
+    previous = None
+    while True:
+        services = check_open_ports_linux(policy)["services"]
+        current = {(s["protocol"], s["bind"], s["port"]): s for s in services}
+        if previous is not None:
+            for key in current.keys() - previous.keys():
+                print(json.dumps({"timestamp": datetime.now().isoformat(), "new_listener": current[key]}))
+        previous = current
+        time.sleep(interval)
+
 # Windows: Scan open ports using `netstat`
-def check_open_ports_windows():
+@tracing.traced()
+def check_open_ports_windows(policy=None):
+    policy = policy or WATCHED_PORTS
     result = {"os": "Windows", "services": []}
     # Show all network connections and listening ports
     output, code = run_command(["netstat", "-an"])
@@ -74,22 +219,128 @@ def check_open_ports_windows():
             if ":" in local:
                 # Split from the right side, one time, at the last colon (:)
                 ip, port = local.rsplit(":", 1)
-                if port in ("22", "3389"):
+                ip = ip.strip("[]")     # IPv6 addresses are shown in brackets, e.g. [::]:3389
+                if port.isdigit() and int(port) in policy:
                     result["services"].append({
                         "protocol": "tcp",
                         "port": int(port),
+                        "service": policy[int(port)],
                         "bind": ip,
-                        "status": "public" if ip in ["0.0.0.0", "::"] else "private"
+                        "status": "public" if ip in PUBLIC_BINDS else "private"
                     })
     
-    # If no port 22 or 3389 are open, print message
+    # If no watched ports are open, print message
     if not result["services"]:
-        result["message"] = "No port 22 or 3389 open"
+        result["message"] = f"No port {' or '.join(str(port) for port in policy)} open"
     return result
 
+# Yield every (ip, port) pair to probe, one host at a time so large ranges are never held in memory
+def iter_scan_targets(cidrs, ports):
+    for cidr in cidrs:
+        for ip in ipaddress.ip_network(cidr, strict=False).hosts():
+            for port in ports:
+                yield str(ip), port
+
+# Try a TCP connect and return the time it took in milliseconds, or None if the port is not reachable
+async def probe_port(ip, port, timeout):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return round((loop.time() - start) * 1000, 2)
+
+# Connect-scan all targets with bounded concurrency, a per-connection timeout and a global rate limit
+# on_result is called for every reachable port as soon as it is found, returns the number of probes sent
+async def scan_reachability(cidrs, policy, on_result, concurrency=SCAN_CONCURRENCY, timeout=SCAN_TIMEOUT, rate=SCAN_RATE):
+    loop = asyncio.get_running_loop()
+    targets = iter_scan_targets(cidrs, list(policy))
+    interval = 1.0 / rate
+    schedule = {"next": loop.time(), "probes": 0}
+
+    # Hand out connection start times spaced by interval, sleeping until our slot comes up
+    async def wait_for_slot():
+        now = loop.time()
+        slot = max(now, schedule["next"])
+        schedule["next"] = slot + interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    # Each worker pulls the next target from the shared generator until it runs out
+    async def worker():
+        for ip, port in targets:
+            await wait_for_slot()
+            schedule["probes"] += 1
+            latency = await probe_port(ip, port, timeout)
+            if latency is not None:
+                on_result({"protocol": "tcp", "host": ip, "port": port, "service": policy[port],
+                           "status": "reachable", "latency_ms": latency})
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return schedule["probes"]
+
+# Run the reachability scan and stream results into the JSON output file as they are found
+@tracing.traced(category="network")
+def run_reachability_scan(cidrs, policy, output_file=OUTPUT_FILE, concurrency=SCAN_CONCURRENCY,
+                          timeout=SCAN_TIMEOUT, rate=SCAN_RATE):
+    with open(output_file, "w") as json_file:
+        # Same layout as the local scan: {"timestamp": ..., "result": {..., "services": [...]}}
+        json_file.write("{\n")
+        json_file.write(f'    "timestamp": {json.dumps(datetime.now().isoformat())},\n')
+        json_file.write(f'    "result": {{\n        "mode": "reachability",\n        "targets": {json.dumps(cidrs)},\n')
+        json_file.write('        "services": [')
+        found = []
+
+        def on_result(service):
+            json_file.write(("," if found else "") + "\n            " + json.dumps(service))
+            json_file.flush()
+            found.append(service)
+            print(f"[+] {service['host']}:{service['port']} ({service['service']}) reachable")
+
+        probes = asyncio.run(scan_reachability(cidrs, policy, on_result, concurrency, timeout, rate))
+        json_file.write(f'\n        ],\n        "probes": {probes}\n    }}\n}}\n')
+    return found
+
+# Parse --ports value into a policy, e.g. "22:ssh,3389:rdp,8080" -> {22: "ssh", 3389: "rdp", 8080: "8080"}
+def parse_policy(value):
+    policy = {}
+    for item in value.split(","):
+        port, _, name = item.strip().partition(":")
+        policy[int(port)] = name or port
+    return policy
+
 # Main Execution
 def main():
+    parser = argparse.ArgumentParser(description="Check for exposed RDP/SSH (or other) listening ports")
+    parser.add_argument("--ports", type=parse_policy, default=WATCHED_PORTS, help="port[:service] list, e.g. 22:ssh,3389:rdp")
+    parser.add_argument("--watch", type=float, metavar="SECONDS", help="Linux only: rescan every N seconds and print new listeners")
+    parser.add_argument("--scan", nargs="+", metavar="CIDR", help="TCP connect-scan these ranges instead of checking local sockets")
+    parser.add_argument("--concurrency", type=int, default=SCAN_CONCURRENCY, help="Maximum connections in flight")
+    parser.add_argument("--timeout", type=float, default=SCAN_TIMEOUT, help="Seconds to wait for each connection")
+    parser.add_argument("--rate", type=float, default=SCAN_RATE, help="Maximum new connections per second")
+    args = parser.parse_args()
+
+    if args.scan:
+        found = run_reachability_scan(args.scan, args.ports, OUTPUT_FILE, args.concurrency, args.timeout, args.rate)
+        print(f"Scan complete. {len(found)} reachable port(s). Output saved to {OUTPUT_FILE}")
+        if SAVE_TO_STORE:
+            try:
+                save_records("open_ports", found)
+            except STORE_ERRORS as error:
+                print(f"[!] Scan not saved to the results store: {error}")
+        return
+
     os_type = platform.system()
+    if args.watch and os_type == "Linux":
+        watch_linux(args.ports, args.watch)
+        return
+
     scan_data = {
         "timestamp": datetime.now().isoformat(),
         "result": None
@@ -97,17 +348,24 @@ def main():
 
     # Run the correct scan depending on OS
     if os_type == "Linux":
-        scan_data["result"] = check_open_ports_linux()
+        scan_data["result"] = check_open_ports_linux(args.ports)
     elif os_type == "Windows":
-        scan_data["result"] = check_open_ports_windows()
+        scan_data["result"] = check_open_ports_windows(args.ports)
     else:
         scan_data["error"] = "Unsupported OS"
 
-    # Save results to a JSON file
-    with open("open_port_scan.json", "w") as json_file:
-        json.dump(scan_data, json_file, indent=4)
+    # Save results to a JSON file (first, so a results store problem can't lose the report)
+    if EXPORT_REPORT:
+        with open(OUTPUT_FILE, "w") as json_file:
+            json.dump(scan_data, json_file, indent=4)
+        print(f"Scan complete. Output saved to {OUTPUT_FILE}")
 
-    print("Scan complete. Output saved to open_port_scan.json")
+    if SAVE_TO_STORE and scan_data["result"]:
+        try:
+            save_records("open_ports", scan_data["result"]["services"], collected_at=scan_data["timestamp"])
+            print("Scan saved to the results store")
+        except STORE_ERRORS as error:
+            print(f"[!] Scan not saved to the results store: {error}")
 
 if __name__ == "__main__":
     main()
@@ -28,6 +28,16 @@ from pathlib import Path    # To specify file path
 import platform     # To detect the OS type (Windows, Linux, etc.)
 import socket       # To get hostname and IP
 from datetime import datetime   # For timestamps
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
 
 # Load the .env file explicitly from current directory
 load_dotenv(dotenv_path=Path('.') / 'disk-usage-monitor.env')   # .env file name can be changed
@@ -42,6 +52,7 @@ THRESHOLD_PERCENT = 80  # Alert threshold
 LOG_FILE = 'disk_usage_monitor.log'
 
 # Send alert email using SMTP
+@tracing.traced(category="network")
 def send_email(subject, body):
     msg = EmailMessage()    # Used to format email
     msg['From'] = EMAIL_SENDER
@@ -79,6 +90,7 @@ def get_hostname_ip():
     return hostname, ip
 
 # Main function to check disk usage and send alert if needed
+@tracing.traced()
 def check_disk_usage():
     hostname, ip = get_hostname_ip()
     partitions = psutil.disk_partitions(all=False)  # Get mounted disks
@@ -2,13 +2,26 @@
 
 # This script checks different OS platform for failed login attempts and parses failed login info to .JSON file
 
+import os           # For the size of the log file
 import platform     # Detect the OS type (Windows, Linux, etc.)
 import subprocess   # Run shell commands
 import re           # Match patterns in text
 import json         # Work with JSON files
 from datetime import datetime   # For timestamping
+from report_writer import write_report  # Shared report output (JSON, JSON Lines, compression)
+from results_store import store_records, save_records, STORE_ERRORS   # Shared SQLite results store
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+AUTH_LOG = "/var/log/auth.log"
+# Output format follows the file name, e.g. "failed_login_report.jsonl.gz" for compressed JSON Lines
+OUTPUT_FILE = "failed_login_report.json"
+# Save results to the shared SQLite store (see results_store.py), the report file is an optional export
+SAVE_TO_STORE = True
+EXPORT_REPORT = True
+FAILED_PASSWORD_PATTERN = re.compile(r'^(\S+)\s+\S+\s+sshd\[\d+\]: Failed password for (\w+) from (\d+\.\d+\.\d+\.\d+)')
 
 # Run system command and return output and exit code
+@tracing.traced(category="subprocess")
 def run_command(command, shell=False):
     try:
         # Run the command, capture its output as text
@@ -21,27 +34,34 @@ def run_command(command, shell=False):
 def make_error(message):
     return [{"error": message}]
 
-# Parse Linux failed login attempts from /var/log/auth.log
-def parse_linux_failed_logins():
-    log_path = "/var/log/auth.log"
-    failed_logins = []
-
+# Parse Linux failed login attempts from /var/log/auth.log, one record at a time
+@tracing.traced()
+def iter_linux_failed_logins(log_path=AUTH_LOG):
     try:
-        with open(log_path, "r") as file:
-            for line in file:
-                if "Failed password" in line:
-                    match = re.search(r'^(\S+)\s+\S+\s+sshd\[\d+\]: Failed password for (\w+) from (\d+\.\d+\.\d+\.\d+)', line)
-                    if match:
-                        timestamp = match.group(1)
-                        username = match.group(2)
-                        ip = match.group(3)
-                        failed_logins.append({"timestamp": timestamp, "username": username, "ip": ip})
+        file = open(log_path, "r")
     except FileNotFoundError:
-        return make_error(f"{log_path} not found or inaccessible")
-
-    return failed_logins
+        yield from make_error(f"{log_path} not found or inaccessible")
+        return
+
+    lines = 0
+    with file:
+        for lines, line in enumerate(file, 1):
+            if "Failed password" in line:
+                match = FAILED_PASSWORD_PATTERN.search(line)
+                if match:
+                    timestamp = match.group(1)
+                    username = match.group(2)
+                    ip = match.group(3)
+                    yield {"timestamp": timestamp, "username": username, "ip": ip}
+        tracing.count("bytes_read", os.fstat(file.fileno()).st_size)
+    tracing.count("lines_parsed", lines)
+
+# Parse Linux failed login attempts from /var/log/auth.log into a list
+def parse_linux_failed_logins(log_path=AUTH_LOG):
+    return list(iter_linux_failed_logins(log_path))
 
 # Parse Windows failed login attempts (Event ID 4625)
+@tracing.traced()
 def parse_windows_failed_logins():
     failed_logins = []
     powershell_cmd = (
@@ -85,26 +105,39 @@ def parse_windows_failed_logins():
 def main():
     system = platform.system()
     timestamp = datetime.now().isoformat()
-    # log_data is a dict with "failed_logins" initialized as an empty list (to be filled)
-    log_data = {
+    header = {
         "timestamp": timestamp,
-        "system": system,
-        "failed_logins": []
+        "system": system
     }
 
+    # Linux records are streamed straight from auth.log into the report
     if system == "Linux":
-        log_data["failed_logins"] = parse_linux_failed_logins()
+        failed_logins = iter_linux_failed_logins()
     elif system == "Windows":
-        log_data["failed_logins"] = parse_windows_failed_logins()
+        failed_logins = parse_windows_failed_logins()
     else:
-        log_data["failed_logins"] = make_error(f"Unsupported OS: {system}")
-
-    # Save result to JSON file
-    output_file = "failed_login_report.json"
-    with open(output_file, "w") as json_file:
-        json.dump(log_data, json_file, indent=4)
-
-    print(f"[*] Failed login report saved to: {output_file}")
+        failed_logins = make_error(f"Unsupported OS: {system}")
+
+    # Save result to report file, passing records through the store on the way if both are enabled
+    # A store that can't be opened only costs the store copy, the report is still written
+    if EXPORT_REPORT:
+        if SAVE_TO_STORE:
+            try:
+                failed_logins = store_records("failed_logins", failed_logins, collected_at=timestamp)
+            except STORE_ERRORS as error:
+                print(f"[!] Failed logins not saved to the results store: {error}")
+        try:
+            write_report(OUTPUT_FILE, header, "failed_logins", failed_logins)
+        except ImportError as error:    # Compressor / encoder for OUTPUT_FILE's format is missing
+            print(error)
+            exit(1)
+        print(f"[*] Failed login report saved to: {OUTPUT_FILE}")
+    elif SAVE_TO_STORE:
+        try:
+            count = save_records("failed_logins", failed_logins, collected_at=timestamp)
+            print(f"[*] {count} failed login record(s) saved to the results store")
+        except STORE_ERRORS as error:
+            print(f"[!] Failed logins not saved to the results store: {error}")
 
 if __name__ == "__main__":
     main()
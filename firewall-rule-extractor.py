@@ -1,13 +1,41 @@
 # firewall-rule-extractor.py
 
 # This script extracts firewall rules based on operating system and saves the rules to a JSON file
+# On Linux, iptables rules are also parsed into a structured rule model (chains, protocols, addresses, ports, targets)
+# The rule model can answer "would this packet be accepted?" without reading the rules by hand
+    # e.g. python3 firewall-rule-extractor.py --check-packet --proto tcp --src 10.1.2.3 --dport 443
+# Captured "iptables-save" / "iptables -S" / "nft -j list ruleset" output can be checked instead of the live firewall
+    # e.g. python3 firewall-rule-extractor.py --from-file ruleset.json --check-packet --proto tcp --src 10.1.2.3 --dport 443 --table "inet filter" --chain input
+    # nft chain names are the ones in the ruleset (usually lowercase), iptables ones are uppercase (INPUT, FORWARD, ...)
+# Use --analyze to find rules that earlier rules make unreachable (shadowed / redundant) or partly override (conflicting)
 
 import platform         # Detect the OS type (Windows, Linux, etc.)
 import subprocess       # Run shell or Powershell commands
 import json             # Format and save output as JSON
+import shlex            # Split iptables rule lines like a shell would (handles quoted comments)
+import socket           # Resolve port names (e.g. "ssh") to numbers
+import argparse         # For command line options
+import ipaddress        # Parse CIDR prefixes into integer ranges
+import itertools        # Combinations of remainder fields in the rule analysis
+from bisect import bisect_left, bisect_right    # Binary search in sorted rule index lists
 from datetime import datetime   # For timestamping
+from report_writer import write_report  # Shared report output (JSON, JSON Lines, compression)
+from results_store import save_records, STORE_ERRORS  # Shared SQLite results store
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+# Targets that end rule evaluation
+TERMINAL_TARGETS = {"ACCEPT", "DROP", "REJECT"}
+# Protocol numbers that iptables/nft may print instead of names
+PROTOCOL_NAMES = {"1": "icmp", "6": "tcp", "17": "udp", "58": "ipv6-icmp", "132": "sctp"}
+MAX_JUMP_DEPTH = 50     # Guard against jump loops between user chains
+# Output format follows the file name, e.g. "firewall_rules.json.gz" (see report_writer.py)
+OUTPUT_FILE = "firewall_rules.json"
+# Save results to the shared SQLite store (see results_store.py), the report file is an optional export
+SAVE_TO_STORE = True
+EXPORT_REPORT = True
 
 # Reusable function to run shell commands
+@tracing.traced(category="subprocess")
 def run_command(command, shell=False):
     try:
         # Run the command, capture its output as text
@@ -17,6 +45,7 @@ def run_command(command, shell=False):
         return str(error), 1
 
 # Grab Windows Defender rules via PowerShell
+@tracing.traced()
 def get_windows_firewall_rules():
     cmd = [
         "powershell", "-Command",
@@ -34,6 +63,7 @@ def get_windows_firewall_rules():
         return {"error": output}
 
 # Check UFW rules on Linux
+@tracing.traced()
 def get_ufw_rules():
     output, code = run_command(["ufw", "status", "numbered"])
     if code == 0:
@@ -43,25 +73,712 @@ def get_ufw_rules():
         return {"error": output}
 
 # Check iptables if not using UFW
+@tracing.traced()
 def get_iptables_rules():
     output, code = run_command(["iptables", "-S"])
     if code == 0:
         rule_lines = output.splitlines()
-        return {"firewall_type": "iptables", "rules": rule_lines}
+        return {"firewall_type": "iptables", "rules": rule_lines, "model": parse_ruleset(output)}
     else:
         return {"error": output}
 
+# Parse a port spec into a [low, high] range, e.g. "443" -> [443, 443], "1024:65535" -> [1024, 65535]
+def parse_port_range(value):
+    low, sep, high = value.partition(":")
+    low = resolve_port(low) if low else 0
+    high = (resolve_port(high) if high else 65535) if sep else low
+    return [low, high]
+
+# Turn a port number or service name into a number
+def resolve_port(value):
+    return int(value) if value.isdigit() else socket.getservbyname(value)
+
+# Add a chain to a table in the model (policy is None for user-defined chains)
+def add_chain(model, table, chain, policy=None):
+    chains = model["tables"].setdefault(table, {})
+    if chain not in chains:
+        chains[chain] = {"policy": policy, "rules": []}
+    elif policy:
+        chains[chain]["policy"] = policy
+    return chains[chain]
+
+# Parse one "-A CHAIN ..." rule into a rule dict
+# Fields left as None match anything, field names in "negated" are "!" matches
+def parse_iptables_rule(tokens, table, raw):
+    rule = {
+        "table": table, "chain": tokens[1], "protocols": None, "sources": None, "destinations": None,
+        "sport": None, "dport": None, "in_interface": None, "out_interface": None, "states": None,
+        "negated": [], "target": None, "goto": False, "target_options": [], "comment": None,
+        "extra": [], "raw": raw
+    }
+    negate = False
+    i = 2
+    while i < len(tokens):
+        option = tokens[i]
+        value = tokens[i + 1] if i + 1 < len(tokens) else None
+        i += 2
+        field = None
+
+        if option == "!":
+            negate = True
+            i -= 1
+            continue
+        elif option in ("-p", "--protocol"):
+            field, parsed = "protocols", None if value == "all" else [PROTOCOL_NAMES.get(value, value.lower())]
+        elif option in ("-s", "--source", "--src"):
+            field, parsed = "sources", value.split(",")
+        elif option in ("-d", "--destination", "--dst"):
+            field, parsed = "destinations", value.split(",")
+        elif option in ("-i", "--in-interface"):
+            field, parsed = "in_interface", value
+        elif option in ("-o", "--out-interface"):
+            field, parsed = "out_interface", value
+        elif option in ("--dport", "--destination-port", "--dports", "--destination-ports"):
+            field, parsed = "dport", [parse_port_range(port) for port in value.split(",")]
+        elif option in ("--sport", "--source-port", "--sports", "--source-ports"):
+            field, parsed = "sport", [parse_port_range(port) for port in value.split(",")]
+        elif option in ("--state", "--ctstate") and not negate:
+            field, parsed = "states", value.upper().split(",")
+        elif option in ("-m", "--match"):
+            continue    # Match modules are implied by their options
+        elif option == "--comment":
+            rule["comment"] = value
+            continue
+        elif option in ("-j", "--jump", "-g", "--goto"):
+            rule["target"] = value
+            rule["goto"] = option in ("-g", "--goto")
+            rule["target_options"] = tokens[i:]     # Anything after the target belongs to it (e.g. --reject-with)
+            break
+        else:
+            # Match we don't model (e.g. -m limit, -m recent), kept with its arguments
+            rule["extra"].append(("! " if negate else "") + option)
+            i -= 1
+            while i < len(tokens) and not tokens[i].startswith("-") and tokens[i] != "!":
+                rule["extra"].append(tokens[i])
+                i += 1
+            negate = False
+            continue
+
+        rule[field] = parsed
+        if negate:
+            rule["negated"].append(field)
+        negate = False
+    return rule
+
+# Parse "iptables-save" or "iptables -S" output into a rule model:
+# {"tables": {table: {chain: {"policy": "ACCEPT" or None, "rules": [rule, ...]}}}}
+def parse_iptables(output):
+    model = {"source": "iptables", "tables": {}}
+    table = "filter"    # "iptables -S" only lists the filter table and has no "*table" lines
+    for line in output.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line == "COMMIT":
+            continue
+        if line.startswith("*"):
+            table = line[1:]
+            model["tables"].setdefault(table, {})
+        elif line.startswith(":"):
+            # iptables-save chain header, e.g. ":INPUT DROP [0:0]" or ":MYCHAIN - [0:0]"
+            chain, policy = line[1:].split()[:2]
+            add_chain(model, table, chain, None if policy == "-" else policy)
+        else:
+            tokens = shlex.split(line)
+            if tokens[0] == "-P":
+                add_chain(model, table, tokens[1], tokens[2])
+            elif tokens[0] == "-N":
+                add_chain(model, table, tokens[1])
+            elif tokens[0] == "-A":
+                rule = parse_iptables_rule(tokens, table, line)
+                chain = add_chain(model, table, rule["chain"])
+                rule["position"] = len(chain["rules"]) + 1
+                chain["rules"].append(rule)
+    return model
+
+# Convert an nft JSON value (plain value, prefix, range, set or list) into a list of plain values
+# Ranges become (low, high) tuples; flag matches like "ct state established,related" are plain JSON lists
+def nft_values(right):
+    if isinstance(right, dict) and "set" in right:
+        right = right["set"]
+    if isinstance(right, list):
+        values = []
+        for item in right:
+            values.extend(nft_values(item))
+        return values
+    if isinstance(right, dict) and "prefix" in right:
+        return [f"{right['prefix']['addr']}/{right['prefix']['len']}"]
+    if isinstance(right, dict) and "range" in right:
+        return [tuple(right["range"])]
+    return [right]
+
+# Turn one nft match into (rule field, parsed value), or (None, None) if it isn't one the model handles
+# Raises ValueError / TypeError / OSError for values that can't be parsed (e.g. an unknown port name)
+def parse_nft_match(left, values, op):
+    if "payload" in left:
+        name = left["payload"].get("field")
+        if name in ("saddr", "daddr"):
+            addresses = [v if isinstance(v, str) else "-".join(v) for v in values]
+            for address in addresses:
+                address_interval(address)   # Raises ValueError for anything that isn't an address, prefix or range
+            return ("sources" if name == "saddr" else "destinations"), addresses
+        if name in ("sport", "dport"):
+            return name, [[resolve_port(str(v[0])), resolve_port(str(v[1]))] if isinstance(v, tuple)
+                          else [resolve_port(str(v))] * 2 for v in values]
+        if name in ("protocol", "nexthdr"):     # "ip protocol tcp" / "ip6 nexthdr tcp"
+            return "protocols", [PROTOCOL_NAMES.get(str(v), str(v)) for v in values]
+    elif "meta" in left and left["meta"].get("key") == "l4proto":
+        return "protocols", [PROTOCOL_NAMES.get(str(v), str(v)) for v in values]
+    elif "meta" in left and left["meta"].get("key") in ("iifname", "oifname") and len(values) == 1:
+        field = "in_interface" if left["meta"]["key"] == "iifname" else "out_interface"
+        return field, str(values[0]).replace("*", "+")     # nft wildcard "eth*" is "eth+" in iptables
+    elif "ct" in left and left["ct"].get("key") == "state" and op != "!=":
+        return "states", [str(v).upper() for v in values]
+    return None, None
+
+# Parse one nft JSON rule into the same rule dict as parse_iptables_rule()
+def parse_nft_rule(nft_rule, table):
+    rule = {
+        "table": table, "chain": nft_rule["chain"], "protocols": None, "sources": None, "destinations": None,
+        "sport": None, "dport": None, "in_interface": None, "out_interface": None, "states": None,
+        "negated": [], "target": None, "goto": False, "target_options": [], "comment": nft_rule.get("comment"),
+        "extra": [], "handle": nft_rule.get("handle"), "raw": json.dumps(nft_rule["expr"])
+    }
+    for expr in nft_rule.get("expr", []):
+        if "match" in expr:
+            left, right, op = expr["match"]["left"], expr["match"]["right"], expr["match"].get("op", "==")
+            values = nft_values(right)
+            field = None
+            # "in" is set membership (e.g. ct state in a list of flags), same as "==" against a set
+            # Named sets ("@allowed") and comparisons like "<" are not modelled and kept as extra matches
+            if op in ("==", "!=", "in") and not any(isinstance(v, str) and v.startswith("@") for v in values):
+                try:
+                    field, parsed = parse_nft_match(left, values, op)
+                except (ValueError, TypeError, OSError):
+                    field = None
+
+            # "tcp dport 22" also implies the protocol, even when the port itself is kept as an extra match ("tcp dport @ports")
+            protocol = left.get("payload", {}).get("protocol")
+            if rule["protocols"] is None and protocol in ("tcp", "udp", "sctp") and field != "protocols":
+                rule["protocols"] = [protocol]
+
+            if field is None:
+                rule["extra"].append(json.dumps(expr))
+                continue
+            rule[field] = parsed
+            if op == "!=":
+                rule["negated"].append(field)
+        elif "accept" in expr:
+            rule["target"] = "ACCEPT"
+        elif "drop" in expr:
+            rule["target"] = "DROP"
+        elif "reject" in expr:
+            rule["target"] = "REJECT"
+        elif "return" in expr:
+            rule["target"] = "RETURN"
+        elif "jump" in expr or "goto" in expr:
+            rule["goto"] = "goto" in expr
+            rule["target"] = (expr.get("jump") or expr.get("goto"))["target"]
+        elif "log" in expr and rule["target"] is None:
+            rule["target"] = "LOG"
+        elif "counter" not in expr:
+            rule["extra"].append(json.dumps(expr))
+    return rule
+
+# Parse "nft -j list ruleset" output into the same rule model as parse_iptables()
+# Tables are named "family table" (e.g. "inet filter") since nft tables are per address family
+def parse_nft(output):
+    model = {"source": "nftables", "tables": {}}
+    for item in json.loads(output).get("nftables", []):
+        if "table" in item:
+            model["tables"].setdefault(f"{item['table']['family']} {item['table']['name']}", {})
+        elif "chain" in item:
+            chain = item["chain"]
+            add_chain(model, f"{chain['family']} {chain['table']}", chain["name"],
+                      chain.get("policy", "accept").upper() if "hook" in chain else None)
+        elif "rule" in item:
+            table = f"{item['rule']['family']} {item['rule']['table']}"
+            rule = parse_nft_rule(item["rule"], table)
+            chain = add_chain(model, table, rule["chain"])
+            rule["position"] = len(chain["rules"]) + 1
+            chain["rules"].append(rule)
+    return model
+
+# Parse captured firewall output, JSON means nft, anything else is iptables text
+@tracing.traced()
+def parse_ruleset(text):
+    tracing.count("bytes_read", len(text))
+    return parse_nft(text) if text.lstrip().startswith("{") else parse_iptables(text)
+
+# Convert an address ("10.0.0.0/8", "10.1.2.3" or "10.0.0.1-10.0.0.9") into (version, low, high, prefix length)
+# Prefix length is None for ranges that are not a single prefix
+def address_interval(value):
+    if "-" in value:
+        low, high = (ipaddress.ip_address(part.strip()) for part in value.split("-", 1))
+        return low.version, int(low), int(high), None
+    network = ipaddress.ip_network(value, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address), network.prefixlen
+
+# Check if an iptables interface pattern matches a name ("eth+" matches any name starting with "eth")
+def interface_matches(pattern, name):
+    if pattern.endswith("+"):
+        return name.startswith(pattern[:-1])
+    return pattern == name
+
+# Append rule index to the list under key, skipping duplicates (a rule can list the same key twice)
+def index_append(index, key, position):
+    bucket = index.setdefault(key, [])
+    if not bucket or bucket[-1] != position:
+        bucket.append(position)
+
+# Build a lookup index for one chain
+# Every dimension (protocol, source, destination, destination port) keeps sorted lists of rule
+# indices; rules that don't constrain a dimension (or negate it) go into that dimension's "any" list
+def compile_chain(rules):
+    compiled = []
+    protocol_index, protocol_any = {}, []
+    address_indexes = {"sources": ({}, [], []), "destinations": ({}, [], [])}   # (prefix dict, range rules, any)
+    port_exact, port_ranges, port_any = {}, [], []
+
+    for position, rule in enumerate(rules):
+        negated = set(rule["negated"])
+        entry = {
+            "rule": rule,
+            "negated": negated,
+            "sources": [address_interval(a) for a in rule["sources"]] if rule["sources"] else None,
+            "destinations": [address_interval(a) for a in rule["destinations"]] if rule["destinations"] else None
+        }
+        compiled.append(entry)
+
+        if rule["protocols"] and "protocols" not in negated:
+            for protocol in rule["protocols"]:
+                index_append(protocol_index, protocol, position)
+        else:
+            protocol_any.append(position)
+
+        # Prefixes are keyed by (version, prefix length) then network number, like a flattened prefix tree
+        for field, (prefixes, ranges, any_list) in address_indexes.items():
+            if entry[field] is None or field in negated:
+                any_list.append(position)
+                continue
+            for version, low, high, prefix_len in entry[field]:
+                if prefix_len is None:
+                    ranges.append((version, low, high, position))
+                else:
+                    index_append(prefixes.setdefault((version, prefix_len), {}), low, position)
+
+        if rule["dport"] is None or "dport" in negated:
+            port_any.append(position)
+        else:
+            for low, high in rule["dport"]:
+                if low == high:
+                    index_append(port_exact, low, position)
+                elif low == 0 and high == 65535:
+                    if not port_any or port_any[-1] != position:
+                        port_any.append(position)
+                else:
+                    port_ranges.append((low, high, position))
+
+    # Turn port ranges into non-overlapping segments, each with the sorted rules covering it (interval index)
+    bounds = sorted({low for low, _, _ in port_ranges} | {high + 1 for _, high, _ in port_ranges})
+    segments = [[] for _ in bounds]
+    for low, high, position in port_ranges:
+        for segment in range(bisect_left(bounds, low), bisect_left(bounds, high + 1)):
+            segments[segment].append(position)
+    segments = [sorted(set(segment)) for segment in segments]
+
+    return {
+        "rules": compiled,
+        "protocols": (protocol_index, protocol_any),
+        "addresses": address_indexes,
+        "ports": (port_exact, bounds, segments, port_any)
+    }
+
+# Collect the sorted rule index lists that could match the packet in each dimension
+# A rule can only match if it appears in at least one list of every dimension
+def candidate_lists(compiled, packet):
+    protocol_index, protocol_any = compiled["protocols"]
+    dimensions = [[protocol_any] + ([protocol_index[packet["protocol"]]] if packet.get("protocol") in protocol_index else [])]
+
+    for field, key in (("sources", "source"), ("destinations", "destination")):
+        prefixes, ranges, any_list = compiled["addresses"][field]
+        lists = [any_list]
+        if packet.get(key):
+            address = ipaddress.ip_address(packet[key])
+            value, bits = int(address), address.max_prefixlen
+            for (version, prefix_len), networks in prefixes.items():
+                if version == address.version:
+                    network = value >> (bits - prefix_len) << (bits - prefix_len)
+                    if network in networks:
+                        lists.append(networks[network])
+            lists.append(sorted(p for v, low, high, p in ranges if v == address.version and low <= value <= high))
+        dimensions.append(lists)
+
+    port_exact, bounds, segments, port_any = compiled["ports"]
+    lists = [port_any]
+    if packet.get("dport") is not None:
+        if packet["dport"] in port_exact:
+            lists.append(port_exact[packet["dport"]])
+        segment = bisect_right(bounds, packet["dport"]) - 1
+        if segment >= 0 and segments[segment]:
+            lists.append(segments[segment])
+    dimensions.append(lists)
+
+    # Most selective dimension first, so it drives the search and the others only confirm
+    return sorted(dimensions, key=lambda lists: sum(len(rule_list) for rule_list in lists))
+
+# Smallest rule index >= start found in any of the lists (None if there is none)
+def seek(lists, start):
+    best = None
+    for rule_list in lists:
+        found = bisect_left(rule_list, start)
+        if found < len(rule_list) and (best is None or rule_list[found] < best):
+            best = rule_list[found]
+    return best
+
+# Check every field of a rule against the packet
+# Packet fields that are not given don't satisfy rules that constrain them
+def rule_matches(entry, packet):
+    rule, negated = entry["rule"], entry["negated"]
+
+    def check(field, matched):
+        return (not matched) if field in negated else matched
+
+    if rule["protocols"] and not check("protocols", packet.get("protocol") in rule["protocols"]):
+        return False
+    for field, key in (("sources", "source"), ("destinations", "destination")):
+        if entry[field] is not None:
+            matched = False
+            if packet.get(key):
+                address = ipaddress.ip_address(packet[key])
+                matched = any(v == address.version and low <= int(address) <= high for v, low, high, _ in entry[field])
+            if not check(field, matched):
+                return False
+    for field in ("sport", "dport"):
+        if rule[field] is not None:
+            value = packet.get(field)
+            matched = value is not None and any(low <= value <= high for low, high in rule[field])
+            if not check(field, matched):
+                return False
+    for field in ("in_interface", "out_interface"):
+        if rule[field] is not None:
+            matched = bool(packet.get(field)) and interface_matches(rule[field], packet[field])
+            if not check(field, matched):
+                return False
+    if rule["states"] is not None and packet.get("state", "NEW") not in rule["states"]:
+        return False
+    return True
+
+# Find the first rule at or after start that matches the packet
+# Leapfrog search: jump to the next index every dimension agrees on, then verify the full rule
+def next_match(compiled, packet, start=0, dimensions=None):
+    dimensions = dimensions or candidate_lists(compiled, packet)
+    position = start
+    while True:
+        agreed = True
+        for lists in dimensions:
+            found = seek(lists, position)
+            if found is None:
+                return None
+            if found != position:
+                position, agreed = found, False
+                break
+        if agreed:
+            if rule_matches(compiled["rules"][position], packet):
+                return position
+            position += 1
+
+# Compile every chain in the model (do this once, then call evaluate_packet as often as needed)
+@tracing.traced()
+def compile_model(model):
+    compiled = {}
+    for table, chains in model["tables"].items():
+        for chain, chain_data in chains.items():
+            compiled[(table, chain)] = compile_chain(chain_data["rules"])
+    return compiled
+
+# Walk a chain for the packet, following jumps into user chains
+# Returns the terminal verdict dict, or None if the packet fell off the end / hit RETURN
+def walk_chain(model, compiled, table, chain, packet, trace, depth=0):
+    if depth > MAX_JUMP_DEPTH or (table, chain) not in compiled:
+        return None
+    chain_index = compiled[(table, chain)]
+    dimensions = candidate_lists(chain_index, packet)
+    position = next_match(chain_index, packet, 0, dimensions)
+    while position is not None:
+        rule = chain_index["rules"][position]["rule"]
+        trace.append({"chain": chain, "position": rule["position"], "target": rule["target"], "raw": rule["raw"]})
+        target = rule["target"]
+        if target in TERMINAL_TARGETS:
+            return {"verdict": target, "table": table, "chain": chain, "position": rule["position"], "raw": rule["raw"]}
+        if target == "RETURN":
+            return None
+        if target in model["tables"][table]:
+            verdict = walk_chain(model, compiled, table, target, packet, trace, depth + 1)
+            if verdict or rule["goto"]:
+                return verdict
+        # Non-terminal targets (LOG, MARK, ...) and chains that returned continue with the next rule
+        position = next_match(chain_index, packet, position + 1, dimensions)
+    return None
+
+# Decide what the firewall does with a packet, e.g.
+# evaluate_packet(model, {"protocol": "tcp", "source": "10.1.2.3", "dport": 443}) -> {"verdict": "ACCEPT", ...}
+# Rules with matches the model doesn't understand ("extra") are assumed to match and flagged as approximate
+def evaluate_packet(model, packet, chain="INPUT", table=None, compiled=None):
+    compiled = compiled or compile_model(model)
+    if table is None:
+        # Default to the first table that has the chain (e.g. "filter" or "inet filter")
+        table = next((name for name, chains in model["tables"].items() if chain in chains), None)
+    if table not in model["tables"] or chain not in model["tables"][table]:
+        return {"error": f"Chain {chain} not found" + (f" in table {table}" if table else "")}
+
+    trace = []
+    verdict = walk_chain(model, compiled, table, chain, packet, trace)
+    if verdict is None:
+        verdict = {"verdict": model["tables"][table][chain]["policy"] or "ACCEPT", "table": table, "chain": chain, "position": None, "raw": "policy"}
+    verdict["matched_rules"] = trace
+    verdict["approximate"] = any(compiled[(table, step["chain"])]["rules"][step["position"] - 1]["rule"]["extra"] for step in trace)
+    return verdict
+
+# Add [low, high] to a sorted list of disjoint intervals, merging neighbours
+def interval_add(intervals, low, high):
+    start = bisect_left(intervals, [low, low])
+    # Step back if the previous interval touches or overlaps the new one
+    if start > 0 and intervals[start - 1][1] >= low - 1:
+        start -= 1
+    end = start
+    while end < len(intervals) and intervals[end][0] <= high + 1:
+        low, high = min(low, intervals[end][0]), max(high, intervals[end][1])
+        end += 1
+    intervals[start:end] = [[low, high]]
+
+# Merge several interval lists into one sorted list of disjoint intervals
+def interval_union(interval_lists):
+    merged = []
+    for low, high in sorted(interval for intervals in interval_lists for interval in intervals):
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+# Check if [low, high] is fully inside a merged interval list
+def interval_covers(intervals, low, high):
+    found = bisect_right(intervals, [low, float("inf")]) - 1
+    return found >= 0 and intervals[found][0] <= low and high <= intervals[found][1]
+
+# Check if [low, high] overlaps any interval in a merged interval list
+def interval_overlaps(intervals, low, high):
+    found = bisect_right(intervals, [high, float("inf")]) - 1
+    return found >= 0 and intervals[found][1] >= low
+
+# Check if [low, high] is covered by the union of several merged interval lists
+# Usually one list covers it on its own; otherwise only the intervals overlapping [low, high] are merged
+def interval_lists_cover(interval_lists, low, high):
+    if any(interval_covers(intervals, low, high) for intervals in interval_lists):
+        return True
+    if len(interval_lists) < 2:
+        return False
+    pieces = []
+    for intervals in interval_lists:
+        start = max(bisect_right(intervals, [low, float("inf")]) - 1, 0)
+        pieces.append(intervals[start:bisect_right(intervals, [high, float("inf")])])
+    return interval_covers(interval_union(pieces), low, high)
+
+# Everything about a rule that isn't protocol, address or destination port, as a hashable tuple
+# None parts match anything; a rule whose parts are all None or equal to ours covers us on these fields
+def rule_remainder(rule, with_extra=True):
+    return (
+        tuple(tuple(port) for port in rule["sport"]) if rule["sport"] else None,
+        rule["in_interface"],
+        rule["out_interface"],
+        tuple(sorted(rule["states"])) if rule["states"] else None,
+        tuple(rule["extra"]) if rule["extra"] and with_extra else None
+    )
+
+# Remainders already seen that match every packet this remainder matches
+# A covering remainder has each field either equal or None (any), so at most 2^5 set lookups instead of a scan
+def covering_remainders(remainder, remainders):
+    candidates = set(itertools.product(*((value, None) for value in remainder)))
+    return [candidate for candidate in candidates if candidate in remainders]
+
+# Address prefixes of a rule field as (version, network, prefix length), [None] means any address
+# Returns None if the field uses ranges that aren't prefixes (those rules are left out of the analysis)
+def rule_prefixes(rule, field):
+    if not rule[field]:
+        return [None]
+    prefixes = []
+    for value in rule[field]:
+        version, low, _, prefix_len = address_interval(value)
+        if prefix_len is None:
+            return None
+        prefixes.append((version, low, prefix_len))
+    return prefixes
+
+# All prefixes already seen in the chain that contain this prefix (plus None for "any address")
+# prefix_lengths holds the prefix lengths seen per IP version, so this is at most one lookup per length
+def covering_prefixes(prefix, prefix_lengths):
+    if prefix is None:
+        return [None]
+    version, network, length = prefix
+    bits = 32 if version == 4 else 128
+    covering = [None]
+    for seen_length in prefix_lengths.get(version, ()):
+        if seen_length <= length:
+            shift = bits - seen_length
+            covering.append((version, network >> shift << shift, seen_length))
+    return covering
+
+# Find shadowed, redundant and conflicting rules in one chain
+# Earlier rules are stored as destination port interval sets, grouped by (protocol, source prefix,
+# destination prefix, remainder) and verdict. A later rule is unreachable if its port range is covered by
+# the union of the groups that contain it, so each rule is checked with a binary search per group instead of
+# against every earlier rule. Rules without a port match use the extra point -1 ("no port") plus 0-65535.
+def analyze_chain(rules):
+    groups = {}             # (protocol, source, destination, remainder) -> {verdict: intervals}
+    remainders = set()      # Distinct remainders seen, usually only a handful
+    prefix_lengths = {"sources": {}, "destinations": {}}
+    findings = {"shadowed": [], "redundant": [], "conflicting": []}
+
+    for rule in rules:
+        verdict = rule["target"]
+        protocols = rule["protocols"] or [None]
+        sources = rule_prefixes(rule, "sources")
+        destinations = rule_prefixes(rule, "destinations")
+        # Without a port match TCP/UDP rules match every port, other protocols also match portless packets
+        if rule["dport"]:
+            ports = rule["dport"]
+        elif rule["protocols"] and all(p in ("tcp", "udp", "sctp") for p in rule["protocols"]):
+            ports = [[0, 65535]]
+        else:
+            ports = [[-1, 65535]]
+        # Negated matches and non-prefix ranges are not modelled as sets, so those rules are skipped
+        if rule["negated"] or sources is None or destinations is None:
+            continue
+
+        # Our packets are a subset of the same rule without its unmodelled matches, so compare on that
+        remainder = rule_remainder(rule, with_extra=False)
+        key_remainders = covering_remainders(remainder, remainders)
+
+        covered_all = covered_same = True
+        overlap_targets = set()
+        for protocol in protocols:
+            for source in sources:
+                for destination in destinations:
+                    same, other = [], []
+                    for key_protocol in {protocol, None}:
+                        for key_source in covering_prefixes(source, prefix_lengths["sources"]):
+                            for key_destination in covering_prefixes(destination, prefix_lengths["destinations"]):
+                                for key_remainder in key_remainders:
+                                    for seen_verdict, intervals in groups.get((key_protocol, key_source, key_destination, key_remainder), {}).items():
+                                        (same if seen_verdict == verdict else other).append(intervals)
+                                        if seen_verdict != verdict and any(interval_overlaps(intervals, low, high) for low, high in ports):
+                                            overlap_targets.add(seen_verdict)
+                    for low, high in ports:
+                        covered_same = covered_same and interval_lists_cover(same, low, high)
+                        covered_all = covered_all and interval_lists_cover(same + other, low, high)
+
+        summary = {"position": rule["position"], "target": verdict, "raw": rule["raw"]}
+        if covered_same:
+            findings["redundant"].append(summary)
+        elif covered_all:
+            findings["shadowed"].append(dict(summary, covered_by_targets=sorted(overlap_targets)))
+        elif overlap_targets and not rule["extra"]:
+            # Unmodelled matches may never overlap the other rules, so those rules aren't reported as conflicting
+            findings["conflicting"].append(dict(summary, overlaps_targets=sorted(overlap_targets)))
+
+        # Only rules that end evaluation for the packets they match hide later rules
+        if verdict not in TERMINAL_TARGETS and verdict != "RETURN":
+            continue
+        if rule["extra"]:
+            continue    # Unmodelled matches may not match, so this rule can't be trusted to cover anything
+        remainder = rule_remainder(rule)
+        remainders.add(remainder)
+        for field, prefixes in (("sources", sources), ("destinations", destinations)):
+            for prefix in prefixes:
+                if prefix is not None:
+                    lengths = prefix_lengths[field].setdefault(prefix[0], [])
+                    if prefix[2] not in lengths:
+                        lengths.append(prefix[2])
+        for protocol in protocols:
+            for source in sources:
+                for destination in destinations:
+                    intervals = groups.setdefault((protocol, source, destination, remainder), {}).setdefault(verdict, [])
+                    for low, high in ports:
+                        interval_add(intervals, low, high)
+
+    # Shadowed and redundant rules never match anything, so they can be removed
+    findings["removable"] = sorted(item["position"] for item in findings["shadowed"] + findings["redundant"])
+    return findings
+
+# Analyze every chain in a rule model (e.g. get_iptables_rules()["model"])
+@tracing.traced()
+def analyze_model(model):
+    analysis = {}
+    for table, chains in model["tables"].items():
+        for chain, chain_data in chains.items():
+            findings = analyze_chain(chain_data["rules"])
+            if findings["removable"] or findings["conflicting"]:
+                analysis.setdefault(table, {})[chain] = findings
+    return analysis
+
+# Records to save in the results store: parsed rules if there is a model, otherwise the raw rules
+def store_rule_records(firewall):
+    if "model" in firewall:
+        for chains in firewall["model"]["tables"].values():
+            for chain_data in chains.values():
+                yield from chain_data["rules"]
+    else:
+        for rule in firewall.get("rules", []):
+            # Windows rules are already dicts, UFW rules are text lines
+            yield rule if isinstance(rule, dict) else {"raw": rule}
+
 # Main function to run the logic
 def main():
+    parser = argparse.ArgumentParser(description="Extract firewall rules, or check how a packet would be handled")
+    parser.add_argument("--from-file", help="Parse captured iptables-save / iptables -S / nft -j output instead of the live firewall")
+    parser.add_argument("--check-packet", action="store_true", help="Evaluate a packet against the iptables/nft rules")
+    parser.add_argument("--analyze", action="store_true", help="Report shadowed, redundant and conflicting rules")
+    parser.add_argument("--proto", default="tcp")
+    parser.add_argument("--src")
+    parser.add_argument("--dst")
+    parser.add_argument("--sport", type=int)
+    parser.add_argument("--dport", type=int)
+    parser.add_argument("--in-interface")
+    parser.add_argument("--out-interface")
+    parser.add_argument("--state", default="NEW")
+    parser.add_argument("--chain", default="INPUT")
+    parser.add_argument("--table")
+    args = parser.parse_args()
+
+    if args.check_packet:
+        if args.from_file:
+            with open(args.from_file, "r") as rules_file:
+                model = parse_ruleset(rules_file.read())
+        else:
+            model = get_iptables_rules().get("model", {"tables": {}})
+        packet = {
+            "protocol": args.proto.lower(), "source": args.src, "destination": args.dst, "sport": args.sport,
+            "dport": args.dport, "in_interface": args.in_interface, "out_interface": args.out_interface,
+            "state": args.state.upper()
+        }
+        verdict = evaluate_packet(model, packet, args.chain, args.table)
+        print(json.dumps(verdict, indent=4))
+        if "error" in verdict:
+            exit(1)
+        return
+
     system = platform.system()
     firewall_data = {
         "timestamp": datetime.now().isoformat(),
-        "os": system
+        "os": system,
         "firewall": None
     }
 
     # Match system type then initialize "firewall" and assign with firewall rules
-    if system == "Windows":
+    if args.from_file:
+        with open(args.from_file, "r") as rules_file:
+            text = rules_file.read()
+        firewall_data["firewall"] = {"firewall_type": "file", "rules": text.splitlines(), "model": parse_ruleset(text)}
+    elif system == "Windows":
         firewall_data["firewall"] = get_windows_firewall_rules()
     elif system == "Linux":
         which_ufw, code = run_command(["which", "ufw"])     # Check if ufw path exists
@@ -72,11 +789,30 @@ def main():
     else:
         firewall_data["error"] = "Unsupported operating system"
 
-    # Save to JSON log file
-    with open("firewall_rules.json", "w") as json_file:
-        json.dump(firewall_data, json_file, indent=4)
+    # Add shadowed / redundant / conflicting rule analysis if rules were parsed into a model
+    if args.analyze and firewall_data["firewall"] and "model" in firewall_data["firewall"]:
+        analysis = analyze_model(firewall_data["firewall"]["model"])
+        firewall_data["firewall"]["analysis"] = analysis
+        for table, chains in analysis.items():
+            for chain, findings in chains.items():
+                print(f"[*] {table} {chain}: {len(findings['shadowed'])} shadowed, {len(findings['redundant'])} redundant, "
+                      f"{len(findings['conflicting'])} conflicting, removable rules: {findings['removable']}")
+
+    # Save to report file (first, so a results store problem can't lose the report)
+    if EXPORT_REPORT:
+        try:
+            write_report(OUTPUT_FILE, firewall_data)
+        except ImportError as error:    # Compressor / encoder for OUTPUT_FILE's format is missing
+            print(error)
+            exit(1)
+        print(f"Firewall rules extracted and saved to {OUTPUT_FILE}")
 
-    print("Firewall rules extracted and saved to firewall_rules.json")
+    if SAVE_TO_STORE and firewall_data["firewall"]:
+        try:
+            count = save_records("firewall_rules", store_rule_records(firewall_data["firewall"]), collected_at=firewall_data["timestamp"])
+            print(f"{count} firewall rule(s) saved to the results store")
+        except STORE_ERRORS as error:
+            print(f"[!] Firewall rules not saved to the results store: {error}")
 
 if __name__ == "__main__":
     main()
@@ -6,10 +6,19 @@
 import psutil       # External library for CPU, RAM, disk, and uptime
 import platform     # Access OS, architecture, CPU info
 import socket       # Get hostname and IP info
-import json         # Used to write output in .json format
 from datetime import datetime   # For timestamping
+from report_writer import write_report  # Shared report output (JSON, JSON Lines, compression)
+from results_store import save_records, STORE_ERRORS  # Shared SQLite results store
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+# Output format follows the file name, e.g. "system_inventory.json.gz" (see report_writer.py)
+OUTPUT_FILE = "system_inventory.json"
+# Save results to the shared SQLite store (see results_store.py), the report file is an optional export
+SAVE_TO_STORE = True
+EXPORT_REPORT = True
 
 # Function to Collect all system info
+@tracing.traced()
 def get_system_info():
     info = {}
     info["timestamp"] = datetime.now().isoformat()
@@ -43,8 +52,18 @@ def get_system_info():
 if __name__ == "__main__":
     data = get_system_info()
 
-    # Output to JSON file
-    with open("system_inventory.json", "w") as json_file:
-        json.dump(data, json_file, indent=4)
+    # Output to report file (first, so a results store problem can't lose the report)
+    if EXPORT_REPORT:
+        try:
+            write_report(OUTPUT_FILE, data)
+        except ImportError as error:    # Compressor / encoder for OUTPUT_FILE's format is missing
+            print(error)
+            exit(1)
+        print(f"System inventory collected. Saved to {OUTPUT_FILE}.")
 
-    print("System inventory collected. Saved to system_inventory.json.")
+    if SAVE_TO_STORE:
+        try:
+            save_records("system_inventory", [data], data["hostname"], data["timestamp"])
+            print("System inventory saved to the results store.")
+        except STORE_ERRORS as error:
+            print(f"[!] System inventory not saved to the results store: {error}")
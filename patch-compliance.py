@@ -3,19 +3,54 @@
 # This script checks if there are updates available on current operating system and performs system update
 # Some Linux package(s) won't be updated due to phasing (meaning Linux is delaying updates to be rolled out in phases)
 # Script will show phasing package(s) and phase warning if phasing exists
+# On Linux, if a local advisory feed file exists, installed packages are matched against it and
+# known-vulnerable packages are listed in the report, ranked by severity
 
+# Advisory feed format (JSON list), "introduced" is inclusive and "fixed" is exclusive, either can be left out:
+    # [{"id": "DSA-5532-1", "package": "openssl", "severity": "high",
+    #   "affected": [{"introduced": "3.0.0", "fixed": "3.0.11-1~deb12u2"}]}]
+
+import os           # Module for file path checks
+import re           # Module to parse apt simulation output
+import json         # Module to load the advisory feed
+import time         # Module to check package list age
 import platform     # Module for detecting OS type (Windows, Linux, etc.)
 import subprocess   # Module to run system commands
+from functools import lru_cache     # To cache parsed package versions
 from datetime import datetime   # For timestamping
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
+
+ADVISORY_FEED = "advisories.json"   # Local advisory feed file (can be changed to any path)
+# Severity ranking used to sort matched advisories, unknown severities sort last
+SEVERITY_RANK = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+APT_GET = "apt-get"     # apt-get command (can be pointed at a stand-in script for testing)
+APT_MARK = "apt-mark"   # apt-mark command (same)
+APT_LISTS_DIR = "/var/lib/apt/lists"    # Where "apt-get update" stores package lists
+APT_LISTS_MAX_AGE = 6 * 60 * 60     # Skip "apt-get update" if lists are newer than this (seconds)
 
-# Run the given system command (command parameter is a list)
+# Run the given system command (command parameter is a list) and return output and exit code
+@tracing.traced(category="subprocess")
 def run_command(command, shell=False):
     try:
         # Run the command, capture its output as text
         result = subprocess.run(command, shell=shell, capture_output=True, text=True)
-        return result.stdout.strip()    # Returns output as a string
+        # On failure the error output is more useful than stdout
+        return (result.stdout if result.returncode == 0 else result.stdout + result.stderr).strip(), result.returncode
     except Exception as error:
-        return str(error)
+        return str(error), 1
+
+# Short error message for a failed command: its last output line (apt / PowerShell print the reason last)
+def command_error(output, code, name):
+    return output.splitlines()[-1] if output else f"{name} exited with {code}"
 
 # Install PSWindowsUpdate module without prompts
 def install_pswindowsupdate():
@@ -27,23 +62,198 @@ def install_pswindowsupdate():
     '''
     run_command(["powershell", "-Command", install_script], shell=True)
 
+# Order of a single character in a Debian version string
+# "~" sorts before everything (even the end of string), letters sort before non-letters
+def char_order(char):
+    if char == "~":
+        return -1
+    if char.isdigit():
+        return 0
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+# Compare upstream version or revision strings using dpkg's algorithm (returns -1, 0 or 1)
+def compare_fragment(a, b):
+    i = j = 0
+    while i < len(a) or j < len(b):
+        # Compare the non-digit prefix character by character (end of string counts as 0)
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            order_a = char_order(a[i]) if i < len(a) else 0
+            order_b = char_order(b[j]) if j < len(b) else 0
+            if order_a != order_b:
+                return -1 if order_a < order_b else 1
+            i += 1
+            j += 1
+        # Then compare the following run of digits numerically
+        start_a, start_b = i, j
+        while i < len(a) and a[i].isdigit():
+            i += 1
+        while j < len(b) and b[j].isdigit():
+            j += 1
+        num_a = int(a[start_a:i] or 0)
+        num_b = int(b[start_b:j] or 0)
+        if num_a != num_b:
+            return -1 if num_a < num_b else 1
+    return 0
+
+# Split a Debian version into (epoch, upstream, revision), e.g. "1:2.3-4" -> (1, "2.3", "4")
+@lru_cache(maxsize=None)
+def parse_version(version):
+    epoch, _, rest = version.partition(":") if ":" in version else ("0", "", version)
+    upstream, _, revision = rest.rpartition("-") if "-" in rest else (rest, "", "")
+    return int(epoch or 0), upstream, revision
+
+# Compare two Debian package versions (returns -1, 0 or 1), same result as "dpkg --compare-versions"
+@lru_cache(maxsize=None)
+def compare_versions(a, b):
+    epoch_a, upstream_a, revision_a = parse_version(a)
+    epoch_b, upstream_b, revision_b = parse_version(b)
+    if epoch_a != epoch_b:
+        return -1 if epoch_a < epoch_b else 1
+    return compare_fragment(upstream_a, upstream_b) or compare_fragment(revision_a, revision_b)
+
+# Check if version falls inside any of the advisory's affected ranges
+def is_affected(version, ranges):
+    for version_range in ranges:
+        introduced = version_range.get("introduced")
+        fixed = version_range.get("fixed")
+        if introduced and compare_versions(version, introduced) < 0:
+            continue
+        if fixed and compare_versions(version, fixed) >= 0:
+            continue
+        return True
+    return False
+
+# Load the advisory feed into an index of package name -> list of advisories
+# Indexing by package means each installed package only looks at its own advisories
+@tracing.traced()
+def load_advisory_index(feed_path):
+    with open(feed_path, "r") as feed_file:
+        advisories = json.load(feed_file)
+
+    index = {}
+    for advisory in advisories:
+        # An advisory without ranges affects every version of the package
+        ranges = advisory.get("affected") or [{}]
+        index.setdefault(advisory["package"], []).append({
+            "id": advisory.get("id", "unknown"),
+            "severity": str(advisory.get("severity", "unknown")).lower(),
+            "ranges": ranges
+        })
+    return index
+
+# Get installed packages as (package, source package, version) from dpkg
+# dpkg-query -W also lists removed packages that still have config files ("rc"), so only status "installed" is kept
+# (Status-Abbrev is desired action, status and error flag, e.g. "ii " or "hi " for a held package)
+@tracing.traced()
+def get_installed_packages():
+    output, _ = run_command(["dpkg-query", "-W", "-f=${db:Status-Abbrev}\t${Package}\t${source:Package}\t${Version}\n"])
+    packages = []
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) == 4 and parts[0][1:2] == "i" and parts[3]:
+            packages.append((parts[1], parts[2] or parts[1], parts[3]))
+    return packages
+
+# Get candidate versions of pending updates from the upgrade plan
+def get_candidate_versions(plan):
+    return {item["package"]: item["candidate"] for item in plan["installs"]}
+
+# Match installed packages against the advisory index in one pass and rank results by severity
+@tracing.traced()
+def match_advisories(index, installed, candidates=None):
+    candidates = candidates or {}
+    matches = []
+    for package, source, version in installed:
+        # Advisories can be published against the binary or the source package name
+        advisories = index.get(package, [])
+        if source != package:
+            advisories = advisories + index.get(source, [])
+        for advisory in advisories:
+            if not is_affected(version, advisory["ranges"]):
+                continue
+            candidate = candidates.get(package)
+            matches.append({
+                "package": package,
+                "installed": version,
+                "advisory": advisory["id"],
+                "severity": advisory["severity"],
+                # True if the pending update moves the package out of the affected range
+                "fixed_by_update": bool(candidate) and not is_affected(candidate, advisory["ranges"])
+            })
+
+    matches.sort(key=lambda match: (-SEVERITY_RANK.get(match["severity"], 0), match["package"], match["advisory"]))
+    return matches
+
+# Check if the apt package lists were refreshed recently enough to skip "apt-get update"
+def apt_lists_are_fresh(lists_dir=APT_LISTS_DIR, max_age=APT_LISTS_MAX_AGE):
+    try:
+        newest = max((entry.stat().st_mtime for entry in os.scandir(lists_dir) if entry.is_file()), default=0)
+    except OSError:
+        return False
+    return time.time() - newest < max_age
+
+# Parse a simulated "apt-get -s upgrade" run into a structured plan
+# "Inst" lines are planned upgrades, e.g. "Inst openssl [3.0.11-1~deb12u1] (3.0.11-1~deb12u2 Debian-Security:12/stable-security [amd64])"
+# A version available from several origins lists them all: "(2.35-0ubuntu3.4 Ubuntu:22.04/jammy-updates, Ubuntu:22.04/jammy-security [amd64])"
+# Indented lines after "kept back" / "deferred due to phasing" headers are held or phased package names
+def parse_upgrade_plan(output):
+    plan = {"installs": [], "held": [], "phased": []}
+    section = None
+    for line in output.splitlines():
+        if line.startswith("Inst "):
+            section = None
+            match = re.match(r"Inst (\S+) (?:\[(\S+)\] )?\((\S+) ([^\[\)]+)", line)
+            if match:
+                plan["installs"].append({
+                    "package": match.group(1),
+                    "current": match.group(2),    # None if the package is newly installed
+                    "candidate": match.group(3),
+                    "origin": ", ".join(origin.strip() for origin in match.group(4).split(",") if origin.strip())
+                })
+        elif line.startswith("The following"):
+            header = line.lower()
+            if "kept back" in header:
+                section = "held"
+            elif "deferred due to phasing" in header:
+                section = "phased"
+            else:
+                section = None
+        elif line.startswith(" ") and section:
+            plan[section].extend(line.split())
+        else:
+            section = None
+    return plan
+
+# Run a single simulated upgrade and return its plan (no packages are changed)
+@tracing.traced()
+def plan_linux_upgrade():
+    # Only refresh package lists if they are stale
+    if not apt_lists_are_fresh(APT_LISTS_DIR, APT_LISTS_MAX_AGE):
+        run_command(["sudo", APT_GET, "update"])
+    output, code = run_command([APT_GET, "-s", "upgrade"])
+    plan = parse_upgrade_plan(output)
+    # A failed simulation (e.g. dpkg lock held, broken dependencies) must not look like "up to date"
+    if code != 0:
+        plan["error"] = command_error(output, code, "apt-get")
+    return plan
+
 # Match system type and run_command update accordingly
+@tracing.traced()
 def check_updates(system):
     if system == "Linux":
         print("[*] Checking for Linux updates...")
-        run_command(["sudo", "apt", "update"])      # To refresh package list
-        output = run_command(["apt", "list", "--upgradable"])   # To check for upgradeable packages
-        # Filter out lines that look like packages and returns the list of outdated packages
-        updates = [line for line in output.splitlines() if '/' in line and "Listing..." not in line]
+        plan = plan_linux_upgrade()
+        # One line per planned upgrade, e.g. "openssl 3.0.11-1~deb12u1 -> 3.0.11-1~deb12u2 (Debian-Security:12/stable-security)"
+        updates = [f"{item['package']} {item['current'] or '(new)'} -> {item['candidate']} ({item['origin']})" for item in plan["installs"]]
 
-        # Check for deferred phasing message by running upgrade dry-run
-        upgrade_output = run_command(["sudo", "apt", "upgrade", "-y"])
         phasing_warning = None
-        if "deferred due to phasing" in upgrade_output.lower():
-            phasing_warning = "Some updates are deferred due to phasing and will be applied later."
+        if plan["phased"]:
+            phasing_warning = f"Some updates are deferred due to phasing and will be applied later: {' '.join(plan['phased'])}"
 
-        # Return both updates and warning
-        return updates, phasing_warning
+        # Return updates, warning and the plan that apply_updates() will carry out
+        return updates, phasing_warning, plan
 
     elif system == "Windows":
         print("[*] Checking for Windows updates...")
@@ -53,16 +263,35 @@ def check_updates(system):
         # Title and KB fields have to be converted to a custom object to avoid outputting null values
         # -Depth 5 is to avoid any nested value from Get-WindowsUpdate
         ps_script = "Import-Module PSWindowsUpdate; Get-WindowsUpdate | ForEach-Object {[PSCustomObject]@{Title=$_.Title;KB=($_.KB -join ', ')}} | ConvertTo-Json -Depth 5"
-        output = run_command(["powershell", "-Command", ps_script], shell=True)
-        return output.strip(), None
-    return f"{system} not supported", None
+        output, _ = run_command(["powershell", "-Command", ps_script], shell=True)
+        return output.strip(), None, None
+    return f"{system} not supported", None, None
 
-# Perform updates according to OS type
-def apply_updates(system):
+# Perform updates according to OS type, returns (reboot required, error message or None)
+@tracing.traced()
+def apply_updates(system, plan=None):
     if system == "Linux":
+        # Nothing planned means nothing to apply
+        if plan is not None and not plan["installs"]:
+            return False, None
         print("[+] Applying Linux updates...")
-        run_command(["sudo", "apt", "upgrade", "-y"])
-        return False
+        if plan is None:
+            output, code = run_command(["sudo", APT_GET, "upgrade", "-y"])
+            return False, command_error(output, code, "apt-get") if code != 0 else None
+        # Install exactly the planned versions (package=version), so apt can't resolve to something other than what was reported
+        # --only-upgrade keeps apt from pulling in anything new ("apt-get upgrade" never installs new packages either)
+        pinned = [f"{item['package']}={item['candidate']}" for item in plan["installs"]]
+        # Naming a package on the install command line marks it as manually installed, so remember which ones were
+        # automatically installed (dependencies) and mark them back afterwards, or autoremove would never clean them up
+        output, code = run_command([APT_MARK, "showauto"])
+        automatic = set(output.split()) if code == 0 else set()
+        output, code = run_command(["sudo", APT_GET, "install", "-y", "--only-upgrade"] + pinned)
+        if code != 0:
+            return False, command_error(output, code, "apt-get")
+        remark = [item["package"] for item in plan["installs"] if item["package"] in automatic]
+        if remark:
+            run_command(["sudo", APT_MARK, "auto"] + remark)
+        return False, None
 
     elif system == "Windows":
         print("[+] Applying Windows updates...")
@@ -70,15 +299,17 @@ def apply_updates(system):
         
         # Install updates
         install_ps = 'Install-WindowsUpdate -AcceptAll -Confirm:$false'
-        run_command(["powershell", "-Command", install_ps], shell=True)
+        output, code = run_command(["powershell", "-Command", install_ps], shell=True)
+        if code != 0:
+            return False, command_error(output, code, "Install-WindowsUpdate")
 
         # Check if reboot is required and return bool value
         check_reboot_ps = '(Get-WindowsUpdate -Install -AcceptAll -Confirm:$false).RebootRequired'
-        output = run_command(["powershell", "-Command", check_reboot_ps], shell=True)
-        return output.strip().lower() == "true"     # Check if output string is equal to "true"
+        output, _ = run_command(["powershell", "-Command", check_reboot_ps], shell=True)
+        return output.strip().lower() == "true", None     # Check if output string is equal to "true"
 
 # Generate report based on update list, update / reboot flag, and OS type
-def generate_report(updates, update_flag, system, warning_msg=None, reboot_required=False):
+def generate_report(updates, update_flag, system, warning_msg=None, reboot_required=False, advisories=None, held=None, error=None):
     now = datetime.now().isoformat()
     lines = [f"=== Patch Compliance Report ({system}) ===", f"Generated: {now}", ""]
     # Check if updates parameter is a list, a string, or does not exist
@@ -95,6 +326,20 @@ def generate_report(updates, update_flag, system, warning_msg=None, reboot_requi
     else:
         lines.append("System is up to date.")
 
+    # If apt kept packages back (e.g. they need new dependencies), list them
+    if held:
+        lines.append("")
+        lines.append("Held Back Packages:")
+        lines.extend(held)
+
+    # If installed packages matched any known advisory, list them by severity
+    if advisories:
+        lines.append("")
+        lines.append("Security Advisories:")
+        for match in advisories:
+            fix_note = "fixed by pending update" if match["fixed_by_update"] else "no fix pending"
+            lines.append(f"[{match['severity'].upper()}] {match['advisory']} {match['package']} {match['installed']} ({fix_note})")
+
     # If deferred phasing warning message exist
     if warning_msg:
         lines.append("")
@@ -105,22 +350,42 @@ def generate_report(updates, update_flag, system, warning_msg=None, reboot_requi
         lines.append("")
         lines.append("Note: A system reboot is required. Please reboot manually.")
         
+    # If checking or applying updates failed, say why
+    if error:
+        lines.append("")
+        lines.append(f"Error: {error}")
+
     lines.append("")
-    lines.append(f"Auto Update: {'Delayed' if warning_msg else ('Performed' if update_flag else 'Skipped')}")
+    if error:
+        lines.append("Auto Update: Failed")
+    else:
+        lines.append(f"Auto Update: {'Delayed' if warning_msg else ('Performed' if update_flag else 'Skipped')}")
     return "\n".join(lines)
 
 if __name__ == "__main__":
     system = platform.system()
-    updates, phasing_warning = check_updates(system)
+    updates, phasing_warning, plan = check_updates(system)
     update_flag = False
     reboot_required = False
+    advisories = None
+
+    # Match installed versions against the local advisory feed before anything gets upgraded
+    if system == "Linux" and os.path.isfile(ADVISORY_FEED):
+        index = load_advisory_index(ADVISORY_FEED)
+        advisories = match_advisories(index, get_installed_packages(), get_candidate_versions(plan))
 
-    if (system == "Linux" and updates) or (system == "Windows" and "KB" in updates):
-        reboot_required = apply_updates(system)
+    error = plan.get("error") if plan else None
+    if not error and ((system == "Linux" and updates) or (system == "Windows" and "KB" in updates)):
+        reboot_required, error = apply_updates(system, plan)
         update_flag = True
 
-    report = generate_report(updates, update_flag, system, phasing_warning, reboot_required)
+    held = plan["held"] if plan else None
+    report = generate_report(updates, update_flag, system, phasing_warning, reboot_required, advisories, held, error)
     print(report)
 
     with open("patch_compliance_report.txt", "w") as file:
         file.write(report)
+
+    # Non-zero exit code so callers (e.g. patch-rollout.py) count this host as failed
+    if error:
+        exit(1)
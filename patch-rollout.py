@@ -0,0 +1,226 @@
+# patch-rollout.py
+
+# This script rolls out patch-compliance.py across a list of hosts in waves
+# A small canary wave runs first, then waves grow in size with a limit on how many hosts are patched at the same time
+# Rollout pauses automatically if the failure rate crosses the set threshold
+# Progress is written to a JSON report after every host finishes, so it can be watched while the rollout runs
+
+# Usage: python3 patch-rollout.py [hosts_file] [--transport ssh|local|fake] [--fake-results results.json]
+# Hosts file has one hostname per line, blank lines and lines starting with # are ignored
+# Transports:
+    # ssh   - runs REMOTE_COMMAND on each host over SSH (default)
+    # local - runs REMOTE_COMMAND on this machine once per host, so it really patches this machine; only useful with a
+    #         stand-in command that reads ROLLOUT_HOST
+    # fake  - runs nothing and returns scripted results per host, for rehearsing a rollout and for tests, e.g.
+    #         --fake-results results.json with {"web03": ["E: Could not get lock\nAuto Update: Failed", 1]}
+
+import os           # For file path operation
+import json         # For writing the progress report and reading fake results
+import time         # For timing each host
+import argparse     # For command line options
+import subprocess   # For running commands through the transport
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED     # For patching several hosts at once
+from datetime import datetime   # For timestamping
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
+
+# Configuration Setup
+HOSTS_FILE = "hosts.txt"        # Default list of hosts to patch
+REPORT_FILE = "patch_rollout_report.json"   # Live progress report
+TRANSPORT = "ssh"               # How commands reach each host ("ssh", "local" or "fake")
+REMOTE_COMMAND = ["sudo", "python3", "patch-compliance.py"]     # Command run on every host
+COMMAND_TIMEOUT = 1800          # Seconds before a single host is treated as failed
+CANARY_SIZE = 1                 # Number of hosts in the first (canary) wave
+WAVE_GROWTH = 2                 # Each wave is this many times larger than the previous one
+MAX_WAVE_SIZE = 100             # Upper limit for wave size
+MAX_IN_FLIGHT = 10              # Maximum number of hosts being patched at the same time
+FAILURE_THRESHOLD = 0.2         # Pause rollout when more than this fraction of finished hosts failed
+# Fake transport: host -> (output, exit code), hosts not listed get FAKE_SUCCESS; each fake run takes FAKE_DELAY seconds
+FAKE_RESULTS = {}
+FAKE_SUCCESS = ("=== Patch Compliance Report (Linux) ===\n\nSystem is up to date.\n\nAuto Update: Skipped", 0)
+FAKE_DELAY = 0
+
+# Run command on host over SSH (BatchMode so a missing key fails instead of prompting)
+def run_over_ssh(host, command, timeout):
+    try:
+        result = subprocess.run(["ssh", "-o", "BatchMode=yes", host] + command,
+                                capture_output=True, text=True, timeout=timeout)
+        return result.stdout.strip(), result.returncode
+    except subprocess.TimeoutExpired:
+        return f"Timed out after {timeout} seconds", 124
+    except Exception as error:
+        return str(error), 1
+
+# Run command on this machine instead of the host (once per host, so this is not a dry run)
+# ROLLOUT_HOST is set so a stand-in command can decide how each host should behave
+def run_locally(host, command, timeout):
+    try:
+        env = dict(os.environ, ROLLOUT_HOST=host)
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout, env=env)
+        return result.stdout.strip(), result.returncode
+    except subprocess.TimeoutExpired:
+        return f"Timed out after {timeout} seconds", 124
+    except Exception as error:
+        return str(error), 1
+
+# Pretend to run command on host: nothing is executed, the scripted result for the host is returned
+def run_fake(host, command, timeout):
+    time.sleep(FAKE_DELAY)
+    output, code = FAKE_RESULTS.get(host, FAKE_SUCCESS)
+    return output, code
+
+# Available transports, each one is a function(host, command, timeout) -> (output, exit code)
+TRANSPORTS = {
+    "ssh": run_over_ssh,
+    "local": run_locally,
+    "fake": run_fake
+}
+
+# Read hostnames from file, skipping blanks, comments and duplicates
+def load_hosts(path):
+    hosts = []
+    with open(path, "r") as hosts_file:
+        for line in hosts_file:
+            host = line.strip()
+            if host and not host.startswith("#") and host not in hosts:
+                hosts.append(host)
+    return hosts
+
+# Split hosts into waves: canary first, then each wave WAVE_GROWTH times larger (up to MAX_WAVE_SIZE)
+def build_waves(hosts, canary_size=CANARY_SIZE, growth=WAVE_GROWTH, max_size=MAX_WAVE_SIZE):
+    waves = []
+    size = max(1, canary_size)
+    start = 0
+    while start < len(hosts):
+        waves.append(hosts[start:start + size])
+        start += size
+        size = min(max_size, size * growth)
+    return waves
+
+# Patch a single host and return its result
+@tracing.traced(category="network")
+def patch_host(host, transport, command, timeout):
+    start = time.time()
+    output, code = transport(host, command, timeout)
+
+    # patch-compliance.py ends its report with "Auto Update: Performed/Skipped/Delayed/Failed"
+    auto_update = None
+    for line in output.splitlines():
+        if line.startswith("Auto Update:"):
+            auto_update = line.split(":", 1)[1].strip()
+
+    # A host only succeeded if the command exited cleanly and its report says the update didn't fail
+    # (a missing report means the script died before finishing)
+    succeeded = code == 0 and auto_update not in (None, "Failed")
+    return {
+        "status": "succeeded" if succeeded else "failed",
+        "returncode": code,
+        "auto_update": auto_update,
+        "duration_seconds": round(time.time() - start, 2),
+        "finished": datetime.now().isoformat(),
+        "output_tail": output.splitlines()[-5:]     # Last few lines are enough to see what happened
+    }
+
+# Write the progress report to a temp file first, then swap it in so readers never see a partial file
+def write_report(report, path):
+    report["updated"] = datetime.now().isoformat()
+    counts = {}
+    for host_result in report["hosts"].values():
+        counts[host_result["status"]] = counts.get(host_result["status"], 0) + 1
+    report["summary"] = counts
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as json_file:
+        json.dump(report, json_file, indent=4)
+    os.replace(temp_path, path)
+
+# Failure rate across all hosts that have finished so far
+def failure_rate(report):
+    finished = [r for r in report["hosts"].values() if r["status"] in ("succeeded", "failed")]
+    if not finished:
+        return 0.0
+    return sum(1 for r in finished if r["status"] == "failed") / len(finished)
+
+# Run the rollout wave by wave and return the final report
+def run_rollout(hosts, transport_name=TRANSPORT, command=REMOTE_COMMAND, report_path=REPORT_FILE,
+                max_in_flight=MAX_IN_FLIGHT, threshold=FAILURE_THRESHOLD, timeout=COMMAND_TIMEOUT):
+    transport = TRANSPORTS[transport_name]
+    waves = build_waves(hosts, CANARY_SIZE, WAVE_GROWTH, MAX_WAVE_SIZE)
+    report = {
+        "started": datetime.now().isoformat(),
+        "transport": transport_name,
+        "status": "running",
+        "waves": [{"wave": number, "hosts": wave} for number, wave in enumerate(waves)],
+        "hosts": {host: {"status": "pending"} for host in hosts}
+    }
+    write_report(report, report_path)
+
+    for number, wave in enumerate(waves):
+        print(f"[*] Wave {number} ({'canary' if number == 0 else 'batch'}): {len(wave)} host(s)")
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            waiting = list(wave)
+            running = {}
+            for host in wave:
+                report["hosts"][host] = {"status": "queued", "wave": number}
+
+            # Hosts are only submitted when a slot is free, so once the rollout pauses nothing new starts
+            # (hosts already running are allowed to finish)
+            while waiting or running:
+                while waiting and len(running) < max_in_flight and report["status"] == "running":
+                    host = waiting.pop(0)
+                    running[executor.submit(patch_host, host, transport, command, timeout)] = host
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    host = running.pop(future)
+                    result = future.result()
+                    result["wave"] = number
+                    report["hosts"][host] = result
+                    print(f"[{'+' if result['status'] == 'succeeded' else '!'}] {host}: {result['status']}")
+
+                    # Any canary failure, or too many failures overall, pauses the rollout
+                    rate = failure_rate(report)
+                    if report["status"] == "running" and ((number == 0 and result["status"] == "failed") or rate > threshold):
+                        report["status"] = "paused"
+                        report["pause_reason"] = f"Failure rate {rate:.0%} in wave {number} (threshold {threshold:.0%})"
+                    write_report(report, report_path)
+
+            # Hosts of this wave that never started stay pending
+            for host in waiting:
+                report["hosts"][host] = {"status": "pending"}
+
+        if report["status"] == "paused":
+            print(f"[!] Rollout paused: {report['pause_reason']}")
+            break
+
+    if report["status"] == "running":
+        report["status"] = "completed"
+    write_report(report, report_path)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll out patch-compliance.py across hosts in waves")
+    parser.add_argument("hosts_file", nargs="?", default=HOSTS_FILE, help="File with one hostname per line")
+    parser.add_argument("--transport", choices=sorted(TRANSPORTS), default=TRANSPORT, help="How commands reach each host")
+    parser.add_argument("--fake-results", help="JSON file of host -> [output, exit code] for the fake transport")
+    args = parser.parse_args()
+
+    rollout_hosts = load_hosts(args.hosts_file)
+    if not rollout_hosts:
+        print(f"No hosts found in {args.hosts_file}")
+        exit(1)
+    if args.fake_results:
+        with open(args.fake_results, "r") as results_file:
+            FAKE_RESULTS = {host: tuple(result) for host, result in json.load(results_file).items()}
+
+    final_report = run_rollout(rollout_hosts, args.transport)
+    print(f"Rollout {final_report['status']}. Report saved to {REPORT_FILE}")
@@ -7,6 +7,16 @@ import os       # For file path handling
 import sys      # For script/system-specific functions
 import json     # For working with JSON data
 from datetime import datetime   # For timestamping
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
 
 # Try importing requests, prompt for manual install if not present
 try:
@@ -27,6 +37,7 @@ API_URL = f"https://api.open-meteo.com/v1/forecast?latitude={LATITUDE}&longitude
 LOG_FILE = os.path.join(os.getcwd(), "weather_log.json")
 
 # Handles core logic of contacting the weather API and saving data to log
+@tracing.traced(category="network")
 def poll_weather():
     try:
         response = requests.get(API_URL, timeout=10)    # Makes the HTTP GET request
@@ -51,6 +62,7 @@ def poll_weather():
         print(f"[!] Weather API request failed: {error}")
 
 # Helper function for appending a new log entry to the JSON file
+@tracing.traced()
 def append_log(entry):
     logs = []   # Start with an empty list of logs
 
@@ -0,0 +1,49 @@
+# query-results.py
+
+# This script queries the shared SQLite results store (results_store.py) without loading whole reports
+# Results are printed as one JSON object per line, newest first
+
+# Usage examples:
+    # python3 query-results.py failed_logins --host web01 --since 2025-07-01 --until 2025-08-01
+    # python3 query-results.py failed_logins --where username=root --limit 20
+    # python3 query-results.py software --where name=openssl
+    # python3 query-results.py open_ports --summary
+
+import sys          # For exit codes
+import json         # For printing records
+import argparse     # For command line options
+import results_store    # Shared results store
+
+def main():
+    parser = argparse.ArgumentParser(description="Query audit results saved by the collector scripts")
+    parser.add_argument("collector", choices=sorted(results_store.COLLECTORS), help="Which collector's results to read")
+    parser.add_argument("--db", default=results_store.RESULTS_DB, help="Path to the results database")
+    parser.add_argument("--host", help="Only results from this host")
+    parser.add_argument("--since", help="Collected at or after this time (ISO format, e.g. 2025-07-01 or 2025-07-01T12:00)")
+    parser.add_argument("--until", help="Collected before this time (ISO format)")
+    parser.add_argument("--where", action="append", default=[], metavar="COLUMN=VALUE", help="Filter on a key column, can be repeated")
+    parser.add_argument("--limit", type=int, help="Maximum number of results")
+    parser.add_argument("--summary", action="store_true", help="Show result counts and time range per host instead")
+    args = parser.parse_args()
+
+    filters = {}
+    for condition in args.where:
+        column, _, value = condition.partition("=")
+        filters[column] = int(value) if value.isdigit() else value
+
+    try:
+        if args.summary:
+            for host, count, first, last in results_store.summarize(args.collector, args.db):
+                print(f"{host}: {count} result(s) from {first} to {last}")
+            return
+        for row in results_store.query_records(args.collector, args.host, args.since, args.until, filters, args.limit, args.db):
+            print(json.dumps(row))
+    except ValueError as error:
+        print(f"[!] {error}")
+        sys.exit(1)
+    except results_store.STORE_ERRORS as error:     # e.g. no permission to open the database
+        print(f"[!] Can't read the results store {args.db}: {error}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
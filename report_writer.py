@@ -0,0 +1,94 @@
+# report_writer.py
+
+# Shared output layer used by the audit scripts to write their JSON reports
+# Records are written one at a time as they are produced, so a report never has to be held in memory as a whole
+# Output format is picked from the file name:
+    # report.json            - same layout as before ({header..., "records_key": [records...]}), without indentation
+    # report.jsonl           - JSON Lines: header object on the first line, then one record per line
+    # report.msgpack         - MessagePack: header map followed by one map per record (needs: pip install msgpack)
+    # add .gz or .zst to compress, e.g. report.jsonl.gz or report.jsonl.zst (.zst needs: pip install zstandard)
+# orjson is used for encoding when installed (pip install orjson), otherwise the standard json module
+# A format whose library is missing raises ImportError (with the pip command in the message) before the file is created
+
+import gzip     # For .gz compression
+import json     # Fallback JSON encoder
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+# Faster JSON encoder if available, orjson returns bytes and is several times faster than json
+try:
+    import orjson
+
+    def encode_json(value):
+        return orjson.dumps(value, default=str)
+except ImportError:
+    def encode_json(value):
+        return json.dumps(value, default=str).encode()
+
+# Work out (format, compression) from the file name, e.g. "report.jsonl.gz" -> ("jsonl", "gz")
+def detect_format(path):
+    name = path.lower()
+    compression = None
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            compression = suffix[1:]
+            name = name[:-len(suffix)]
+    if name.endswith(".jsonl"):
+        return "jsonl", compression
+    if name.endswith((".msgpack", ".mpk")):
+        return "msgpack", compression
+    return "json", compression
+
+# Open the output file in binary mode with the requested compression
+def open_output(path, compression):
+    if compression == "gz":
+        return gzip.open(path, "wb", compresslevel=6)
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstandard (used for .zst output) not installed. Please run: pip install zstandard") from None
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"))
+    return open(path, "wb")
+
+# Write a report made of header fields and an iterable of records, returns the number of records written
+# header is a dict of top-level fields (timestamp, hostname, ...), records can be a list or a generator
+# Without records_key only the header is written (for scripts whose whole result is one small dict)
+@tracing.traced()
+def write_report(path, header, records_key=None, records=(), fmt=None):
+    detected_format, compression = detect_format(path)
+    fmt = fmt or detected_format
+    count = 0
+
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("msgpack (used for .msgpack output) not installed. Please run: pip install msgpack") from None
+        packer = msgpack.Packer(default=str)
+
+    with open_output(path, compression) as output:
+        if fmt == "json":
+            # Write the header fields, then stream the records list as the last field
+            if records_key is None:
+                output.write(encode_json(header) + b"\n")
+            else:
+                # records_key is moved to the end (a header that already has it would otherwise keep its old place)
+                opening = encode_json(dict({key: value for key, value in header.items() if key != records_key}, **{records_key: []}))
+                output.write(opening[:-3] + b"[")    # Strip the empty list and closing brace: '...,"key":[]}'
+                for record in records:
+                    output.write((b",\n" if count else b"\n") + encode_json(record))
+                    count += 1
+                output.write(b"\n]}\n")
+        elif fmt == "jsonl":
+            output.write(encode_json(header) + b"\n")
+            for record in records if records_key else ():
+                output.write(encode_json(record) + b"\n")
+                count += 1
+        elif fmt == "msgpack":
+            output.write(packer.pack(header))
+            for record in records if records_key else ():
+                output.write(packer.pack(record))
+                count += 1
+        else:
+            raise ValueError(f"Unknown report format: {fmt}")
+    return count
@@ -0,0 +1,195 @@
+# results_store.py
+
+# Shared SQLite results store used by the audit scripts, so history can be queried across runs and hosts
+# Every collector has its own table with indexed columns for host, collection time and its key fields
+# The full record is also kept as JSON in the "data" column
+# The database runs in WAL mode so several scripts on the same machine can write at the same time
+# WAL needs shared memory between the writers, so it is not used when the database is on a network filesystem
+# (NFS, SMB, ...); the rollback journal is used there instead, and writers on different hosts should use their own local store
+# Records are written in batches, one transaction per batch
+
+# The database lives in a fixed place (/var/lib/audit, or %ProgramData%\audit on Windows) whichever folder a script runs from
+# Accounts that can't write there (e.g. a non-root user on Linux) get a per-user store instead:
+# ~/.local/share/audit ($XDG_DATA_HOME/audit), or %LOCALAPPDATA%\audit on Windows
+# The path can be changed with the AUDIT_RESULTS_DB environment variable
+# Opening or writing the store raises one of STORE_ERRORS; collectors write their report first and only warn about those
+# Use query-results.py to read the store
+
+import os           # For the database path environment variable
+import ctypes       # For detecting mapped network drives on Windows
+import json         # For storing full records
+import sqlite3      # SQLite database
+import platform     # For the default host name
+from datetime import datetime   # For timestamping
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+if platform.system() == "Windows":
+    SHARED_DB = os.path.join(os.environ.get("PROGRAMDATA", "C:\\ProgramData"), "audit", "audit_results.db")
+    USER_DB = os.path.join(os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local")), "audit", "audit_results.db")
+else:
+    SHARED_DB = "/var/lib/audit/audit_results.db"
+    USER_DB = os.path.join(os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")), "audit", "audit_results.db")
+BATCH_SIZE = 1000       # Records per transaction
+BUSY_TIMEOUT_MS = 30000     # How long a writer waits for another writer's transaction to finish
+# Filesystem types (from /proc/mounts) where WAL mode is not safe
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "fuse.glusterfs", "fuse.sshfs"}
+# Errors from opening or writing the store (no permission, disk full, database locked for too long, ...)
+STORE_ERRORS = (OSError, sqlite3.Error)
+
+# Key fields per collector: (column name, record key); each column gets its own index
+COLLECTORS = {
+    "failed_logins": [("username", "username"), ("ip", "ip"), ("event_time", "timestamp")],
+    "open_ports": [("port", "port"), ("bind", "bind"), ("status", "status"), ("target_host", "host")],
+    "firewall_rules": [("table_name", "table"), ("chain", "chain"), ("target", "target"), ("position", "position")],
+    "software": [("name", "name"), ("version", "version")],
+    "system_inventory": [("os", "os"), ("os_version", "os_version")],
+    "ssh_keys": [("username", "username"), ("fingerprint", "fingerprint"), ("key_type", "type")]
+}
+
+# Shared store if this account can write to it (or create it), otherwise the per-user store
+def default_db(shared=SHARED_DB, user=USER_DB):
+    folder = os.path.dirname(shared)
+    if os.path.exists(shared):
+        # The journal / WAL files are created next to the database, so the folder has to be writable too
+        return shared if os.access(shared, os.W_OK) and os.access(folder, os.W_OK) else user
+    # The nearest existing parent is where the missing folders would be created
+    while not os.path.exists(folder) and os.path.dirname(folder) != folder:
+        folder = os.path.dirname(folder)
+    return shared if os.access(folder, os.W_OK) else user
+
+DEFAULT_DB = default_db()
+RESULTS_DB = os.environ.get("AUDIT_RESULTS_DB", DEFAULT_DB)
+
+# Check if a path is on a network filesystem: a UNC path or mapped network drive on Windows, an NFS / SMB / ... mount elsewhere
+def is_network_path(path):
+    path = os.path.abspath(path)
+    if platform.system() == "Windows":
+        if path.startswith("\\\\"):
+            return True
+        return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + "\\") == 4   # DRIVE_REMOTE
+    try:
+        with open("/proc/mounts", "r") as mounts:
+            entries = [line.split() for line in mounts]
+    except OSError:
+        return False    # No /proc (e.g. macOS), assume a local disk
+    # The mount with the longest mount point containing the path is the one it's on
+    mount_point, filesystem = "", None
+    for entry in entries:
+        point = entry[1].replace("\\040", " ")
+        if (path == point or path.startswith(point.rstrip("/") + "/")) and len(point) >= len(mount_point):
+            mount_point, filesystem = point, entry[2]
+    return filesystem in NETWORK_FILESYSTEMS
+
+# Open the store and make sure the collector tables exist
+def connect(path=RESULTS_DB):
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    # isolation_level=None so transactions are started explicitly with BEGIN IMMEDIATE
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    if is_network_path(folder):
+        connection.execute("PRAGMA journal_mode=DELETE")
+    else:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")    # Safe with WAL, avoids an fsync per transaction
+    connection.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    for collector, fields in COLLECTORS.items():
+        columns = "".join(f", {column}" for column, _ in fields)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {collector} (id INTEGER PRIMARY KEY, host TEXT NOT NULL, "
+                           f"collected_at TEXT NOT NULL{columns}, data TEXT NOT NULL)")
+        connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{collector}_host_time ON {collector} (host, collected_at)")
+        connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{collector}_time ON {collector} (collected_at)")
+        for column, _ in fields:
+            connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{collector}_{column} ON {collector} ({column})")
+    return connection
+
+# Write one batch of rows in a single transaction
+@tracing.traced(category="sqlite")
+def insert_batch(connection, collector, rows):
+    columns = ["host", "collected_at"] + [column for column, _ in COLLECTORS[collector]] + ["data"]
+    placeholders = ", ".join("?" for _ in columns)
+    # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers queue instead of failing mid-transaction
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany(f"INSERT INTO {collector} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+# Pass records through unchanged while saving them to the store in batches
+# This lets a script stream the same records into both its report file and the store
+# The store is opened straight away, so a store that can't be opened raises here before any record is read
+def store_records(collector, records, host=None, collected_at=None, path=RESULTS_DB):
+    host = host or platform.node()
+    collected_at = collected_at or datetime.now().isoformat()
+    return insert_records(connect(path), collector, records, host, collected_at)
+
+# Generator behind store_records(), closes the connection when the records run out
+def insert_records(connection, collector, records, host, collected_at):
+    fields = COLLECTORS[collector]
+    batch = []
+    try:
+        for record in records:
+            batch.append([host, collected_at] + [record.get(key) for _, key in fields] + [json.dumps(record, default=str)])
+            if len(batch) >= BATCH_SIZE:
+                insert_batch(connection, collector, batch)
+                batch = []
+            yield record
+        if batch:
+            insert_batch(connection, collector, batch)
+    finally:
+        connection.close()
+
+# Save records to the store and return how many were saved
+def save_records(collector, records, host=None, collected_at=None, path=RESULTS_DB):
+    count = 0
+    for _ in store_records(collector, records, host, collected_at, path):
+        count += 1
+    return count
+
+# Read records back, newest first, filtered by host, time range and key columns
+# filters is a dict of column -> value, e.g. {"username": "root"}
+@tracing.traced(category="sqlite")
+def query_records(collector, host=None, since=None, until=None, filters=None, limit=None, path=RESULTS_DB):
+    if collector not in COLLECTORS:
+        raise ValueError(f"Unknown collector: {collector}")
+    allowed = {column for column, _ in COLLECTORS[collector]}
+    conditions, params = [], []
+    if host:
+        conditions.append("host = ?")
+        params.append(host)
+    if since:
+        conditions.append("collected_at >= ?")
+        params.append(since)
+    if until:
+        conditions.append("collected_at < ?")
+        params.append(until)
+    for column, value in (filters or {}).items():
+        if column not in allowed:
+            raise ValueError(f"{collector} can't be filtered by {column}, use one of: {', '.join(sorted(allowed))}")
+        conditions.append(f"{column} = ?")
+        params.append(value)
+
+    sql = f"SELECT host, collected_at, data FROM {collector}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY collected_at DESC, id"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+
+    connection = connect(path)
+    try:
+        # Rows are read one at a time from the cursor, so large results aren't loaded all at once
+        for host_name, collected, data in connection.execute(sql, params):
+            yield {"host": host_name, "collected_at": collected, "record": json.loads(data)}
+    finally:
+        connection.close()
+
+# Count rows per host for a collector (for a quick overview)
+def summarize(collector, path=RESULTS_DB):
+    connection = connect(path)
+    try:
+        return connection.execute(f"SELECT host, COUNT(*), MIN(collected_at), MAX(collected_at) FROM {collector} "
+                                  "GROUP BY host ORDER BY host").fetchall()
+    finally:
+        connection.close()
@@ -4,15 +4,25 @@
 
 import platform     # Used to detect the OS type (Windows, Linux, etc.)
 import os           # For working with file paths and directories
-import json         # For saving data in JSON format
 import subprocess   # To run external system commands
 from datetime import datetime   # For timestamping
+from report_writer import write_report  # Shared report output (JSON, JSON Lines, compression)
+from results_store import save_records, STORE_ERRORS  # Shared SQLite results store
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
+
+# Report file extension, e.g. ".jsonl.gz" for compressed JSON Lines (see report_writer.py)
+REPORT_EXTENSION = ".json"
+DPKG_ADMIN_DIR = "/var/lib/dpkg"    # dpkg database directory (holds the "status" file)
+# Save results to the shared SQLite store (see results_store.py), the report file is an optional export
+SAVE_TO_STORE = True
+EXPORT_REPORT = True
 
 # Windows-specific import
 if platform.system() == "Windows":
     import winreg   # Used to access Windows Registry to find installed software
 
 # Collect installed software from Windows using winreg
+@tracing.traced()
 def collect_windows_software():
     uninstall_keys = [
         r"SOFTWARE\Microsoft\Windows\CurrentVersion\Uninstall",
@@ -47,11 +57,14 @@ def collect_windows_software():
     return software
 
 # Collect installed packages from Linux using dpkg
-def collect_linux_software():
+@tracing.traced()
+def collect_linux_software(admin_dir=DPKG_ADMIN_DIR):
     try:
         # Run dpkg-query to get package name and version
-        output = subprocess.check_output(["dpkg-query", "-W", "-f=${binary:Package}\t${Version}\n"], text=True)
+        output = subprocess.check_output(["dpkg-query", f"--admindir={admin_dir}", "-W", "-f=${binary:Package}\t${Version}\n"], text=True)
         lines = output.strip().split('\n')
+        tracing.count("bytes_read", len(output))
+        tracing.count("lines_parsed", len(lines))
         software = []
         for each_line in lines:
             parts = each_line.split('\t')
@@ -61,13 +74,18 @@ def collect_linux_software():
     except FileNotFoundError:
         return [{"error": "dpkg not available"}]
 
-# Save software list to JSON file
+# Save software list to report file, software records are written one by one after the header fields
+@tracing.traced()
 def save_report(data):
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")    # e.g., 20250707-123456
-    filename = f"software_inventory_{platform.node()}_{timestamp}.json"
-    
-    with open(filename, "w") as json_file:
-        json.dump(data, json_file, indent=4)
+    filename = f"software_inventory_{platform.node()}_{timestamp}{REPORT_EXTENSION}"
+
+    header = {key: value for key, value in data.items() if key != "software"}
+    try:
+        write_report(filename, header, "software", data.get("software", []))
+    except ImportError as error:    # Compressor / encoder for REPORT_EXTENSION is missing
+        print(error)
+        exit(1)
     
     print(f"[+] Report saved to: {filename}")
 
@@ -89,7 +107,14 @@ def main():
     else:
         inventory["error"] = "Unsupported OS"
 
-    save_report(inventory)  # Save the collected data
+    # Report first, so a results store problem can't lose it
+    if EXPORT_REPORT:
+        save_report(inventory)  # Save the collected data
+    if SAVE_TO_STORE:
+        try:
+            save_records("software", inventory.get("software", []), hostname, inventory["timestamp"])
+        except STORE_ERRORS as error:
+            print(f"[!] Software inventory not saved to the results store: {error}")
 
 
 if __name__ == "__main__":
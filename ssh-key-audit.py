@@ -2,65 +2,194 @@
 
 # This script checks if each user has authorized public SSH keys
 # If SSH keys exist, script exports keys info to a .JSON file
+# Each key is decoded into its type, bit length and SHA256 fingerprint (same format as "ssh-keygen -lf")
+# Keys shared between accounts are listed by fingerprint
+# Home directories are read in parallel, and files that haven't changed since the last run are taken from a cache
 
 import os       # Used for file path operation
 import pwd      # Used to retrieve info about local user in UNIX/LINUX system
+import re       # Used to find the key type and key data in each line
 import json     # Used to convert data into .JSON file
+import base64   # Used to decode key data and encode fingerprints
+import struct   # Used to read length-prefixed fields from key data
+import hashlib  # Used to compute SHA256 fingerprints
+from concurrent.futures import ThreadPoolExecutor   # Used to read home directories concurrently
 from datetime import datetime   # For timestamping
+from results_store import save_records, STORE_ERRORS  # Shared SQLite results store
+import tracing  # Optional timing spans and counters (set AUDIT_TRACE=trace.json to record)
 
 AUDIT_LOG = "/var/log/ssh_key_audit.json"
+CACHE_FILE = "/var/cache/ssh_key_audit_cache.json"  # Results from the last run, keyed by file path
+MAX_WORKERS = 32    # Home directories read at the same time (mostly waiting on disk / NFS)
+# Save results to the shared SQLite store (see results_store.py), the report file is an optional export
+SAVE_TO_STORE = True
+EXPORT_REPORT = True
+
+# Key line: optional options, then key type, base64 key data and optional comment
+# e.g. 'from="10.0.0.0/8" ssh-ed25519 AAAAC3Nza... alice@laptop'
+KEY_PATTERN = re.compile(r'(?:^|\s)((?:ssh|ecdsa-sha2|sk-ssh|sk-ecdsa-sha2)-[\w@.-]+)\s+([A-Za-z0-9+/]+={0,2})(?:\s+(.*))?$')
+
+# Fixed key sizes for key types that don't store a modulus
+FIXED_KEY_BITS = {
+    "ssh-ed25519": 256,
+    "sk-ssh-ed25519@openssh.com": 256,
+    "ssh-ed448": 456,
+    "nistp256": 256,
+    "nistp384": 384,
+    "nistp521": 521
+}
+
+# Read length-prefixed fields (SSH wire format) from key data
+def read_fields(blob, count):
+    fields = []
+    offset = 0
+    for _ in range(count):
+        length, = struct.unpack_from(">I", blob, offset)
+        fields.append(blob[offset + 4:offset + 4 + length])
+        offset += 4 + length
+    return fields
+
+# Work out key size in bits from the decoded key data
+def key_bits(key_type, blob):
+    if key_type == "ssh-rsa":
+        _, _, modulus = read_fields(blob, 3)     # type, exponent, modulus
+        return int.from_bytes(modulus, "big").bit_length()
+    if key_type == "ssh-dss":
+        _, prime = read_fields(blob, 2)          # type, p
+        return int.from_bytes(prime, "big").bit_length()
+    if "ecdsa" in key_type:
+        _, curve = read_fields(blob, 2)          # type, curve name
+        return FIXED_KEY_BITS.get(curve.decode(), None)
+    return FIXED_KEY_BITS.get(key_type)
+
+# Decode one authorized_keys line into type, bits, fingerprint, comment and options
+def parse_key_line(line):
+    match = KEY_PATTERN.search(line)
+    if not match:
+        return {"line": line, "error": "Unrecognized key format"}
+    key_type, key_data, comment = match.groups()
+    try:
+        blob = base64.b64decode(key_data)
+        bits = key_bits(key_type, blob)
+    except (ValueError, struct.error) as error:
+        return {"line": line, "type": key_type, "error": f"Invalid key data: {error}"}
+
+    return {
+        "type": key_type,
+        "bits": bits,
+        # Unpadded base64 of the SHA256 of the key data, same as OpenSSH shows
+        "fingerprint": "SHA256:" + base64.b64encode(hashlib.sha256(blob).digest()).decode().rstrip("="),
+        "comment": comment or "",
+        "options": line[:match.start(1)].strip(),
+        "line": line
+    }
+
+# Load cached results from the last run (empty if missing or unreadable)
+def load_cache(path):
+    try:
+        with open(path, "r") as cache_file:
+            return json.load(cache_file)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+# Save results for the next run, skipping quietly if the cache location isn't writable
+def save_cache(path, cache):
+    try:
+        with open(path, "w") as cache_file:
+            json.dump(cache, cache_file)
+    except OSError as error:
+        print(f"[!] Could not save cache to {path}: {error}")
+
+# Audit one user's authorized_keys file, returns (username, report entry, cache entry)
+# Entry is None if the user has no authorized_keys file
+@tracing.traced()
+def audit_user(username, home_dir, cache):
+    # Create path to stored key file (e.g. /home/username/.ssh/authorized_keys)
+    auth_keys_path = os.path.join(home_dir, ".ssh", "authorized_keys")
+    try:
+        # One stat call both checks the file exists and gives what the cache is keyed on
+        file_stat = os.stat(auth_keys_path)
+    except FileNotFoundError:
+        return username, None, None
+    except OSError as error:
+        return username, {"error": str(error)}, None
+
+    # Same mtime, size and inode as last run means the file is unchanged, so skip reading it
+    signature = [file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino]
+    cached = cache.get(auth_keys_path)
+    if cached and cached["signature"] == signature:
+        return username, cached["entry"], cached
+
+    try:
+        # Open file to read
+        with open(auth_keys_path, "r") as file:
+            # Read all non-empty and non-comment (#) lines as public keys
+            keys = [parse_key_line(line.strip()) for line in file if line.strip() and not line.startswith("#")]
+        tracing.count("bytes_read", file_stat.st_size)
+    except Exception as error:
+        return username, {"error": str(error)}, None
+
+    # Saves the data to a dictionary
+    entry = {
+        "home": home_dir,
+        "authorized_keys_count": len(keys),
+        # Extract last modified timestamp and convert to ISO format
+        "last_modified": datetime.fromtimestamp(file_stat.st_mtime).isoformat(),
+        "keys": keys
+    }
+    return username, entry, {"signature": signature, "entry": entry}
 
 # Gathers SSH key data
-def get_authorized_keys():
+@tracing.traced()
+def get_authorized_keys(cache_path=CACHE_FILE):
     report = {}
-    
-    # Iterate through each user account's list of entries
-    for user in pwd.getpwall():
-        home_dir = user.pw_dir
-        username = user.pw_name
-
-        # Skip system users
-        if not home_dir.startswith("/home/"):
-            continue
-        
-        # Create path to stored key file (e.g. /home/username/.ssh/authorized_keys)
-        auth_keys_path = os.path.join(home_dir, ".ssh", "authorized_keys")
-
-        # Check if file exists
-        if os.path.isfile(auth_keys_path):
-            try:
-                # Open file to read
-                with open(auth_keys_path, "r") as file:
-                    # Read all non-empty and non-comment (#) lines as public keys
-                    keys = [line.strip() for line in file if line.strip() and not line.startswith("#")]
-
-                # Gets file metadata
-                file_stat = os.stat(auth_keys_path)
-                # Extract last modified timestamp and convert to ISO format 
-                last_modified = datetime.fromtimestamp(file_stat.st_mtime).isoformat()
-
-                # Saves the data to a dictionary
-                report[username] = {
-                    "home": home_dir,
-                    "authorized_keys_count": len(keys),
-                    "last_modified": last_modified,
-                    "keys": keys
-                }
-
-            except Exception as error:
-                report[username] = {"error": str(error)}
+    cache = load_cache(cache_path)
+    new_cache = {}
+
+    # Skip system users
+    users = [(user.pw_name, user.pw_dir) for user in pwd.getpwall() if user.pw_dir.startswith("/home/")]
 
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = executor.map(lambda user: audit_user(user[0], user[1], cache), users)
+        for (username, home_dir), (_, entry, cache_entry) in zip(users, results):
+            if entry is None:
+                continue
+            report[username] = entry
+            if cache_entry:
+                new_cache[os.path.join(home_dir, ".ssh", "authorized_keys")] = cache_entry
+
+    save_cache(cache_path, new_cache)
     return report
 
+# Build fingerprint -> accounts index and keep only keys used by more than one account
+def find_shared_keys(report):
+    index = {}
+    for username, entry in report.items():
+        for key in entry.get("keys", []):
+            if "fingerprint" in key and username not in index.setdefault(key["fingerprint"], []):
+                index[key["fingerprint"]].append(username)
+    return {fingerprint: users for fingerprint, users in index.items() if len(users) > 1}
+
 # Ensures script only runs when executed directly, not called as module
 if __name__ == "__main__":
+    users_report = get_authorized_keys()
     audit_data = {
         "timestamp": datetime.now().isoformat(),
-        "users": get_authorized_keys()
+        "users": users_report,
+        "shared_keys": find_shared_keys(users_report)
     }
 
-    # Save to .JSON log file
-    with open(AUDIT_LOG, "w") as json_file:
-        json.dump(audit_data, json_file, indent=4)
+    # Save to .JSON log file (first, so a results store problem can't lose the report)
+    if EXPORT_REPORT:
+        with open(AUDIT_LOG, "w") as json_file:
+            json.dump(audit_data, json_file, indent=4)
+        print(f"SSH key audit complete. Results saved to {AUDIT_LOG}")
 
-    print(f"SSH key audit complete. Results saved to {AUDIT_LOG}")
+    # One store record per key, tagged with the account it belongs to
+    if SAVE_TO_STORE:
+        key_records = (dict(key, username=username) for username, entry in users_report.items() for key in entry.get("keys", []))
+        try:
+            save_records("ssh_keys", key_records, collected_at=audit_data["timestamp"])
+            print("SSH key audit saved to the results store")
+        except STORE_ERRORS as error:
+            print(f"[!] SSH key audit not saved to the results store: {error}")
@@ -0,0 +1,262 @@
+# test_backup_coordinator.py
+
+# Checks backup-coordinator.py with real tar / du runs into a local target folder
+# SSH sources and SFTP targets go through stand-ins for paramiko's client and SFTP objects (see FakeClient), so paramiko isn't needed
+# A stalling or failing tar is a fake "tar" script put first on PATH
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths and PATH
+import sys          # For the import path
+import json         # For reading the report and history
+import time         # For timing the bandwidth limit
+import select       # For the stand-in channel's read timeout
+import socket       # For the stand-in channel's timeout error
+import tarfile      # For checking the finished archives
+import threading    # For sharing a bucket between threads and catching progress thread errors
+import subprocess   # For the stand-in SSH commands
+import importlib.util   # For loading the script (its file name has dashes)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)    # Shared modules the script imports (tracing)
+
+spec = importlib.util.spec_from_file_location("backup_coordinator", os.path.join(REPO_DIR, "backup-coordinator.py"))
+coordinator = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(coordinator)
+
+# Folder with one file of size random (incompressible) bytes
+def make_source(tmp_path, name, size):
+    folder = tmp_path / "sources" / name
+    folder.mkdir(parents=True)
+    (folder / "data.bin").write_bytes(os.urandom(size))
+    return str(folder)
+
+def local_target(tmp_path, bandwidth_mbps=0):
+    return {"transport": "local", "remote_dir": str(tmp_path / "backups"), "bandwidth_mbps": bandwidth_mbps}
+
+def run(tmp_path, targets, jobs, max_concurrent=2):
+    return coordinator.run_backups(targets, jobs, max_concurrent, str(tmp_path / "report.json"), str(tmp_path / "history.json"))
+
+# Put a fake tar first on PATH, running the shell commands in body
+def fake_tar(tmp_path, monkeypatch, body):
+    folder = tmp_path / "bin"
+    folder.mkdir()
+    script = folder / "tar"
+    script.write_text("#!/bin/sh\n" + body + "\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{folder}{os.pathsep}{os.environ['PATH']}")
+
+def test_largest_jobs_run_first(tmp_path):
+    jobs = [{"name": name, "source": "local", "paths": [make_source(tmp_path, name, size)], "target": "local"}
+            for name, size in (("small", 1000), ("new", 200000), ("big", 1000), ("mid", 1000))]
+    (tmp_path / "history.json").write_text(json.dumps({"small": {"bytes": 10}, "big": {"bytes": 10 ** 9}, "mid": {"bytes": 10 ** 6}}))
+    report = run(tmp_path, {"local": local_target(tmp_path)}, jobs, max_concurrent=1)
+
+    assert report["summary"] == {"succeeded": 4}
+    # "new" has no history and is sized with du (about 200 kB)
+    assert report["jobs"]["new"]["estimate_source"] == "du (uncompressed)"
+    started = sorted(report["jobs"], key=lambda name: report["jobs"][name]["started"])
+    assert started == ["big", "mid", "new", "small"]
+
+    # Finished archives are renamed from .part and hold the source files
+    backups = sorted(os.listdir(tmp_path / "backups"))
+    assert len(backups) == 4 and all(name.endswith(".tar.gz") for name in backups)
+    with tarfile.open(tmp_path / "backups" / report["jobs"]["new"]["file"]) as archive:
+        assert any(member.name.endswith("new/data.bin") for member in archive.getmembers())
+
+    # History now has the real compressed sizes, and a ratio for the job that was sized with du
+    history = json.loads((tmp_path / "history.json").read_text())
+    assert history["big"]["bytes"] == report["jobs"]["big"]["bytes"]
+    assert 0.9 < history["new"]["compression_ratio"] < 1.1     # Random data doesn't compress
+    assert json.loads((tmp_path / "report.json").read_text())["status"] == "completed"
+
+def test_token_bucket_is_shared():
+    # 3 MB through a 2 MB/s bucket from three threads: 1 MB of burst, the rest takes about a second
+    bucket = coordinator.make_bucket(2e6)
+
+    def send():
+        for _ in range(20):
+            coordinator.take_tokens(bucket, 50000)
+
+    begin = time.monotonic()
+    threads = [threading.Thread(target=send) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - begin
+    assert 0.9 <= elapsed < 3
+
+def test_target_bandwidth_limit(tmp_path):
+    # About 1 MB of archive at 4 Mbit/s (500 kB/s) with a 256 kB burst takes about 1.5 s
+    jobs = [{"name": "web01", "source": "local", "paths": [make_source(tmp_path, "web01", 1000000)], "target": "slow"}]
+    report = run(tmp_path, {"slow": local_target(tmp_path, bandwidth_mbps=4)}, jobs)
+    job = report["jobs"]["web01"]
+    rate = 4e6 / 8
+    burst = max(coordinator.CHUNK_SIZE, rate * coordinator.BURST_SECONDS)
+    assert job["status"] == "succeeded"
+    # The bucket never lets through more than its burst plus the rate over the job's duration
+    assert job["bytes"] <= burst + rate * job["duration_seconds"]
+    assert job["duration_seconds"] >= (job["bytes"] - burst) / rate * 0.9
+
+def test_idle_source_fails_and_leaves_no_part_file(tmp_path, monkeypatch):
+    fake_tar(tmp_path, monkeypatch, "printf partial\nexec sleep 30")
+    monkeypatch.setattr(coordinator, "SOURCE_IDLE_TIMEOUT", 0.5)
+    jobs = [{"name": "hung", "source": "local", "paths": ["/etc/hostname"], "target": "local"}]
+    begin = time.monotonic()
+    report = run(tmp_path, {"local": local_target(tmp_path)}, jobs)
+    assert time.monotonic() - begin < 10
+    job = report["jobs"]["hung"]
+    assert job["status"] == "failed"
+    assert job["error"] == "No output from tar for 0.5 seconds"
+    assert job["bytes"] == len("partial")
+    assert os.listdir(tmp_path / "backups") == []
+
+def test_failed_tar_leaves_no_part_file(tmp_path, monkeypatch):
+    fake_tar(tmp_path, monkeypatch, "printf partial\necho 'tar: /missing: Cannot stat: No such file or directory' >&2\nexit 2")
+    jobs = [{"name": "broken", "source": "local", "paths": ["/missing"], "target": "local"}]
+    report = run(tmp_path, {"local": local_target(tmp_path)}, jobs)
+    assert report["jobs"]["broken"]["status"] == "failed"
+    assert report["jobs"]["broken"]["error"].startswith("tar exited with 2: tar: /missing: Cannot stat")
+    assert os.listdir(tmp_path / "backups") == []
+
+def test_progress_report_while_jobs_update(tmp_path):
+    # The progress printer writes the report while jobs keep adding keys to their entries
+    errors = []
+    report = {"jobs": {f"job{number}": {"status": "running", "bytes": 0, "estimated_bytes": 0, "throughput_mbps": 0}
+                       for number in range(50)}}
+    lock = threading.Lock()
+    stop = threading.Event()
+    report_path = str(tmp_path / "report.json")
+    printer = threading.Thread(target=coordinator.print_progress, args=(report, report_path, stop, lock, 0.001))
+    original_hook = threading.excepthook
+    threading.excepthook = lambda args: errors.append(args.exc_value)
+    try:
+        printer.start()
+        # Without the lock json.dump fails with "dictionary changed size during iteration" within a few hundred rounds
+        deadline = time.monotonic() + 0.5
+        round_number = 0
+        while time.monotonic() < deadline:
+            round_number += 1
+            for job in report["jobs"].values():
+                with lock:
+                    job[f"key{round_number}"] = round_number
+        stop.set()
+        printer.join()
+    finally:
+        threading.excepthook = original_hook
+    assert errors == []
+    assert len(json.loads(open(report_path).read())["jobs"]) == 50
+
+# Stand-in for paramiko's channel: read timeout and exit status of a local process
+class FakeChannel:
+    def __init__(self, process):
+        self.process = process
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+# Stand-in for paramiko's ChannelFile: reads raise socket.timeout when nothing arrives within the channel's timeout
+class FakeChannelFile:
+    def __init__(self, stream, channel):
+        self.stream = stream
+        self.channel = channel
+
+    def read(self, size=None):
+        if size is None:
+            return self.stream.read()
+        ready, _, _ = select.select([self.stream], [], [], self.channel.timeout)
+        if not ready:
+            raise socket.timeout("timed out")
+        return os.read(self.stream.fileno(), size)
+
+# Stand-in for paramiko's SFTP client and files, remote paths are mapped under root
+class FakeSFTP:
+    def __init__(self, root):
+        self.root = root
+
+    def local(self, path):
+        return os.path.join(self.root, path.lstrip("/"))
+
+    def chdir(self, path):
+        if not os.path.isdir(self.local(path)):
+            raise IOError(f"No such directory: {path}")
+
+    def mkdir(self, path):
+        os.makedirs(self.local(path))
+
+    def open(self, path, mode):
+        remote_file = open(self.local(path), mode)
+        remote_file.set_pipelined = lambda pipelined: None
+        return remote_file
+
+    def remove(self, path):
+        if not os.path.exists(self.local(path)):
+            raise IOError(f"No such file: {path}")
+        os.remove(self.local(path))
+
+    def posix_rename(self, old, new):
+        os.replace(self.local(old), self.local(new))
+
+    def close(self):
+        pass
+
+# Stand-in for paramiko.SSHClient: commands run on this machine, SFTP goes to a local folder
+class FakeClient:
+    def __init__(self, host, root, log):
+        self.host = host
+        self.root = root
+        self.log = log
+
+    def exec_command(self, command):
+        self.log.append((self.host, command))
+        process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        channel = FakeChannel(process)
+        return None, FakeChannelFile(process.stdout, channel), FakeChannelFile(process.stderr, channel)
+
+    def open_sftp(self):
+        return FakeSFTP(self.root)
+
+    def close(self):
+        self.log.append((self.host, "close"))
+
+def fake_ssh(tmp_path, monkeypatch):
+    log = []
+    root = str(tmp_path / "backup1")
+    monkeypatch.setattr(coordinator, "ssh_connect", lambda host, user=None, port=22, key_file=None: FakeClient(host, root, log))
+    return root, log
+
+SFTP_TARGETS = {"backup1": {"host": "backup1.example.com", "user": "backup", "remote_dir": "/srv/backups"}}
+
+def test_ssh_source_to_sftp_target(tmp_path, monkeypatch):
+    root, log = fake_ssh(tmp_path, monkeypatch)
+    path = make_source(tmp_path, "web01", 50000)
+    jobs = [{"name": "web01", "source": "web01.example.com", "user": "root", "paths": [path], "target": "backup1"}]
+    report = run(tmp_path, SFTP_TARGETS, jobs)
+
+    job = report["jobs"]["web01"]
+    assert job["status"] == "succeeded", job.get("error")
+    assert job["estimate_source"] == "du (uncompressed)"     # Sized with du over the stand-in SSH connection
+    assert os.listdir(os.path.join(root, "srv", "backups")) == [job["file"]]
+    commands = [command for host, command in log if host == "web01.example.com" and command != "close"]
+    assert commands == [f"du -sbc {path}", f"tar czf - {path}"]
+    # Every connection is closed: du and tar on the source, SFTP on the target
+    assert [host for host, command in log if command == "close"].count("web01.example.com") == 2
+    assert [host for host, command in log if command == "close"].count("backup1.example.com") == 1
+
+def test_idle_ssh_source_fails_and_removes_remote_part_file(tmp_path, monkeypatch):
+    root, log = fake_ssh(tmp_path, monkeypatch)
+    fake_tar(tmp_path, monkeypatch, "printf partial\nexec sleep 30")
+    monkeypatch.setattr(coordinator, "SOURCE_IDLE_TIMEOUT", 0.5)
+    jobs = [{"name": "web01", "source": "web01.example.com", "paths": ["/etc/hostname"], "target": "backup1"}]
+    (tmp_path / "history.json").write_text(json.dumps({"web01": {"bytes": 1000}}))
+    report = run(tmp_path, SFTP_TARGETS, jobs)
+
+    job = report["jobs"]["web01"]
+    assert job["status"] == "failed"
+    assert job["error"] == "No output from tar on web01.example.com for 0.5 seconds"
+    assert os.listdir(os.path.join(root, "srv", "backups")) == []
@@ -0,0 +1,168 @@
+# test_patch_compliance.py
+
+# Checks patch-compliance.py without touching the system's packages
+# dpkg-query output is replaced by canned text, apt-get and apt-mark by a stand-in script (see fake_apt)
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths
+import sys          # For the import path and the interpreter
+import time         # For ageing the fake package lists
+import shutil       # For copying the script on its own
+import subprocess   # For running the copied script
+import importlib.util   # For loading the script (its file name has dashes)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)    # Shared modules the script imports (tracing)
+
+spec = importlib.util.spec_from_file_location("patch_compliance", os.path.join(REPO_DIR, "patch-compliance.py"))
+compliance = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(compliance)
+
+DPKG_OUTPUT = "\n".join([
+    "ii \topenssl\topenssl\t3.0.11-1~deb12u1",
+    "ii \tlibssl3\topenssl\t3.0.11-1~deb12u1",
+    "hi \tlinux-image-amd64\tlinux-signed-amd64\t6.1.76-1",
+    "rc \told-daemon\told-daemon\t1.2-3",
+    "un \tnever-installed\t\t"
+])
+
+def test_installed_packages_skip_removed(monkeypatch):
+    monkeypatch.setattr(compliance, "run_command", lambda command, shell=False: (DPKG_OUTPUT, 0))
+    assert compliance.get_installed_packages() == [
+        ("openssl", "openssl", "3.0.11-1~deb12u1"),
+        ("libssl3", "openssl", "3.0.11-1~deb12u1"),
+        ("linux-image-amd64", "linux-signed-amd64", "6.1.76-1")
+    ]
+
+def test_removed_packages_are_not_matched(monkeypatch):
+    monkeypatch.setattr(compliance, "run_command", lambda command, shell=False: (DPKG_OUTPUT, 0))
+    index = {"old-daemon": [{"id": "DSA-1", "severity": "critical", "ranges": [{}]}],
+             "openssl": [{"id": "DSA-2", "severity": "high", "ranges": [{"fixed": "3.0.11-1~deb12u2"}]}]}
+    matches = compliance.match_advisories(index, compliance.get_installed_packages())
+    assert [(match["package"], match["advisory"]) for match in matches] == [("libssl3", "DSA-2"), ("openssl", "DSA-2")]
+
+# "apt-get -s upgrade" output with a multi-origin version, held back and phased packages
+SIMULATION = """Reading package lists...
+Building dependency tree...
+Calculating upgrade...
+The following packages have been kept back:
+  linux-image-amd64
+The following upgrades have been deferred due to phasing:
+  systemd udev
+The following packages will be upgraded:
+  libssl3 openssl
+2 upgraded, 0 newly installed, 0 to remove and 3 not upgraded.
+Inst libssl3 [3.0.11-1~deb12u1] (3.0.11-1~deb12u2 Debian:12.5/stable, Debian-Security:12/stable-security [amd64])
+Inst openssl [3.0.11-1~deb12u1] (3.0.11-1~deb12u2 Debian-Security:12/stable-security [amd64])
+Conf libssl3 (3.0.11-1~deb12u2 Debian:12.5/stable, Debian-Security:12/stable-security [amd64])
+Conf openssl (3.0.11-1~deb12u2 Debian-Security:12/stable-security [amd64])
+"""
+
+# Stand-in for apt-get / apt-mark: logs its arguments, prints canned output from environment variables
+FAKE_APT = """#!{python}
+import os, sys
+name = os.path.basename(sys.argv[0])
+with open(os.environ["FAKE_APT_LOG"], "a") as log:
+    log.write(" ".join([name] + sys.argv[1:]) + "\\n")
+if name == "apt-mark" and sys.argv[1:] == ["showauto"]:
+    print(os.environ.get("FAKE_APT_AUTO", ""))
+elif "-s" in sys.argv:
+    sys.stdout.write(os.environ.get("FAKE_APT_SIMULATION", ""))
+    sys.exit(int(os.environ.get("FAKE_APT_SIMULATION_CODE", "0")))
+elif "install" in sys.argv:
+    sys.exit(int(os.environ.get("FAKE_APT_INSTALL_CODE", "0")))
+"""
+
+# Point APT_GET / APT_MARK at the stand-in, drop "sudo" and return a function that reads the call log
+def fake_apt(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    for name in ("apt-get", "apt-mark"):
+        script = bin_dir / name
+        script.write_text(FAKE_APT.replace("{python}", sys.executable))
+        script.chmod(0o755)
+    log = tmp_path / "apt.log"
+    log.write_text("")
+    monkeypatch.setenv("FAKE_APT_LOG", str(log))
+    monkeypatch.setattr(compliance, "APT_GET", str(bin_dir / "apt-get"))
+    monkeypatch.setattr(compliance, "APT_MARK", str(bin_dir / "apt-mark"))
+    run_command = compliance.run_command
+    monkeypatch.setattr(compliance, "run_command", lambda command, shell=False: run_command(command[1:] if command[0] == "sudo" else command, shell))
+    return lambda: [line.split() for line in log.read_text().splitlines()]
+
+# Package lists directory whose newest file is age seconds old
+def lists_dir(tmp_path, monkeypatch, age):
+    lists = tmp_path / "lists"
+    lists.mkdir()
+    package_list = lists / "deb.debian.org_debian_dists_bookworm_main_binary-amd64_Packages"
+    package_list.write_text("")
+    os.utime(package_list, (time.time() - age, time.time() - age))
+    monkeypatch.setattr(compliance, "APT_LISTS_DIR", str(lists))
+
+def test_parse_upgrade_plan():
+    plan = compliance.parse_upgrade_plan(SIMULATION)
+    assert plan["installs"] == [
+        {"package": "libssl3", "current": "3.0.11-1~deb12u1", "candidate": "3.0.11-1~deb12u2",
+         "origin": "Debian:12.5/stable, Debian-Security:12/stable-security"},
+        {"package": "openssl", "current": "3.0.11-1~deb12u1", "candidate": "3.0.11-1~deb12u2",
+         "origin": "Debian-Security:12/stable-security"}
+    ]
+    assert plan["held"] == ["linux-image-amd64"]
+    assert plan["phased"] == ["systemd", "udev"]
+
+def test_fresh_lists_skip_update(tmp_path, monkeypatch):
+    calls = fake_apt(tmp_path, monkeypatch)
+    monkeypatch.setenv("FAKE_APT_SIMULATION", SIMULATION)
+    lists_dir(tmp_path, monkeypatch, age=60)
+    plan = compliance.plan_linux_upgrade()
+    assert calls() == [["apt-get", "-s", "upgrade"]]
+    assert "error" not in plan and len(plan["installs"]) == 2
+
+def test_stale_lists_run_update(tmp_path, monkeypatch):
+    calls = fake_apt(tmp_path, monkeypatch)
+    lists_dir(tmp_path, monkeypatch, age=compliance.APT_LISTS_MAX_AGE + 60)
+    compliance.plan_linux_upgrade()
+    assert calls() == [["apt-get", "update"], ["apt-get", "-s", "upgrade"]]
+
+def test_failed_simulation_is_an_error(tmp_path, monkeypatch):
+    calls = fake_apt(tmp_path, monkeypatch)
+    monkeypatch.setenv("FAKE_APT_SIMULATION", "E: Could not get lock /var/lib/dpkg/lock-frontend\n")
+    monkeypatch.setenv("FAKE_APT_SIMULATION_CODE", "100")
+    lists_dir(tmp_path, monkeypatch, age=60)
+    plan = compliance.plan_linux_upgrade()
+    assert plan["error"] == "E: Could not get lock /var/lib/dpkg/lock-frontend"
+    assert plan["installs"] == []
+    report = compliance.generate_report([], False, "Linux", error=plan["error"])
+    assert "Auto Update: Failed" in report
+
+def test_apply_installs_pinned_versions(tmp_path, monkeypatch):
+    calls = fake_apt(tmp_path, monkeypatch)
+    monkeypatch.setenv("FAKE_APT_AUTO", "libssl3\nlibc6")
+    plan = compliance.parse_upgrade_plan(SIMULATION)
+    assert compliance.apply_updates("Linux", plan) == (False, None)
+    assert calls() == [
+        ["apt-mark", "showauto"],
+        ["apt-get", "install", "-y", "--only-upgrade", "libssl3=3.0.11-1~deb12u2", "openssl=3.0.11-1~deb12u2"],
+        ["apt-mark", "auto", "libssl3"]     # Only the dependency goes back to automatic, openssl stays manual
+    ]
+
+def test_apply_reports_install_failure(tmp_path, monkeypatch):
+    calls = fake_apt(tmp_path, monkeypatch)
+    monkeypatch.setenv("FAKE_APT_INSTALL_CODE", "100")
+    reboot_required, error = compliance.apply_updates("Linux", compliance.parse_upgrade_plan(SIMULATION))
+    assert error == "apt-get exited with 100"
+    assert calls()[-1][:2] == ["apt-get", "install"]
+
+def test_empty_plan_applies_nothing(tmp_path, monkeypatch):
+    calls = fake_apt(tmp_path, monkeypatch)
+    assert compliance.apply_updates("Linux", {"installs": [], "held": [], "phased": []}) == (False, None)
+    assert calls() == []
+
+def test_runs_without_tracing_module(tmp_path):
+    # patch-rollout.py copies nothing but patch-compliance.py to a host, so tracing.py may not be next to it
+    shutil.copy(os.path.join(REPO_DIR, "patch-compliance.py"), tmp_path)
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONPATH"}
+    result = subprocess.run([sys.executable, "-c", "import runpy; runpy.run_path('patch-compliance.py')"],
+                            capture_output=True, text=True, cwd=tmp_path, env=env)
+    assert result.returncode == 0, result.stderr
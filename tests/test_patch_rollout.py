@@ -0,0 +1,106 @@
+# test_patch_rollout.py
+
+# Checks patch-rollout.py wave scheduling with the fake transport (nothing is run on any host)
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths
+import sys          # For the import path and the interpreter
+import json         # For reading the progress report
+import threading    # For counting hosts in flight
+import subprocess   # For running the script's command line
+import importlib.util   # For loading the script (its file name has dashes)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)    # Shared modules the script imports (tracing)
+
+spec = importlib.util.spec_from_file_location("patch_rollout", os.path.join(REPO_DIR, "patch-rollout.py"))
+rollout = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rollout)
+
+FAILED = ("E: Could not get lock /var/lib/dpkg/lock-frontend\n\nError: E: Could not get lock\n\nAuto Update: Failed", 1)
+
+def hosts(count):
+    return [f"host{number:02d}" for number in range(count)]
+
+def run(tmp_path, monkeypatch, host_list, results=None, **options):
+    monkeypatch.setattr(rollout, "FAKE_RESULTS", results or {})
+    report_path = str(tmp_path / "report.json")
+    report = rollout.run_rollout(host_list, "fake", report_path=report_path, **options)
+    with open(report_path, "r") as report_file:
+        assert json.load(report_file)["status"] == report["status"]     # The report file is the final report
+    return report
+
+def test_wave_sizes():
+    waves = rollout.build_waves(hosts(20), canary_size=1, growth=2, max_size=6)
+    assert [len(wave) for wave in waves] == [1, 2, 4, 6, 6, 1]
+    assert sum(waves, []) == hosts(20)
+    assert [len(wave) for wave in rollout.build_waves(hosts(5), canary_size=0)] == [1, 2, 2]
+
+def test_successful_rollout(tmp_path, monkeypatch):
+    report = run(tmp_path, monkeypatch, hosts(10))
+    assert report["status"] == "completed"
+    assert report["summary"] == {"succeeded": 10}
+    assert [len(wave["hosts"]) for wave in report["waves"]] == [1, 2, 4, 3]
+    assert report["hosts"]["host09"]["wave"] == 3
+
+def test_canary_failure_pauses(tmp_path, monkeypatch):
+    report = run(tmp_path, monkeypatch, hosts(10), {"host00": FAILED})
+    assert report["status"] == "paused"
+    assert report["hosts"]["host00"]["status"] == "failed"
+    assert report["hosts"]["host00"]["auto_update"] == "Failed"
+    assert report["summary"] == {"failed": 1, "pending": 9}
+
+def test_failure_threshold_pauses_and_leaves_hosts_pending(tmp_path, monkeypatch):
+    # Canary and wave 1 succeed (3 hosts), wave 2 fails on its first host: 1 of 4 finished = 25% > 20%
+    # With one host in flight the rest of wave 2 has not started and is cancelled
+    report = run(tmp_path, monkeypatch, hosts(10), {"host03": FAILED}, max_in_flight=1, threshold=0.2)
+    assert report["status"] == "paused"
+    assert "wave 2" in report["pause_reason"]
+    assert report["hosts"]["host03"]["status"] == "failed"
+    assert all(report["hosts"][host]["status"] == "pending" for host in hosts(10)[4:])
+    assert report["summary"] == {"succeeded": 3, "failed": 1, "pending": 6}
+
+def test_failures_under_threshold_continue(tmp_path, monkeypatch):
+    report = run(tmp_path, monkeypatch, hosts(10), {"host08": FAILED}, threshold=0.2)
+    assert report["status"] == "completed"
+    assert report["summary"] == {"succeeded": 9, "failed": 1}
+
+def test_missing_report_counts_as_failure(tmp_path, monkeypatch):
+    report = run(tmp_path, monkeypatch, hosts(3), {"host01": ("Traceback (most recent call last):", 0)}, threshold=1)
+    assert report["hosts"]["host01"]["status"] == "failed"
+    assert report["hosts"]["host01"]["auto_update"] is None
+
+def test_max_in_flight(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+    run_fake = rollout.run_fake
+
+    def counting_transport(host, command, timeout):
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            return run_fake(host, command, timeout)
+        finally:
+            with lock:
+                in_flight["now"] -= 1
+
+    monkeypatch.setitem(rollout.TRANSPORTS, "fake", counting_transport)
+    monkeypatch.setattr(rollout, "FAKE_DELAY", 0.05)
+    monkeypatch.setattr(rollout, "MAX_WAVE_SIZE", 16)
+    report = run(tmp_path, monkeypatch, hosts(31), max_in_flight=3)
+    assert report["status"] == "completed"
+    assert in_flight["peak"] == 3
+
+def test_command_line_fake_transport(tmp_path):
+    (tmp_path / "hosts.txt").write_text("# fleet\nweb01\nweb02\n\nweb01\ndb01\n")
+    (tmp_path / "results.json").write_text(json.dumps({"web01": FAILED}))
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, "patch-rollout.py"), "hosts.txt",
+                             "--transport", "fake", "--fake-results", "results.json"],
+                            capture_output=True, text=True, cwd=tmp_path, env=dict(os.environ, PYTHONPATH=REPO_DIR))
+    assert result.returncode == 0, result.stderr
+    report = json.loads((tmp_path / "patch_rollout_report.json").read_text())
+    assert report["transport"] == "fake"
+    assert report["status"] == "paused"
+    assert report["summary"] == {"failed": 1, "pending": 2}
@@ -0,0 +1,106 @@
+# test_reachability_scan.py
+
+# Checks the --scan mode of check-rdp-ssh-exposure.py against listeners on loopback addresses (127.0.0.0/8)
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths
+import sys          # For the import path
+import json         # For reading the streamed output file
+import time         # For timing the rate limit
+import socket       # For the loopback listeners
+import asyncio      # For stand-in probes
+import importlib.util   # For loading the script (its file name has dashes)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)    # Shared modules the script imports (results_store, tracing)
+
+spec = importlib.util.spec_from_file_location("check_rdp_ssh_exposure", os.path.join(REPO_DIR, "check-rdp-ssh-exposure.py"))
+exposure = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(exposure)
+
+# Listening TCP socket on address (and port, or a free one), returns (socket, port)
+def listener(address, port=0):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind((address, port))
+    server.listen(16)
+    return server, server.getsockname()[1]
+
+# Port nothing listens on (bound and closed again straight away)
+def closed_port():
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+def scan(cidrs, policy, **options):
+    found = []
+    probes = asyncio.run(exposure.scan_reachability(cidrs, policy, found.append, **options))
+    return found, probes
+
+def test_listener_is_reachable_and_closed_port_is_not():
+    server, port = listener("127.0.0.2")
+    closed = closed_port()
+    try:
+        # 127.0.0.0/29 has hosts .1 to .6, only .2 listens on port
+        found, probes = scan(["127.0.0.0/29"], {port: "test", closed: "closed"}, concurrency=4, timeout=1.0, rate=1000)
+    finally:
+        server.close()
+    assert probes == 12
+    assert [(service["host"], service["port"], service["service"], service["status"]) for service in found] == \
+        [("127.0.0.2", port, "test", "reachable")]
+    assert found[0]["latency_ms"] >= 0
+
+def test_concurrency_bound(monkeypatch):
+    in_flight = {"now": 0, "peak": 0}
+
+    async def slow_probe(ip, port, timeout):
+        in_flight["now"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return None
+
+    monkeypatch.setattr(exposure, "probe_port", slow_probe)
+    found, probes = scan(["10.0.0.0/26"], {22: "ssh", 3389: "rdp"}, concurrency=5, timeout=1.0, rate=100000)
+    assert probes == 62 * 2
+    assert in_flight["peak"] == 5
+    assert found == []
+
+def test_rate_limit(monkeypatch):
+    async def instant_probe(ip, port, timeout):
+        return None
+
+    monkeypatch.setattr(exposure, "probe_port", instant_probe)
+    begin = time.monotonic()
+    _, probes = scan(["10.0.0.0/27"], {22: "ssh"}, concurrency=50, timeout=1.0, rate=200)
+    elapsed = time.monotonic() - begin
+    # 30 probes at 200 per second can't take less than 29 intervals of 5 ms
+    assert probes == 30
+    assert elapsed >= 29 / 200 * 0.9     # Small allowance for timer resolution
+
+def test_streamed_file_is_valid_json(tmp_path):
+    servers = [listener("127.0.0.2")]
+    port = servers[0][1]
+    servers.append(listener("127.0.0.3", port))
+    output = tmp_path / "open_port_scan.json"
+    try:
+        found = exposure.run_reachability_scan(["127.0.0.0/29"], {port: "test"}, str(output), concurrency=8, timeout=1.0, rate=1000)
+    finally:
+        for server, _ in servers:
+            server.close()
+    data = json.loads(output.read_text())
+    assert data["result"]["mode"] == "reachability"
+    assert data["result"]["targets"] == ["127.0.0.0/29"]
+    assert data["result"]["probes"] == 6
+    assert sorted(service["host"] for service in data["result"]["services"]) == ["127.0.0.2", "127.0.0.3"]
+    assert data["result"]["services"] == found
+
+def test_streamed_file_without_results_is_valid_json(tmp_path):
+    output = tmp_path / "open_port_scan.json"
+    found = exposure.run_reachability_scan(["127.0.0.1/32"], {closed_port(): "closed"}, str(output), timeout=1.0)
+    assert found == []
+    data = json.loads(output.read_text())
+    assert data["result"]["services"] == [] and data["result"]["probes"] == 1
+
@@ -0,0 +1,60 @@
+# test_report_writer.py
+
+# Checks the streamed report formats of report_writer.py
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths
+import sys          # For the import path
+import gzip         # For reading .gz reports
+import json         # For reading the reports back
+import pytest       # For skipping formats whose library is installed
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import report_writer    # noqa: E402
+
+RECORDS = [{"name": "openssl", "version": "3.0.13"}, {"name": "curl", "version": "8.5.0"}]
+
+def test_json_report(tmp_path):
+    path = str(tmp_path / "report.json")
+    count = report_writer.write_report(path, {"hostname": "web01", "os": "Linux"}, "software", iter(RECORDS))
+    assert count == 2
+    with open(path, "r") as report:
+        assert json.load(report) == {"hostname": "web01", "os": "Linux", "software": RECORDS}
+
+def test_json_header_with_records_key(tmp_path):
+    # A header that already has the records field (e.g. the whole inventory dict) still gives valid JSON
+    path = str(tmp_path / "report.json")
+    report_writer.write_report(path, {"software": [{"stale": True}], "hostname": "web01"}, "software", RECORDS)
+    with open(path, "r") as report:
+        assert json.load(report) == {"hostname": "web01", "software": RECORDS}
+
+    report_writer.write_report(path, {"software": []}, "software", [])
+    with open(path, "r") as report:
+        assert json.load(report) == {"software": []}
+
+def test_header_only_report(tmp_path):
+    path = str(tmp_path / "report.json")
+    assert report_writer.write_report(path, {"hostname": "web01"}) == 0
+    with open(path, "r") as report:
+        assert json.load(report) == {"hostname": "web01"}
+
+def test_compressed_json_lines(tmp_path):
+    path = str(tmp_path / "report.jsonl.gz")
+    report_writer.write_report(path, {"hostname": "web01"}, "software", RECORDS)
+    with gzip.open(path, "rt") as report:
+        assert [json.loads(line) for line in report] == [{"hostname": "web01"}] + RECORDS
+
+@pytest.mark.parametrize("name, library", [("report.msgpack", "msgpack"), ("report.json.zst", "zstandard")])
+def test_missing_library_raises(tmp_path, name, library):
+    try:
+        __import__(library)
+        pytest.skip(f"{library} is installed")
+    except ImportError:
+        pass
+    path = tmp_path / name
+    with pytest.raises(ImportError, match=f"pip install {library}"):
+        report_writer.write_report(str(path), {"hostname": "web01"}, "software", RECORDS)
+    assert not path.exists()
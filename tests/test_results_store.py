@@ -0,0 +1,57 @@
+# test_results_store.py
+
+# Checks the shared results store (results_store.py): where it lives, saving and querying, and collectors without a usable store
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths and the environment
+import sys          # For the import path and the interpreter
+import json         # For reading the collector report
+import subprocess   # For running a collector's command line
+import pytest       # For expecting store errors
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import results_store    # noqa: E402
+
+def test_shared_store_when_writable(tmp_path):
+    shared = str(tmp_path / "var" / "lib" / "audit" / "audit_results.db")    # Missing folders can be created
+    assert results_store.default_db(shared, "user.db") == shared
+
+def test_user_store_when_shared_folder_is_not_writable(tmp_path, monkeypatch):
+    # Root can write anywhere, so the permission check is stubbed to act like an unprivileged account
+    shared = str(tmp_path / "audit" / "audit_results.db")
+    monkeypatch.setattr(results_store.os, "access", lambda path, mode: not path.startswith(str(tmp_path)))
+    assert results_store.default_db(shared, "user.db") == "user.db"
+    os.makedirs(os.path.dirname(shared))
+    open(shared, "w").close()
+    assert results_store.default_db(shared, "user.db") == "user.db"
+
+def test_save_and_query(tmp_path):
+    path = str(tmp_path / "audit_results.db")
+    records = [{"username": "root", "ip": "203.0.113.7", "timestamp": "2026-10-19T12:00:00"},
+               {"username": "admin", "ip": "203.0.113.8", "timestamp": "2026-10-19T12:00:05"}]
+    assert results_store.save_records("failed_logins", records, "web01", "2026-10-19T12:01:00", path) == 2
+    rows = list(results_store.query_records("failed_logins", filters={"username": "root"}, path=path))
+    assert [(row["host"], row["record"]) for row in rows] == [("web01", records[0])]
+    assert results_store.summarize("failed_logins", path) == [("web01", 2, "2026-10-19T12:01:00", "2026-10-19T12:01:00")]
+
+def test_unusable_store_raises_before_reading_records(tmp_path):
+    (tmp_path / "file").write_text("")
+    consumed = []
+    records = (consumed.append(number) or {"name": "pkg", "version": str(number)} for number in range(3))
+    with pytest.raises(results_store.STORE_ERRORS):
+        results_store.store_records("software", records, path=str(tmp_path / "file" / "audit_results.db"))
+    assert consumed == []
+
+def test_report_is_written_when_store_fails(tmp_path):
+    # A folder under a regular file can't be created, even by root
+    (tmp_path / "file").write_text("")
+    env = dict(os.environ, AUDIT_RESULTS_DB=str(tmp_path / "file" / "audit_results.db"))
+    result = subprocess.run([sys.executable, os.path.join(REPO_DIR, "check-rdp-ssh-exposure.py"), "--scan", "127.0.0.1/32",
+                             "--ports", "1:test", "--timeout", "0.5"], capture_output=True, text=True, cwd=tmp_path, env=env)
+    assert result.returncode == 0, result.stderr
+    assert "not saved to the results store" in result.stdout
+    report = json.loads((tmp_path / "open_port_scan.json").read_text())
+    assert report["result"]["probes"] == 1
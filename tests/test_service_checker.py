@@ -0,0 +1,177 @@
+# test_service_checker.py
+
+# Checks the probes and backends of windows-service-checker.py against stand-ins on the loopback address
+    # DNS / DHCP - a UDP responder thread that answers with scripted replies
+    # TCP        - a listening socket and a closed port
+    # systemd    - a fake systemctl script put first on PATH
+# Runs with pytest: python3 -m pytest tests
+
+import os           # For paths and PATH
+import sys          # For the import path
+import socket       # For the stand-in servers
+import struct       # For building DNS and DHCP replies
+import threading    # For running the stand-in responders
+import importlib.util   # For loading the script (its file name has dashes)
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, REPO_DIR)    # Shared modules the script imports (tracing)
+
+spec = importlib.util.spec_from_file_location("windows_service_checker", os.path.join(REPO_DIR, "windows-service-checker.py"))
+checker = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(checker)
+
+# UDP responder on 127.0.0.1: for the first request, each reply function is called with it and its result sent back
+# Returns (port, thread); the thread ends after sending every reply
+def udp_responder(replies):
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    server.settimeout(5)
+
+    def serve():
+        with server:
+            try:
+                request, client = server.recvfrom(4096)
+            except socket.timeout:
+                return
+            for reply in replies:
+                server.sendto(reply(request), client)
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    return server.getsockname()[1], thread
+
+# Free port on 127.0.0.1 (bound and closed again straight away)
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+# DNS answer to query with the given flags (0x8180 = response, recursion available, NOERROR)
+# id_offset changes the query ID, so the answer belongs to another query
+def dns_reply(flags=0x8180, id_offset=0):
+    def reply(query):
+        reply_id = (struct.unpack_from(">H", query)[0] + id_offset) & 0xFFFF
+        return struct.pack(">HH", reply_id, flags) + query[4:]
+    return reply
+
+# DHCPOFFER for the DISCOVER in request, offering address (xid_offset changes the transaction ID)
+def dhcp_offer(address="10.0.0.50", xid_offset=0):
+    def reply(request):
+        xid = (struct.unpack_from(">I", request, 4)[0] + xid_offset) & 0xFFFFFFFF
+        header = bytes([2]) + request[1:4] + struct.pack(">I", xid) + request[8:16] + socket.inet_aton(address) + request[20:236]
+        return header + b"\x63\x82\x53\x63" + b"\x35\x01\x02" + b"\xff"
+    return reply
+
+def dns_check(port, query="example.com"):
+    return {"name": "DNS", "backend": "dns", "host": "127.0.0.1", "port": port, "query": query}
+
+def test_dns_answer():
+    port, thread = udp_responder([dns_reply()])
+    result = checker.probe_dns(dns_check(port), 2)
+    thread.join()
+    assert (result["status"], result["detail"]) == ("Running", "NOERROR")
+
+def test_dns_nxdomain_counts_as_running():
+    port, thread = udp_responder([dns_reply(flags=0x8183)])
+    result = checker.probe_dns(dns_check(port, "missing.example"), 2)
+    thread.join()
+    assert (result["status"], result["detail"]) == ("Running", "NXDOMAIN")
+
+def test_dns_short_and_foreign_replies_are_skipped():
+    # A truncated datagram and an answer to another query come first, then the real answer
+    port, thread = udp_responder([lambda query: b"\x00\x01", dns_reply(id_offset=1), dns_reply(id_offset=2), dns_reply()])
+    result = checker.probe_dns(dns_check(port), 2)
+    thread.join()
+    assert result["status"] == "Running"
+
+def test_dns_only_wrong_replies_time_out():
+    port, thread = udp_responder([lambda query: b"", dns_reply(flags=0x0100)])    # Empty, then the query echoed back (QR bit unset)
+    result = checker.probe_dns(dns_check(port), 0.5)
+    thread.join()
+    assert (result["status"], result["detail"]) == ("Not Running", "No DNS response")
+    assert result["latency_ms"] < 2000      # The deadline holds even though replies kept arriving
+
+def dhcp_check(port):
+    return {"name": "DHCP", "backend": "dhcp", "host": "127.0.0.1", "port": port, "client_port": free_port(socket.SOCK_DGRAM)}
+
+def test_dhcp_offer():
+    port, thread = udp_responder([dhcp_offer(xid_offset=1), dhcp_offer("10.0.0.50")])
+    result = checker.probe_dhcp(dhcp_check(port), 2)
+    thread.join()
+    assert (result["status"], result["detail"]) == ("Running", "Offered 10.0.0.50")
+
+def test_dhcp_without_offer():
+    port, thread = udp_responder([dhcp_offer(xid_offset=1)])    # Offer for another client only
+    result = checker.probe_dhcp(dhcp_check(port), 0.5)
+    thread.join()
+    assert (result["status"], result["detail"]) == ("Not Running", "No DHCP offer")
+
+def test_tcp_open_and_closed():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        result = checker.probe_tcp({"name": "web", "backend": "tcp", "port": server.getsockname()[1]}, 1)
+    assert result["status"] == "Running"
+    result = checker.probe_tcp({"name": "web", "backend": "tcp", "port": free_port()}, 1)
+    assert result["status"] == "Not Running" and "detail" in result
+
+# Put a fake systemctl first on PATH that prints stdout, stderr and exits with code
+def fake_systemctl(tmp_path, monkeypatch, stdout="", stderr="", code=0):
+    (tmp_path / "stdout.txt").write_text(stdout)
+    (tmp_path / "stderr.txt").write_text(stderr)
+    script = tmp_path / "systemctl"
+    script.write_text(f"#!/bin/sh\ncat '{tmp_path / 'stdout.txt'}'\ncat '{tmp_path / 'stderr.txt'}' >&2\nexit {code}\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+
+SYSTEMCTL_SHOW = """Id=ssh.service
+Names=ssh.service sshd.service
+LoadState=loaded
+ActiveState=active
+SubState=running
+
+Id=missing.service
+Names=missing.service
+LoadState=not-found
+ActiveState=inactive
+SubState=dead
+
+Id=cron.service
+Names=cron.service
+LoadState=loaded
+ActiveState=failed
+SubState=failed
+"""
+
+def test_systemd_units(tmp_path, monkeypatch):
+    fake_systemctl(tmp_path, monkeypatch, SYSTEMCTL_SHOW)
+    checks = [{"name": "cron", "backend": "systemd"}, {"name": "sshd", "backend": "systemd", "unit": "sshd.service"},
+              {"name": "missing", "backend": "systemd"}, {"name": "other", "backend": "systemd", "unit": "other.timer"}]
+    results = checker.check_systemd_units(checks, 2)
+    assert [(result["status"], result.get("detail")) for result in results] == [
+        ("Not Running", "failed/failed"), ("Running", "active/running"), ("Not Running", "unit not found"),
+        ("Error: no state returned", None)]
+
+def test_systemd_failure_reports_stderr(tmp_path, monkeypatch):
+    fake_systemctl(tmp_path, monkeypatch, stderr="System has not been booted with systemd as init system (PID 1). Can't operate.\n"
+                                                  "Failed to connect to bus: Host is down\n", code=1)
+    results = checker.check_systemd_units([{"name": "ssh", "backend": "systemd"}, {"name": "cron", "backend": "systemd"}], 2)
+    assert [result["status"] for result in results] == ["Error: Failed to connect to bus: Host is down"] * 2
+
+def test_run_checks_isolates_errors(monkeypatch):
+    def broken_batch(checks, timeout):
+        raise RuntimeError("backend crashed")
+
+    monkeypatch.setitem(checker.BATCH_BACKENDS, "systemd", broken_batch)
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        checks = [{"name": "sshd", "backend": "systemd"},
+                  {"name": "no port", "backend": "tcp"},
+                  {"name": "web", "backend": "tcp", "port": server.getsockname()[1]},
+                  {"name": "odd", "backend": "snmp"}]
+        results = checker.run_checks(checks, timeout=1)
+    assert [result["name"] for result in results] == ["sshd", "no port", "web", "odd"]
+    assert [result["status"] for result in results] == [
+        "Error: RuntimeError: backend crashed", "Error: KeyError: 'port'", "Running", "Error: unknown backend snmp"]
@@ -0,0 +1,134 @@
+# tracing.py
+
+# Lightweight timing spans and counters for the audit scripts, to see where a slow run spends its time
+# Tracing is off unless the AUDIT_TRACE environment variable names an output file, e.g.:
+    # AUDIT_TRACE=trace.json python3 failed-login-audit.py
+# The trace is written when the script exits, in Chrome trace format: open it in https://ui.perfetto.dev or chrome://tracing
+# Spans show up per thread on a timeline, counters (bytes read, lines parsed, ...) as graphs and as totals in "otherData"
+# Set AUDIT_TRACE_SAMPLE_MS as well (e.g. 5) to sample every thread's Python stack at that interval
+# Samples are saved next to the trace as <trace file>.folded (collapsed stacks for speedscope.app or flamegraph.pl)
+
+# When tracing is off, traced() returns the function unchanged and span() / count() do nothing, so the cost is close to zero
+
+import os           # For the environment variables and process ID
+import sys          # For the sampling profiler (sys._current_frames)
+import json         # For writing the trace file
+import time         # For timestamps
+import atexit       # For writing the trace when the script exits
+import inspect      # For tracing generator functions over their whole iteration
+import functools    # For keeping the wrapped function's name
+import threading    # For thread IDs, the counter lock and the sampler thread
+from collections import Counter     # For sample counts per stack
+from contextlib import contextmanager, nullcontext
+
+TRACE_FILE = os.environ.get("AUDIT_TRACE")
+SAMPLE_INTERVAL_MS = float(os.environ.get("AUDIT_TRACE_SAMPLE_MS", "0"))
+ENABLED = bool(TRACE_FILE)
+
+events = []             # Chrome trace events, list.append is thread-safe
+counters = Counter()    # Running totals per counter name
+samples = Counter()     # Sampled stacks ("thread;outer;...;inner") -> number of samples
+thread_names = {}       # Thread ID -> name, for labelling timelines
+counter_lock = threading.Lock()
+start_time = time.perf_counter()
+NULL_SPAN = nullcontext()
+
+# Microseconds since the script started (Chrome trace timestamps are in microseconds)
+def now_us():
+    return (time.perf_counter() - start_time) * 1e6
+
+# Record the block as one complete ("X") event on the current thread's timeline
+@contextmanager
+def timed_span(name, category="function", **args):
+    begin = now_us()
+    try:
+        yield
+    finally:
+        thread = threading.current_thread()
+        thread_names[thread.ident] = thread.name     # Worker threads may be gone by the time the trace is written
+        event = {"name": name, "cat": category, "ph": "X", "ts": begin, "dur": now_us() - begin,
+                 "pid": os.getpid(), "tid": thread.ident}
+        if args:
+            event["args"] = {key: str(value) for key, value in args.items()}
+        events.append(event)
+
+# Time a block of code: with span("parse auth.log", path=AUTH_LOG): ...
+# Keyword arguments are shown with the span in the trace viewer
+def span(name, category="function", **args):
+    if not ENABLED:
+        return NULL_SPAN
+    return timed_span(name, category, **args)
+
+# Add to a counter, e.g. count("lines_parsed", 1200); call it once per batch / file rather than once per line
+def count(name, value=1):
+    if not ENABLED:
+        return
+    with counter_lock:
+        counters[name] += value
+        total = counters[name]
+    events.append({"name": name, "ph": "C", "ts": now_us(), "pid": os.getpid(), "args": {name: total}})
+
+# Decorator that puts a span around every call: @traced() or @traced("dpkg-query", category="subprocess")
+# Generator functions are timed from the first to the last record they produce
+def traced(name=None, category="function"):
+    def decorate(function):
+        if not ENABLED:
+            return function
+        span_name = name or function.__qualname__
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                with timed_span(span_name, category):
+                    yield from function(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed_span(span_name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# Sampling profiler: every interval, record the Python stack of every other thread
+def sample_stacks(interval, stop):
+    own_id = threading.get_ident()
+    names = {}
+    while not stop.wait(interval):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if thread_id not in names:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            samples[";".join([names.get(thread_id, str(thread_id))] + stack[::-1])] += 1
+
+# Write the trace file (and sampled stacks if the profiler ran)
+def write_trace(path=TRACE_FILE):
+    pid = os.getpid()
+    metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": os.path.basename(sys.argv[0])}}]
+    thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+    for thread_id, thread_name in thread_names.items():
+        metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}})
+
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms",
+                   "otherData": {"command": " ".join(sys.argv), "counters": dict(counters)}}, trace_file)
+
+    if samples:
+        with open(path + ".folded", "w") as folded_file:
+            for stack, hits in samples.most_common():
+                folded_file.write(f"{stack} {hits}\n")
+
+# Start the sampler and register the trace writer when tracing is on
+if ENABLED:
+    atexit.register(write_trace)
+    if SAMPLE_INTERVAL_MS > 0:
+        stop_sampling = threading.Event()
+        threading.Thread(target=sample_stacks, args=(SAMPLE_INTERVAL_MS / 1000, stop_sampling),
+                         name="trace-sampler", daemon=True).start()
+        atexit.register(stop_sampling.set)     # atexit runs in reverse order, so sampling stops before the trace is written
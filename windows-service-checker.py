@@ -2,19 +2,45 @@
 
 # This script checks if Active Directory (AD), Domain Name System (DNS), and Dynamic Host Configuration Protocol (DHCP) services are running
 # Script will log result text file
+# Checks go through pluggable backends and run concurrently, each result records how long the check took:
+    # windows - Windows service state through pywin32 (default on Windows, checks SERVICES)
+    # systemd - state of many systemd units with a single "systemctl show" call
+    # dns     - sends a real DNS query over UDP and waits for the answer
+    # dhcp    - sends a DHCPDISCOVER and waits for an offer (client port 68 needs root)
+    # tcp     - opens a TCP connection to the port
 
-# Usage: Run script only on Windows Server
+# Usage: Run on Windows Server to check AD, DNS and DHCP services
+# On Linux, checks are read from service_checks.json if it exists, otherwise LINUX_CHECKS is used, e.g.:
+    # [{"name": "DNS", "backend": "dns", "host": "10.0.0.53", "query": "example.com"},
+    #  {"name": "sshd", "backend": "systemd", "unit": "ssh.service"}]
 
 import os           # Used for file path operation
+import json         # Used to read the checks file
+import time         # Used to measure check latency
+import socket       # Used for DNS / DHCP / TCP probes
+import struct       # Used to build and read DNS / DHCP packets
+import random       # Used for DNS query IDs and DHCP transaction IDs
 import platform     # Used to detect the OS type (Windows, Linux, etc.)
+import subprocess   # Used to run systemctl
+from concurrent.futures import ThreadPoolExecutor   # Used to run checks at the same time
 from datetime import datetime   # For timestamping
+# Timing spans and counters from tracing.py (set AUDIT_TRACE=trace.json to record)
+# tracing.py is optional, so this script still runs when it is copied to a host on its own; spans and counters then do nothing
+try:
+    import tracing
+except ImportError:
+    from types import SimpleNamespace
+    from contextlib import nullcontext
+    tracing = SimpleNamespace(traced=lambda name=None, category="function": lambda function: function,
+                              span=lambda name, category="function", **args: nullcontext(),
+                              count=lambda name, value=1: None)
 
 # Attempt to import the pywin32 service utility module (used to check Windows service status)
+# Only the "windows" backend needs it, other backends work without it
 try:
     import win32serviceutil  # Requires pywin32
 except ImportError:
-    print("pywin32 is not installed. Please install it using: pip install pywin32")
-    exit(1)
+    win32serviceutil = None
 
 # List of Windows services to check
 SERVICES = [
@@ -23,34 +49,237 @@ SERVICES = [
     "DHCPServer" # DHCP Server
 ]
 
+# Checks to run on Linux when there is no checks file
+LINUX_CHECKS = [
+    {"name": "DNS", "backend": "dns", "host": "127.0.0.1", "query": "localhost"},
+    {"name": "sshd", "backend": "systemd", "unit": "ssh.service"}
+]
+
 # # Path to the log file: current directory + "service_status.log"
 LOG_FILE = os.path.join(os.getcwd(), "service_status.log")
+CHECKS_FILE = os.path.join(os.getcwd(), "service_checks.json")
+CHECK_TIMEOUT = 3       # Seconds before a probe or backend call is treated as failed
+MAX_WORKERS = 16        # Checks running at the same time
+# systemctl adds ".service" to unit names without one of these suffixes
+UNIT_SUFFIXES = (".service", ".socket", ".target", ".timer", ".mount", ".automount", ".swap", ".path", ".slice", ".scope", ".device")
 
-# Check the status of each service in the list
-def check_services(services):
-    results = {}    # Dictionary to store service name and its status
-    for service in services:
+# Build a result dict for one check
+def make_result(check, status, started, detail=None):
+    result = {
+        "name": check["name"],
+        "backend": check["backend"],
+        "status": status,
+        "latency_ms": round((time.time() - started) * 1000, 2)
+    }
+    if detail:
+        result["detail"] = detail
+    return result
+
+# Windows backend: query each service through pywin32
+@tracing.traced()
+def check_windows_services(checks, timeout):
+    results = []
+    for check in checks:
+        started = time.time()
+        if win32serviceutil is None:
+            results.append(make_result(check, "Error: pywin32 is not installed. Please install it using: pip install pywin32", started))
+            continue
         try:
             # Query the current status of the service
             # win32serviceutil.QueryServiceStatus() returns a tuple, index [1] is the service state code
-            status = win32serviceutil.QueryServiceStatus(service)[1]
+            status = win32serviceutil.QueryServiceStatus(check.get("service", check["name"]))[1]
             # Status code 4 means the service is running
-            results[service] = "Running" if status == 4 else "Not Running"
+            results.append(make_result(check, "Running" if status == 4 else "Not Running", started))
         except Exception as error:
-            results[service] = f"Error: {str(error)}"
+            results.append(make_result(check, f"Error: {str(error)}", started))
     return results
 
-if __name__ == "__main__":
-    # Ensure this script only runs on Windows
-    if platform.system() != "Windows":
-        print("This script only works on Windows.")
-        exit(1)
+# Unit name as systemctl reports it, e.g. "ssh" -> "ssh.service"
+def unit_name(check):
+    unit = check.get("unit", check["name"])
+    return unit if unit.endswith(UNIT_SUFFIXES) else unit + ".service"
+
+# systemd backend: one "systemctl show" call for every unit, output is one block per unit separated by blank lines
+# e.g. "Id=ssh.service\nNames=ssh.service sshd.service\nActiveState=active\nSubState=running\n\nId=cron.service\n..."
+# Blocks are matched to checks by unit name (Id or an alias in Names), not by position
+@tracing.traced(category="subprocess")
+def check_systemd_units(checks, timeout):
+    started = time.time()
+    units = [unit_name(check) for check in checks]
+    try:
+        result = subprocess.run(["systemctl", "show", "--property=Id,Names,LoadState,ActiveState,SubState"] + units,
+                                capture_output=True, text=True, timeout=timeout)
+    except Exception as error:
+        return [make_result(check, f"Error: {error}", started) for check in checks]
+
+    # A failed call (e.g. no systemd, or no D-Bus connection) explains itself on stderr, report that for units without state
+    failure = None
+    if result.returncode != 0:
+        messages = result.stderr.strip().splitlines()
+        failure = messages[-1] if messages else f"systemctl exited with code {result.returncode}"
+
+    blocks = {}
+    for block in result.stdout.strip().split("\n\n"):
+        properties = dict(line.split("=", 1) for line in block.splitlines() if "=" in line)
+        for name in [properties.get("Id")] + properties.get("Names", "").split():
+            if name:
+                blocks.setdefault(name, properties)
+
+    results = []
+    for check, unit in zip(checks, units):
+        properties = blocks.get(unit)
+        if not properties:
+            results.append(make_result(check, f"Error: {failure or 'no state returned'}", started))
+            continue
+        if properties.get("LoadState") == "not-found":
+            results.append(make_result(check, "Not Running", started, "unit not found"))
+            continue
+        state = f"{properties.get('ActiveState')}/{properties.get('SubState')}"
+        status = "Running" if properties.get("ActiveState") == "active" else "Not Running"
+        results.append(make_result(check, status, started, state))
+    return results
+
+# DNS probe: send an A query over UDP and check that an answer with the same ID comes back
+# Any answer (even NXDOMAIN) means the server is up
+@tracing.traced(category="network")
+def probe_dns(check, timeout):
+    started = time.time()
+    query_id = random.randint(0, 0xFFFF)
+    # Header: ID, flags (recursion desired), 1 question, 0 answers / authority / additional
+    packet = struct.pack(">HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+    for label in check.get("query", "localhost").rstrip(".").split("."):
+        packet += bytes([len(label)]) + label.encode()
+    packet += b"\x00" + struct.pack(">HH", 1, 1)     # End of name, type A, class IN
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as dns_socket:
+        dns_socket.settimeout(timeout)
+        try:
+            dns_socket.sendto(packet, (check.get("host", "127.0.0.1"), check.get("port", 53)))
+            deadline = started + timeout
+            while True:
+                dns_socket.settimeout(max(0.01, deadline - time.time()))
+                reply = dns_socket.recv(4096)
+                if len(reply) < 12:     # Shorter than a DNS header, not an answer
+                    continue
+                reply_id, flags = struct.unpack_from(">HH", reply)
+                if reply_id == query_id and flags & 0x8000:    # Same ID and QR bit set (it's a response)
+                    break
+        except socket.timeout:
+            return make_result(check, "Not Running", started, "No DNS response")
+        except OSError as error:
+            return make_result(check, f"Error: {error}", started)
+
+    rcodes = {0: "NOERROR", 1: "FORMERR", 2: "SERVFAIL", 3: "NXDOMAIN", 5: "REFUSED"}
+    return make_result(check, "Running", started, rcodes.get(flags & 0x000F, f"RCODE {flags & 0x000F}"))
+
+# DHCP probe: send a DHCPDISCOVER and wait for a DHCPOFFER with the same transaction ID
+@tracing.traced(category="network")
+def probe_dhcp(check, timeout):
+    started = time.time()
+    xid = random.randint(0, 0xFFFFFFFF)
+    mac = bytes.fromhex(check.get("mac", "02:00:00:00:00:01").replace(":", ""))
+    # BOOTP header: op, htype, hlen, hops, xid, secs, flags (broadcast), ciaddr, yiaddr, siaddr, giaddr
+    packet = struct.pack(">BBBBIHH4s4s4s4s", 1, 1, 6, 0, xid, 0, 0x8000, bytes(4), bytes(4), bytes(4), bytes(4))
+    packet += mac.ljust(16, b"\x00") + bytes(64) + bytes(128)      # chaddr, sname, file
+    packet += b"\x63\x82\x53\x63"                                   # DHCP magic cookie
+    packet += b"\x35\x01\x01" + b"\x37\x03\x01\x03\x06" + b"\xff"  # Message type DISCOVER, request subnet/router/DNS, end
+
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as dhcp_socket:
+        dhcp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        dhcp_socket.settimeout(timeout)
+        try:
+            dhcp_socket.bind(("", check.get("client_port", 68)))
+            dhcp_socket.sendto(packet, (check.get("host", "255.255.255.255"), check.get("port", 67)))
+            deadline = started + timeout
+            while True:
+                dhcp_socket.settimeout(max(0.01, deadline - time.time()))
+                reply = dhcp_socket.recv(4096)
+                # Reply must be a BOOTREPLY (op 2) for our transaction with a DHCPOFFER (option 53 = 2)
+                if len(reply) > 240 and reply[0] == 2 and struct.unpack_from(">I", reply, 4)[0] == xid and b"\x35\x01\x02" in reply[240:]:
+                    offered = socket.inet_ntoa(reply[16:20])    # yiaddr
+                    return make_result(check, "Running", started, f"Offered {offered}")
+        except socket.timeout:
+            return make_result(check, "Not Running", started, "No DHCP offer")
+        except OSError as error:
+            return make_result(check, f"Error: {error}", started)
+
+# TCP probe: the service is running if the port accepts a connection
+@tracing.traced(category="network")
+def probe_tcp(check, timeout):
+    started = time.time()
+    try:
+        with socket.create_connection((check.get("host", "127.0.0.1"), check["port"]), timeout=timeout):
+            return make_result(check, "Running", started)
+    except socket.timeout:
+        return make_result(check, "Not Running", started, "Connection timed out")
+    except OSError as error:
+        return make_result(check, "Not Running", started, str(error))
+
+# Backends that take every check of their kind in one call
+BATCH_BACKENDS = {
+    "windows": check_windows_services,
+    "systemd": check_systemd_units
+}
+# Backends that probe one check at a time
+PROBE_BACKENDS = {
+    "dns": probe_dns,
+    "dhcp": probe_dhcp,
+    "tcp": probe_tcp
+}
+
+# Run all checks concurrently and return results in the same order as the checks
+# A backend that raises (e.g. a tcp check without "port") only fails the checks of its own task
+@tracing.traced()
+def run_checks(checks, timeout=CHECK_TIMEOUT):
+    results = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = []
+        started = time.time()
+        # One task per batch backend with all of its checks
+        for backend, function in BATCH_BACKENDS.items():
+            batch = [check for check in checks if check["backend"] == backend]
+            if batch:
+                futures.append((batch, executor.submit(function, batch, timeout)))
+        # One task per probe
+        for check in checks:
+            if check["backend"] in PROBE_BACKENDS:
+                futures.append(([check], executor.submit(lambda c: [PROBE_BACKENDS[c["backend"]](c, timeout)], check)))
+            elif check["backend"] not in BATCH_BACKENDS:
+                results[id(check)] = make_result(check, f"Error: unknown backend {check['backend']}", time.time())
 
-    status_report = check_services(SERVICES)
+        for batch, future in futures:
+            try:
+                batch_results = future.result()
+            except Exception as error:
+                batch_results = [make_result(check, f"Error: {type(error).__name__}: {error}", started) for check in batch]
+            for check, result in zip(batch, batch_results):
+                results[id(check)] = result
+    return [results[id(check)] for check in checks]
+
+# Check the status of each service in the list
+def check_services(services):
+    results = {}    # Dictionary to store service name and its status
+    for result in check_windows_services([{"name": service, "backend": "windows"} for service in services], CHECK_TIMEOUT):
+        results[result["name"]] = result["status"]
+    return results
+
+# Pick the checks for this machine: Windows services on Windows, checks file or LINUX_CHECKS elsewhere
+def load_checks(system):
+    if system == "Windows":
+        return [{"name": service, "backend": "windows"} for service in SERVICES]
+    if os.path.isfile(CHECKS_FILE):
+        with open(CHECKS_FILE, "r") as checks_file:
+            return json.load(checks_file)
+    return LINUX_CHECKS
+
+if __name__ == "__main__":
+    system = platform.system()
+    status_report = run_checks(load_checks(system))
 
     with open(LOG_FILE, "a") as log:
-        log.write(f"\n=== Windows Service Status ({datetime.now().isoformat()}) ===\n")
-        for service, status in status_report.items():
-            log.write(f"{service}: {status}\n")
+        log.write(f"\n=== {system} Service Status ({datetime.now().isoformat()}) ===\n")
+        for result in status_report:
+            detail = f", {result['detail']}" if "detail" in result else ""
+            log.write(f"{result['name']}: {result['status']} ({result['backend']}, {result['latency_ms']} ms{detail})\n")
 
     print(f"Service check complete. Results saved to {LOG_FILE}")